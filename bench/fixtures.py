@@ -0,0 +1,174 @@
+"""
+Payloads de mercado y noticias para correr benchmarks sin red.
+
+Si existe un payload grabado en bench/fixtures/ se usa ese; si no, se
+sintetiza uno determinístico (misma semilla = mismos datos) del tamaño pedido.
+Grabar desde las APIs reales:  python -m bench.fixtures --record
+"""
+import os
+import json
+import random
+import argparse
+from typing import Dict, List
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+SEED = 1234
+
+_REAL_TOP = [
+    ("bitcoin", "btc", "Bitcoin"), ("ethereum", "eth", "Ethereum"), ("tether", "usdt", "Tether"),
+    ("binancecoin", "bnb", "BNB"), ("solana", "sol", "Solana"), ("usd-coin", "usdc", "USDC"),
+    ("ripple", "xrp", "XRP"), ("dogecoin", "doge", "Dogecoin"), ("cardano", "ada", "Cardano"),
+    ("avalanche-2", "avax", "Avalanche"), ("chainlink", "link", "Chainlink"), ("polkadot", "dot", "Polkadot"),
+    ("pax-gold", "paxg", "PAX Gold"), ("optimism", "op", "Optimism"), ("arbitrum", "arb", "Arbitrum"),
+]
+
+_HEADLINE_TEMPLATES = [
+    "{name} price surges as ETF inflows hit record",
+    "SEC lawsuit against {name} developers moves forward",
+    "{name} network upgrade scheduled for next month",
+    "Exchange announces {sym} listing with new trading pairs",
+    "Hackers exploit {name} bridge, millions drained",
+    "Fed decision weighs on {name} and broader crypto market",
+    "{sym} airdrop draws record participation",
+    "Analysts turn bearish on {name} after weekly close",
+    "Second quarter confederation report mentions {name}",
+]
+
+def _load(name: str):
+    path = os.path.join(FIXTURES_DIR, name)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f) if name.endswith(".json") else f.read()
+    return None
+
+def coingecko_markets(n: int) -> List[Dict]:
+    """Lista completa (ordenada por market cap) de n monedas, formato /coins/markets."""
+    recorded = _load(f"coingecko_{n}.json")
+    if recorded:
+        return recorded
+
+    rng = random.Random(SEED)
+    out = []
+    cap = 1.3e12
+    for i in range(n):
+        if i < len(_REAL_TOP):
+            cid, sym, name = _REAL_TOP[i]
+        else:
+            cid, sym, name = f"coin-{i}", f"c{i}", f"Coin {i}"
+        price = 1.0 if sym in ("usdt", "usdc") else round(cap / rng.uniform(1e7, 1e10), 6)
+        out.append({
+            "id": cid,
+            "symbol": sym,
+            "name": name,
+            "current_price": price,
+            "market_cap": cap,
+            "market_cap_rank": i + 1,
+            "total_volume": cap * rng.uniform(0.01, 0.2),
+            "price_change_percentage_24h": rng.gauss(0, 4),
+            "price_change_percentage_7d_in_currency": rng.gauss(0, 9),
+            "price_change_percentage_30d_in_currency": rng.gauss(0, 18),
+        })
+        cap *= rng.uniform(0.80, 0.995)
+    return out
+
+def binance_ticker(markets: List[Dict]) -> List[Dict]:
+    recorded = _load("binance_ticker.json")
+    if recorded:
+        return recorded
+    rng = random.Random(SEED + 1)
+    out = [{"symbol": m["symbol"].upper() + "USDT", "price": str(m["current_price"] * rng.uniform(0.995, 1.005))}
+           for m in markets if m["symbol"] not in ("usdt",)]
+    out += [{"symbol": f"PAIR{i}BTC", "price": "0.0001"} for i in range(500)]  # ruido de pares no-USDT
+    return out
+
+def coinbase_stats(markets: List[Dict]) -> Dict:
+    recorded = _load("coinbase_stats.json")
+    if recorded:
+        return recorded
+    rng = random.Random(SEED + 2)
+    return {f"{m['symbol'].upper()}-USD": {"stats_24hour": {"last": str(m["current_price"] * rng.uniform(0.995, 1.005))}}
+            for m in markets[: max(1, len(markets) // 3)]}
+
+def kraken_ticker(markets: List[Dict]) -> Dict:
+    recorded = _load("kraken_ticker.json")
+    if recorded:
+        return recorded
+    rng = random.Random(SEED + 3)
+    result = {}
+    for m in markets[: max(1, len(markets) // 5)]:
+        sym = "XBT" if m["symbol"] == "btc" else m["symbol"].upper()
+        pair = f"X{sym}ZUSD" if len(sym) == 3 else f"{sym}USD"
+        result[pair] = {"c": [str(m["current_price"] * rng.uniform(0.995, 1.005)), "1.0"]}
+    return {"error": [], "result": result}
+
+def rss_feed(n_items: int, source: str = "example.com") -> str:
+    """Feed RSS 2.0 con n ítems (títulos con keywords y tickers reales)."""
+    recorded = _load(f"rss_{n_items}.xml")
+    if recorded:
+        return recorded
+    rng = random.Random(SEED + n_items)
+    items = []
+    for i in range(n_items):
+        _, sym, name = _REAL_TOP[rng.randrange(len(_REAL_TOP))]
+        title = rng.choice(_HEADLINE_TEMPLATES).format(name=name, sym=sym.upper())
+        items.append(
+            f"<item><title>{title} #{i}</title><link>https://{source}/n/{i}</link>"
+            f"<description>&lt;p&gt;{title}. More details inside.&lt;/p&gt;</description>"
+            f"<pubDate>Mon, 05 Oct 2026 {i % 24:02d}:{i % 60:02d}:00 +0000</pubDate></item>"
+        )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>{source}</title>{"".join(items)}</channel></rss>'
+
+def dolarapi_rates() -> List[Dict]:
+    """Cotizaciones del dólar en Argentina (formato de dolarapi.com)."""
+    recorded = _load("dolarapi.json")
+    if recorded:
+        return recorded
+    return [
+        {"moneda": "USD", "casa": "oficial", "nombre": "Oficial", "compra": 1040.0, "venta": 1090.0},
+        {"moneda": "USD", "casa": "blue", "nombre": "Blue", "compra": 1180.0, "venta": 1200.0},
+        {"moneda": "USD", "casa": "bolsa", "nombre": "Bolsa", "compra": 1165.0, "venta": 1172.5},
+    ]
+
+def frankfurter_eur() -> Dict:
+    recorded = _load("frankfurter_eur.json")
+    if recorded:
+        return recorded
+    return {"amount": 1.0, "base": "USD", "date": "2026-10-05", "rates": {"EUR": 0.9235}}
+
+def record() -> None:
+    """Graba payloads reales (requiere red) para que los benchmarks usen datos de verdad."""
+    import requests
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    markets = []
+    for page in range(1, 5):
+        r = requests.get("https://api.coingecko.com/api/v3/coins/markets", timeout=30, params={
+            "vs_currency": "usd", "order": "market_cap_desc", "per_page": 250, "page": page,
+            "sparkline": False, "price_change_percentage": "24h,7d,30d"})
+        r.raise_for_status()
+        markets.extend(r.json())
+    for n in (100, 1000):
+        with open(os.path.join(FIXTURES_DIR, f"coingecko_{n}.json"), "w", encoding="utf-8") as f:
+            json.dump(markets[:n], f)
+
+    sources = {
+        "binance_ticker.json": "https://api.binance.com/api/v3/ticker/price",
+        "coinbase_stats.json": "https://api.exchange.coinbase.com/products/stats",
+        "kraken_ticker.json": "https://api.kraken.com/0/public/Ticker",
+        "dolarapi.json": "https://dolarapi.com/v1/dolares",
+        "frankfurter_eur.json": "https://api.frankfurter.app/latest?from=USD&to=EUR",
+    }
+    for name, url in sources.items():
+        r = requests.get(url, timeout=30)
+        r.raise_for_status()
+        with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+            json.dump(r.json(), f)
+    print(f"✅ Fixtures grabados en {FIXTURES_DIR}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--record", action="store_true", help="Graba payloads reales de las APIs")
+    if parser.parse_args().record:
+        record()
+    else:
+        print(f"{len(coingecko_markets(1000))} monedas sintéticas / {len(rss_feed(200))} bytes de RSS")
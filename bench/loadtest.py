@@ -0,0 +1,384 @@
+"""
+Load test: reproduce tráfico de Telegram contra los handlers reales de bot.py.
+
+    python -m bench.loadtest                                  # 1, 10 y 50 chats, 20 mensajes c/u
+    python -m bench.loadtest --chats 5,100 --messages 50
+    python -m bench.loadtest --mix top=1,analizar=1,ticker=4,texto=4 --llm-latency 0.8
+    python -m bench.loadtest --telegram-limits                # respeta el pacing real de la cola
+
+En localhost se levantan un stub de las APIs de mercado/noticias (sirve los
+fixtures de bench.fixtures por HTTP real) y un stub del LLM; Telegram se
+reemplaza por un cliente que registra cada envío. Cada chat simulado manda un
+mensaje, espera la respuesta y recién ahí manda el siguiente (como un usuario).
+
+Reporta throughput, p50/p99 (total y por tipo de mensaje), espera acumulada en
+el lock del storage y crecimiento de memoria (tracemalloc) por chat concurrente.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl
+
+from bench import offline
+
+DEFAULT_MIX = "top=2,analizar=1,ticker=4,texto=3"
+TICKERS = ["BTC", "ETH", "SOL", "XRP", "DOGE", "ADA", "AVAX", "LINK", "$SOL", "btc"]
+FREE_TEXT = [
+    "¿Qué onda con SOL y BTC hoy?",
+    "Cómo viene el mercado esta semana?",
+    "Quiero algo con riesgo bajo, nada de memecoins",
+    "Prefiero enfocarme en ETH y LINK",
+    "Hay alguna noticia fuerte de XRP?",
+    "Dame 3 monedas para mirar a mediano plazo",
+]
+
+# --- Stubs HTTP en localhost ---
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class _UpstreamHandler(_QuietHandler):
+    """
+    Espejo de las APIs externas: /<host>/<path> responde lo mismo que
+    bench.offline._route respondería para https://<host>/<path>.
+    """
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(self.path)
+        host, _, path = parsed.path.lstrip("/").partition("/")
+        resp = offline._route(f"https://{host}/{path}", dict(parse_qsl(parsed.query)))
+        ctype = "application/xml" if resp._json is None else "application/json"
+        self._reply(resp.status_code, resp.content, ctype)
+
+class _LLMHandler(_QuietHandler):
+    """Stub del LLM: POST JSON {system, prompt} -> {text} tras `latency` segundos."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.latency:
+            time.sleep(self.latency)
+        text = f"📊 Análisis simulado ({len(body.get('prompt', ''))} caracteres de contexto)."
+        self._reply(200, json.dumps({"text": text}).encode("utf-8"), "application/json")
+
+def _serve(handler: type, latency: float) -> Tuple[ThreadingHTTPServer, str]:
+    cls = type(handler.__name__, (handler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name=handler.__name__).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _mirror(base: str, url: str) -> str:
+    """https://api.binance.com/x -> http://127.0.0.1:PORT/api.binance.com/x"""
+    return f"{base}/{url.split('://', 1)[1]}"
+
+# --- Telegram simulado ---
+
+class StubTelegram:
+    """Reemplaza a TeleBot en la salida: registra envíos y despierta al chat que esperaba respuesta."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._waiters: Dict[int, threading.Event] = {}
+        self.sent = 0
+        self.chat_actions = 0
+        self.bytes_out = 0
+
+    def expect(self, chat_id: int) -> threading.Event:
+        ev = threading.Event()
+        with self._lock:
+            self._waiters[chat_id] = ev
+        return ev
+
+    def send_message(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                     reply_to_message_id: Optional[int] = None, **kwargs) -> SimpleNamespace:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent += 1
+            self.bytes_out += len(text or "")
+            ev = self._waiters.pop(chat_id, None)
+        if ev:
+            ev.set()
+        return SimpleNamespace(chat=SimpleNamespace(id=chat_id), text=text)
+
+    def send_chat_action(self, chat_id: int, action: str, **kwargs) -> bool:
+        with self._lock:
+            self.chat_actions += 1
+        return True
+
+def _make_message(chat_id: int, message_id: int, text: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        message_id=message_id,
+        chat=SimpleNamespace(id=chat_id, type="private"),
+        from_user=SimpleNamespace(id=chat_id, is_bot=False, first_name=f"carga{chat_id}"),
+        content_type="text",
+        text=text,
+        date=int(time.time()),
+    )
+
+def _extract_command(text: str) -> Optional[str]:
+    """Igual que telebot.util.extract_command: '/top@OrtelliBot x' -> 'top'."""
+    if not text or not text.startswith("/"):
+        return None
+    return text.split()[0].split("@")[0][1:]
+
+def _dispatch(bot: Any, message: SimpleNamespace) -> None:
+    """Recorre los handlers registrados en el TeleBot real, en el mismo orden que telebot."""
+    command = _extract_command(message.text)
+    for handler in bot.message_handlers:
+        filters = handler.get("filters", {})
+        if "commands" in filters and command not in filters["commands"]:
+            continue
+        if "func" in filters and not filters["func"](message):
+            continue
+        handler["function"](message)
+        return
+
+# --- Escenario ---
+
+def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("top", "analizar", "ticker", "texto"):
+            raise ValueError(f"Tipo de mensaje desconocido en --mix: {kind}")
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+def _pick(rng: random.Random, mix: List[Tuple[str, float]]) -> Tuple[str, str]:
+    kind = rng.choices([k for k, _ in mix], weights=[w for _, w in mix])[0]
+    if kind == "top":
+        return kind, "/top"
+    if kind == "analizar":
+        return kind, "/analizar"
+    if kind == "ticker":
+        return kind, rng.choice(TICKERS)
+    return kind, rng.choice(FREE_TEXT)
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+def run_level(bot_module: Any, tg: StubTelegram, chats: int, messages: int, mix: List[Tuple[str, float]],
+              think: float, timeout: float, track_memory: bool, seed: int) -> Dict[str, Any]:
+    """Corre `chats` usuarios concurrentes mandando `messages` mensajes cada uno."""
+    from core.storage import get_storage
+
+    store = get_storage()
+    latencies: Dict[str, List[float]] = {}
+    handler_ms: List[float] = []
+    errors = {"timeouts": 0, "exceptions": 0}
+    lock = threading.Lock()
+    base_chat = 10_000_000 + chats * 1000  # Chats nuevos en cada nivel: incluye el costo de crear sesión
+
+    def user(idx: int) -> None:
+        rng = random.Random(seed + idx)
+        chat_id = base_chat + idx
+        for n in range(messages):
+            kind, text = _pick(rng, mix)
+            waiter = tg.expect(chat_id)
+            t0 = time.perf_counter()
+            try:
+                _dispatch(bot_module.bot, _make_message(chat_id, n + 1, text))
+            except Exception:
+                with lock:
+                    errors["exceptions"] += 1
+                continue
+            t_handler = time.perf_counter()
+            delivered = waiter.wait(timeout)
+            t1 = time.perf_counter()
+            with lock:
+                handler_ms.append((t_handler - t0) * 1000)
+                if delivered:
+                    latencies.setdefault(kind, []).append((t1 - t0) * 1000)
+                else:
+                    errors["timeouts"] += 1
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+
+    if track_memory:
+        tracemalloc.start()
+        mem_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    lock_before = store.lock_wait_s
+    http_before = offline.http_calls()
+    sent_before = tg.sent
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,), name=f"chat-{i}") for i in range(chats)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - t_start
+
+    mem = {}
+    if track_memory:
+        mem_after, mem_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mem = {
+            "mem_growth_kb": round((mem_after - mem_before) / 1024, 1),
+            "mem_growth_per_chat_kb": round((mem_after - mem_before) / 1024 / chats, 1),
+            "mem_peak_mb": round(mem_peak / 1024 / 1024, 2),
+        }
+
+    all_lat = [x for v in latencies.values() for x in v]
+    done = len(all_lat)
+    lock_wait = store.lock_wait_s - lock_before
+    return {
+        "chats": chats,
+        "messages": done,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_s": round(done / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(all_lat, 50), 2),
+        "p99_ms": round(_percentile(all_lat, 99), 2),
+        "handler_p50_ms": round(_percentile(handler_ms, 50), 2),
+        "by_kind": {k: {"n": len(v), "p50_ms": round(_percentile(v, 50), 2), "p99_ms": round(_percentile(v, 99), 2)}
+                    for k, v in sorted(latencies.items())},
+        "storage_lock_wait_ms": round(lock_wait * 1000, 2),
+        "storage_lock_wait_per_msg_ms": round(lock_wait * 1000 / max(done, 1), 3),
+        "upstream_http_calls": offline.http_calls() - http_before,
+        "telegram_sends": tg.sent - sent_before,
+        **mem,
+        **errors,
+    }
+
+# --- Preparación del entorno ---
+
+def setup(args: argparse.Namespace) -> Tuple[Any, StubTelegram]:
+    """Levanta los stubs, apunta las URLs del bot a localhost e importa bot.py con Telegram simulado."""
+    _, upstream = _serve(_UpstreamHandler, args.upstream_latency)
+    _, llm_url = _serve(_LLMHandler, args.llm_latency)
+
+    tmp = tempfile.mkdtemp(prefix="ortelli-load-")
+    os.environ["STORAGE_PATH"] = os.path.join(tmp, "load_state.db")
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:LOADTEST")
+    os.environ["UNIVERSE_SIZE"] = str(args.universe)
+    os.environ["COINGECKO_MARKETS_URL"] = _mirror(upstream, "https://api.coingecko.com/api/v3/coins/markets")
+    os.environ["BINANCE_BASE_URL"] = _mirror(upstream, "https://api.binance.com")
+    os.environ["COINBASE_BASE_URL"] = _mirror(upstream, "https://api.exchange.coinbase.com")
+    os.environ["KRAKEN_BASE_URL"] = _mirror(upstream, "https://api.kraken.com")
+    os.environ.setdefault("METRICS_ENABLED", "1")
+    if not args.telegram_limits:
+        # Sin pacing de Telegram se mide la capacidad del bot, no la del rate limit
+        os.environ["TG_GLOBAL_RATE"] = "1000000"
+        os.environ["TG_CHAT_INTERVAL"] = "0"
+        os.environ["TG_GROUP_INTERVAL"] = "0"
+
+    # Recién ahora se importa core: las URLs y límites se leen al importar
+    offline.configure(universe=args.universe, rss_items=args.rss_items)
+    import requests
+    from core import engine, news, sources
+    from core.ratelimit import TokenBucket
+    from core.startup import default_tasks
+
+    news.RSS_FEEDS = [_mirror(upstream, u) for u in news.RSS_FEEDS]
+    sources._CG_BUDGET = TokenBucket(rate=1e9, capacity=1e9)  # El stub no tiene cuota
+
+    def llm_over_http(system_prompt: str, user_prompt: str) -> str:
+        r = requests.post(llm_url + "/generate", json={"system": system_prompt, "prompt": user_prompt}, timeout=60)
+        r.raise_for_status()
+        return r.json()["text"]
+
+    engine.gemini_render = llm_over_http
+
+    import bot as bot_module
+    tg = StubTelegram(latency=args.telegram_latency)
+    bot_module.bot.send_message = tg.send_message
+    bot_module.bot.send_chat_action = tg.send_chat_action
+    bot_module.outbox.bot = tg
+    bot_module.outbox.start()
+    # Mismo warm-up que en producción, pero sincrónico: los niveles se miden con el bot listo
+    bot_module.STARTUP.warm_up(default_tasks())
+    return bot_module, tg
+
+def _print_level(res: Dict[str, Any]) -> None:
+    mem = f"{res['mem_growth_per_chat_kb']:>9.1f} KB/chat" if "mem_growth_per_chat_kb" in res else ""
+    print(
+        f"👥 {res['chats']:>4} chats | {res['messages']:>5} msgs en {res['elapsed_s']:>7.2f}s | "
+        f"{res['throughput_msg_s']:>7.1f} msg/s | p50 {res['p50_ms']:>8.1f} ms | p99 {res['p99_ms']:>8.1f} ms | "
+        f"lock {res['storage_lock_wait_per_msg_ms']:>6.3f} ms/msg | {mem}"
+    )
+    for kind, st in res["by_kind"].items():
+        print(f"      · {kind:<9} n={st['n']:<5} p50 {st['p50_ms']:>8.1f} ms  p99 {st['p99_ms']:>8.1f} ms")
+    if res["timeouts"] or res["exceptions"]:
+        print(f"      ⚠️ {res['timeouts']} sin respuesta, {res['exceptions']} excepciones")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", default="1,10,50", help="Niveles de concurrencia (lista separada por comas)")
+    parser.add_argument("--messages", type=int, default=20, help="Mensajes por chat en cada nivel")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Pesos por tipo: top, analizar, ticker, texto")
+    parser.add_argument("--universe", type=int, default=250)
+    parser.add_argument("--rss-items", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Segundos que tarda el stub del LLM")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="Segundos por request al stub HTTP")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Segundos por send_message")
+    parser.add_argument("--telegram-limits", action="store_true", help="Respeta el pacing real de la cola")
+    parser.add_argument("--think", type=float, default=0.0, help="Pausa media entre mensajes de un mismo chat")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Espera máxima por respuesta")
+    parser.add_argument("--cold", action="store_true", help="Invalida los cachés antes de cada nivel")
+    parser.add_argument("--no-memory", action="store_true", help="Sin tracemalloc (latencias más realistas)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    mix = _parse_mix(args.mix)
+    levels = [int(c) for c in args.chats.split(",") if c.strip()]
+
+    bot_module, tg = setup(args)
+    print(bot_module.STARTUP.report())
+    print(f"🏋️ Load test: {args.messages} msgs/chat, mix {args.mix}, universo {args.universe}, "
+          f"LLM {args.llm_latency}s, upstream {args.upstream_latency}s")
+
+    # Calentamos una vez para que el primer nivel no pague el snapshot inicial
+    if not args.cold:
+        _dispatch(bot_module.bot, _make_message(1, 1, "/top"))
+
+    results = []
+    for chats in levels:
+        if args.cold:
+            offline.invalidate_all()
+        res = run_level(bot_module, tg, chats, args.messages, mix, args.think, args.timeout,
+                        not args.no_memory, args.seed)
+        results.append(res)
+        _print_level(res)
+
+    bot_module.outbox.stop()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "levels": results}, f, indent=2)
+        print(f"💾 Resultados en {args.json}")
+    failed = sum(r["timeouts"] + r["exceptions"] for r in results)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Entorno offline para benchmarks: HTTP ruteado a fixtures, LLM falso y
+storage en un directorio temporal. Llamar a `setup()` ANTES de importar core.
+"""
+import os
+import json
+import time
+import timeit
+import tempfile
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from bench import fixtures
+
+_STATE: Dict[str, Any] = {"universe": 250, "rss_items": 50, "llm_latency": 0.0, "http_calls": 0}
+
+class FakeResponse:
+    def __init__(self, payload: Any, status_code: int = 200):
+        self.status_code = status_code
+        if isinstance(payload, (bytes, str)):
+            self.content = payload.encode("utf-8") if isinstance(payload, str) else payload
+            self._json = None
+        else:
+            self._json = payload
+            self.content = json.dumps(payload).encode("utf-8")
+
+    def json(self):
+        return self._json if self._json is not None else json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code} Client Error", response=self)
+
+_FIXTURES: Dict[tuple, Any] = {}
+
+def _fixture(kind: str, size: int, build: Callable[[], Any]) -> Any:
+    """Genera cada payload una sola vez: el benchmark mide al bot, no al generador."""
+    key = (kind, size)
+    if key not in _FIXTURES:
+        _FIXTURES[key] = build()
+    return _FIXTURES[key]
+
+def _route(url: str, params: Optional[dict] = None) -> FakeResponse:
+    """Devuelve el fixture que corresponde a cada endpoint conocido."""
+    _STATE["http_calls"] += 1
+    host, path = urlparse(url).netloc, urlparse(url).path
+    n = _STATE["universe"]
+
+    if "coingecko" in host and path.endswith("/coins/markets"):
+        markets = _fixture("markets", n, lambda: fixtures.coingecko_markets(n))
+        per_page = int((params or {}).get("per_page", 100))
+        page = int((params or {}).get("page", 1))
+        return FakeResponse(markets[(page - 1) * per_page: page * per_page])
+    if path.endswith("/ticker/price"):
+        return FakeResponse(_fixture("binance", n, lambda: fixtures.binance_ticker(fixtures.coingecko_markets(n))))
+    if path.endswith("/products/stats"):
+        return FakeResponse(_fixture("coinbase", n, lambda: fixtures.coinbase_stats(fixtures.coingecko_markets(n))))
+    if path.endswith("/public/Ticker"):
+        return FakeResponse(_fixture("kraken", n, lambda: fixtures.kraken_ticker(fixtures.coingecko_markets(n))))
+    if "dolarapi" in host:
+        return FakeResponse(fixtures.dolarapi_rates())
+    if "frankfurter" in host:
+        return FakeResponse(fixtures.frankfurter_eur())
+    if "rss" in url or "feed" in url:
+        items = _STATE["rss_items"]
+        return FakeResponse(_fixture("rss:" + host, items, lambda: fixtures.rss_feed(items, source=host)))
+    return FakeResponse({}, status_code=404)
+
+def fake_llm(system_prompt: str, user_prompt: str) -> str:
+    if _STATE["llm_latency"]:
+        time.sleep(_STATE["llm_latency"])
+    return f"📊 Análisis simulado ({len(user_prompt)} caracteres de contexto)."
+
+def setup(universe: int = 250, rss_items: int = 50, llm_latency: float = 0.0) -> str:
+    """Prepara variables de entorno y parchea HTTP/LLM. Devuelve el directorio temporal."""
+    tmp = tempfile.mkdtemp(prefix="ortelli-bench-")
+    os.environ.setdefault("STORAGE_PATH", os.path.join(tmp, "bench_state.db"))
+    os.environ.setdefault("STATE_PATH", os.path.join(tmp, "state.json"))
+    os.environ["UNIVERSE_SIZE"] = str(universe)
+    os.environ.setdefault("METRICS_ENABLED", "1")
+    configure(universe=universe, rss_items=rss_items, llm_latency=llm_latency)
+
+    import requests
+    requests.get = lambda url, params=None, **kw: _route(url, params)
+    requests.Session.get = lambda self, url, params=None, **kw: _route(url, params)
+
+    from core import sources, engine
+    from core.ratelimit import TokenBucket
+    sources._CG_BUDGET = TokenBucket(rate=1e9, capacity=1e9)  # Sin red no hay cuota que cuidar
+    sources.UNIVERSE_SIZE = universe
+    engine.gemini_render = fake_llm
+    return tmp
+
+def configure(**kwargs) -> None:
+    """Cambia tamaño de universo / feeds / latencia del LLM entre escenarios."""
+    _STATE.update({k: v for k, v in kwargs.items() if v is not None})
+    if "universe" in kwargs:
+        try:
+            from core import sources
+            sources.UNIVERSE_SIZE = kwargs["universe"]
+        except ImportError:
+            pass
+
+def http_calls() -> int:
+    return _STATE["http_calls"]
+
+def invalidate_all() -> None:
+    from core.cache import CACHE_REGISTRY
+    CACHE_REGISTRY.invalidate()
+
+def timed(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """
+    Tiempo por llamada en milisegundos. Cada muestra es un lazo interno de `fn` que dura
+    al menos ~0.2s (timeit autorange), así los cuerpos de microsegundos no quedan dominados
+    por el ruido del reloj. Devuelve el mínimo de las muestras (la medida más estable),
+    la mediana y el ruido relativo (mediana - mínimo) / mínimo.
+    """
+    for _ in range(warmup):
+        fn()
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    samples = sorted(t / loops * 1000 for t in timer.repeat(repeat=repeat, number=loops))
+    best, median = samples[0], samples[len(samples) // 2]
+    return {"min_ms": round(best, 4), "median_ms": round(median, 4),
+            "noise": round((median - best) / best, 3) if best else 0.0, "loops": loops}
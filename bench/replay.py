@@ -0,0 +1,115 @@
+"""
+Replay de updates contra el endpoint del webhook (pruebas locales del modo webhook).
+
+    # Terminal 1: bot en modo webhook sin registrar nada en Telegram
+    WEBHOOK_URL=http://localhost:8443 WEBHOOK_REGISTER=0 WEBHOOK_SECRET=dev WEBHOOK_PROCESSES=2 python bot.py
+
+    # Terminal 2: updates grabados (JSONL, un Update de Telegram por línea) o sintéticos
+    python -m bench.replay updates.jsonl --secret dev
+    python -m bench.replay --synthetic 200 --chats 20 --secret dev --concurrency 16
+    python -m bench.replay --synthetic 50 --save updates.jsonl     # graba los sintéticos
+
+Reporta status HTTP recibidos y latencia del ack (el webhook no espera al handler).
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import Dict, List
+
+from bench.loadtest import TICKERS, FREE_TEXT
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def synthetic_updates(n: int, chats: int, seed: int = 7) -> List[Dict]:
+    """Updates con la forma que manda Telegram (mensajes privados de `chats` usuarios)."""
+    rnd = random.Random(seed)
+    texts = ["/top", "/analizar", "/ayuda"] + TICKERS + FREE_TEXT
+    now = int(time.time())
+    out = []
+    for i in range(n):
+        chat_id = 100000 + rnd.randrange(chats)
+        text = rnd.choice(texts)
+        msg = {
+            "message_id": i + 1,
+            "date": now,
+            "chat": {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        out.append({"update_id": 900000 + i, "message": msg})
+    return out
+
+def load_updates(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def post_update(url: str, update: Dict, secret: str, timeout: float) -> tuple:
+    body = json.dumps(update).encode("utf-8")
+    req = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    if secret:
+        req.add_header(SECRET_HEADER, secret)
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            status = r.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - t0
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Postea updates de Telegram al webhook local.")
+    p.add_argument("file", nargs="?", help="JSONL con updates grabados")
+    p.add_argument("--url", default="http://localhost:8443/telegram")
+    p.add_argument("--secret", default="")
+    p.add_argument("--synthetic", type=int, default=0, help="Genera N updates sintéticos")
+    p.add_argument("--chats", type=int, default=10)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--timeout", type=float, default=10.0)
+    p.add_argument("--save", help="Guarda los updates (JSONL) en vez de postearlos")
+    p.add_argument("--seed", type=int, default=7)
+    args = p.parse_args(argv)
+
+    if args.file:
+        updates = load_updates(args.file)
+    elif args.synthetic:
+        updates = synthetic_updates(args.synthetic, args.chats, args.seed)
+    else:
+        p.error("Indicá un archivo JSONL o --synthetic N")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            for u in updates:
+                f.write(json.dumps(u, ensure_ascii=False) + "\n")
+        print(f"💾 {len(updates)} updates en {args.save}")
+        return 0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda u: post_update(args.url, u, args.secret, args.timeout), updates))
+    elapsed = time.perf_counter() - t0
+
+    statuses = Counter(s for s, _ in results)
+    lat_ms = [lat * 1000 for _, lat in results]
+    print(f"🪝 {len(updates)} updates en {elapsed:.2f}s ({len(updates) / elapsed:.0f}/s) → {args.url}")
+    print("   status: " + ", ".join(f"{s or 'error'}={c}" for s, c in sorted(statuses.items())))
+    print(f"   ack p50 {_pct(lat_ms, 0.5):.1f} ms · p99 {_pct(lat_ms, 0.99):.1f} ms")
+    return 0 if set(statuses) == {200} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Suite de benchmarks offline del pipeline del engine.
+
+    python -m bench.run                   # corre y compara contra bench/baselines.json
+    python -m bench.run --save-baseline   # guarda los resultados como nueva línea base
+    python -m bench.run --only ttlcache   # filtra por nombre
+    python -m bench.run --quick           # menos repeticiones y sin el universo de 10k
+
+Se compara el mínimo por llamada (lazos internos, ver offline.timed). Sale con código 1 si
+algún benchmark empeora más que --threshold (default 25%) más dos veces el ruido medido.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+from typing import Callable, Dict, List, Tuple
+
+from bench import offline, fixtures
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+Benchmark = Tuple[str, Callable[[], None], Callable[[], None]]  # (nombre, setup, cuerpo)
+
+def _micro_benchmarks(sizes: List[int], feed_sizes: List[int]) -> List[Benchmark]:
+    from core.cache import TTLCache
+    from core.market import verify_prices
+    from core import news, signals, multisource, sources
+    from core.news_index import NewsIndex
+
+    benches: List[Benchmark] = []
+
+    # --- TTLCache ---
+    cache = TTLCache(ttl_seconds=600, max_items=4096)
+    keys = [f"k{i}" for i in range(2000)]
+
+    def ttl_set():
+        for k in keys:
+            cache.set(k, k)
+
+    def ttl_get():
+        for k in keys:
+            cache.get(k)
+
+    benches += [("ttlcache.set_2000", lambda: None, ttl_set), ("ttlcache.get_2000", ttl_set, ttl_get)]
+
+    for n in sizes:
+        def _rows(n=n):
+            offline.configure(universe=n)
+            return sources.fetch_market_universe(n)
+
+        # --- verify_prices (incluye agregación multi-exchange cacheada) ---
+        def setup_verify(n=n):
+            offline.configure(universe=n)
+            multisource.aggregate_prices(force=True)
+            _SHARED["rows"] = _rows(n)
+
+        benches.append((f"verify_prices.{n}", setup_verify, lambda: verify_prices(_SHARED["rows"])))
+
+        # --- fetch_market_universe con caché frío (parseo + merge de páginas) ---
+        def cold_universe(n=n):
+            offline.invalidate_all()
+            sources.fetch_market_universe(n)
+
+        benches.append((f"fetch_market_universe.cold.{n}", lambda n=n: offline.configure(universe=n), cold_universe))
+
+        # --- agregación multi-exchange (bulk tickers -> mediana/quórum) ---
+        benches.append((f"aggregate_prices.{n}", lambda n=n: offline.configure(universe=n),
+                        lambda: multisource.aggregate_prices(force=True)))
+
+    for items in feed_sizes:
+        def parse_feed(items=items):
+            offline.configure(rss_items=items)
+            news.fetch_rss("https://bench.example/feed")
+
+        feed = [{"title": f"{t} {i}"} for i, t in enumerate(fixtures._HEADLINE_TEMPLATES * (items // 9 + 1))][:items]
+
+        def score_cold(feed=feed):
+            signals._SCORE_CACHE.invalidate()
+            signals.build_news_signals(feed)
+
+        def index_feed(feed=feed):
+            ix = NewsIndex()
+            ix.set_universe(fixtures.coingecko_markets(250))
+            ix.add_articles([dict(f, link=str(i)) for i, f in enumerate(feed)])
+            ix.query(["BTC", "SOL", "ETH"])
+
+        benches += [
+            (f"fetch_rss.{items}", lambda: None, parse_feed),
+            (f"build_news_signals.cold.{items}", lambda: None, score_cold),
+            (f"build_news_signals.warm.{items}", lambda feed=feed: signals.build_news_signals(feed),
+             lambda feed=feed: signals.build_news_signals(feed)),
+            (f"news_index.build_query.{items}", lambda: None, index_feed),
+        ]
+    return benches
+
+_SHARED: Dict[str, object] = {}
+
+def _e2e_benchmarks(sizes: List[int]) -> List[Benchmark]:
+    from core.engine import build_engine_analysis
+    from core.brain import load_brain_state
+
+    benches: List[Benchmark] = []
+    for n in sizes:
+        def setup(n=n):
+            offline.configure(universe=n, rss_items=50)
+            offline.invalidate_all()
+            build_engine_analysis("warmup", 1, load_brain_state(1))
+
+        def ask(n=n):
+            build_engine_analysis("¿Qué onda con SOL y BTC hoy?", 1, load_brain_state(1))
+
+        def ticker(n=n):
+            build_engine_analysis("BTC", 1, load_brain_state(1))
+
+        def cold(n=n):
+            offline.invalidate_all()
+            build_engine_analysis("/top", 1, load_brain_state(1))
+
+        benches += [
+            (f"engine.e2e.warm.{n}", setup, ask),
+            (f"engine.e2e.ticker.{n}", setup, ticker),
+            (f"engine.e2e.cold.{n}", lambda n=n: offline.configure(universe=n, rss_items=50), cold),
+        ]
+    return benches
+
+def run(only: str = "", quick: bool = False) -> Dict[str, Dict[str, float]]:
+    sizes = [100, 1000] if quick else [100, 1000, 10000]
+    feed_sizes = [50, 500] if quick else [50, 500, 5000]
+    repeat = 5 if quick else 7
+
+    benches = _micro_benchmarks(sizes, feed_sizes) + _e2e_benchmarks(sizes)
+    results = {}
+    for name, setup, body in benches:
+        if only and only not in name:
+            continue
+        setup()
+        calls_before = offline.http_calls()
+        body()  # HTTP de UNA llamada (el cronometraje repite el cuerpo muchas veces)
+        calls = offline.http_calls() - calls_before
+        res = offline.timed(body, repeat=repeat)
+        res["http_calls"] = calls
+        results[name] = res
+        print(f"  {name:<42} {res['min_ms']:>10.3f} ms  (mediana {res['median_ms']:.3f}, ruido {res['noise']:.0%})")
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Reporte de regresiones contra la línea base guardada."""
+    if not os.path.exists(BASELINE_PATH):
+        print("ℹ️ No hay baselines guardados (usá --save-baseline).")
+        return []
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+
+    regressions = []
+    print(f"\n{'benchmark':<42} {'base ms':>10} {'ahora ms':>10} {'Δ':>8}")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<42} {'-':>10} {res['min_ms']:>10.3f}    nuevo")
+            continue
+        delta = (res["min_ms"] - base["min_ms"]) / max(base["min_ms"], 1e-6)
+        # Un benchmark ruidoso (en la base o ahora) necesita un cambio más grande para contar
+        limit = threshold + 2 * max(base.get("noise", 0.0), res.get("noise", 0.0))
+        flag = ""
+        if delta > limit:
+            flag = "  ❌ REGRESIÓN"
+            regressions.append(name)
+        elif delta < -limit:
+            flag = "  ✅ mejora"
+        print(f"{name:<42} {base['min_ms']:>10.3f} {res['min_ms']:>10.3f} {delta:>+7.0%}{flag}")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--only", default="")
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    offline.setup()
+    print(f"🏁 Benchmarks offline (Python {platform.python_version()})")
+    results = run(only=args.only, quick=args.quick)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results},
+                      f, indent=2, sort_keys=True)
+        print(f"💾 Baseline guardado en {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresiones por encima de {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ Sin regresiones.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
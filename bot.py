@@ -1,14 +1,35 @@
 import os
+import re
+import atexit
+import time
 import logging
-import json
 from telebot import TeleBot, types
 from dotenv import load_dotenv
 
 # --- IMPORTACIONES SINCRONIZADAS ---
+from core.startup import STARTUP, default_tasks  # Primero: mide cuánto tardan los imports
 from core.engine import build_engine_analysis
 # Eliminamos add_turn de aquí porque el Engine ya se encarga de registrar los turnos
-from core.brain import ensure_brain, save_brain_state
+from core.brain import load_brain_state, save_brain_state, get_session
+from core.memory import get_admin_id, set_chat_id
+from core.storage import get_storage
 from core.learning import register_user_interest
+from core.outbox import SendQueue
+from core.digest import FREQUENCIES, start_digest_scheduler
+from core.pricebook import start_price_stream, create_live_segment, start_live_publisher, LIVE_SNAPSHOT
+from core import metrics
+from core.cache import CACHE_REGISTRY
+from core.portfolio import PORTFOLIO, render_portfolio, fmt_price, parse_amount
+from core.sources import fetch_market_universe
+from core.market import verify_prices
+from core.snapshot_diff import SNAPSHOT_DIFF, render_events, EVENT_DEPEG, EVENT_REPEG
+from core import webhook
+from core.shared_snapshot import SHARED_SNAPSHOT
+from core.multisource import aggregate_prices
+from core.news import fetch_news
+from core.fx import FX
+
+STARTUP.mark("imports")
 
 # Configuración de Logs
 logging.basicConfig(
@@ -24,43 +45,90 @@ if not TOKEN:
     logger.critical("❌ No se encontró TELEGRAM_TOKEN.")
     exit(1)
 
-bot = TeleBot(TOKEN, parse_mode="Markdown")
+# En modo webhook los handlers corren en nuestros workers (afinidad por chat), no en el pool de telebot
+bot = TeleBot(TOKEN, parse_mode="Markdown", threaded=not webhook.WEBHOOK_URL)
 
 # --- FUNCIONES DE ESTADO (PUENTE) ---
 
-def load_full_state():
-    """Carga el estado persistente con manejo de errores robusto."""
-    if os.path.exists("brain_state.json"):
-        try:
-            with open("brain_state.json", "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data if isinstance(data, dict) else {}
-        except (json.JSONDecodeError, Exception) as e:
-            logger.error(f"⚠️ Archivo de estado corrupto, iniciando nuevo: {e}")
-            return {}
-    return {}
+def load_full_state(chat_id=None):
+    """Carga el estado de trabajo del chat desde el storage unificado."""
+    return load_brain_state(chat_id)
 
 def save_full_state(state):
     """Guarda el estado usando la persistencia de brain."""
     save_brain_state(state)
 
+# --- SUSCRIPCIONES AL DIGEST ---
+
+def get_subscribers(freq: str):
+    subs = get_storage().items("subscribers")
+    return [int(cid) for cid, f in subs.items() if f == freq]
+
+def remove_subscriber(chat_id):
+    get_storage().delete("subscribers", chat_id)
+
+# --- ARRANQUE EN CALIENTE ---
+
+WARMUP_GRACE = float(os.getenv("WARMUP_GRACE", "3"))  # Espera máxima antes de contestar "calentando"
+
+def reply_while_warming(chat_id, reply_to=None) -> bool:
+    """
+    Si el warm-up no terminó, contesta con el último reporte persistido de ESE chat
+    (o un aviso corto) y devuelve True para que el handler no siga.
+    """
+    if STARTUP.wait_ready(WARMUP_GRACE):
+        return False
+
+    metrics.incr("warming_replies")
+    # Por chat: el reporte sale del historial, filtros, riesgo y moneda de quien lo pidió
+    last = get_storage().get("reports", chat_id)
+    if last and last.get("text"):
+        mins = max(1, int((time.time() - last.get("ts", 0)) / 60))
+        text = f"⏳ Estoy arrancando. Mientras tanto, el último reporte (hace {mins} min):\n\n{last['text']}"
+    else:
+        text = "⏳ Estoy arrancando y cargando datos de mercado. Probá de nuevo en unos segundos."
+    outbox.send(chat_id, text, reply_to=reply_to)
+    return True
+
+# Toda salida pasa por la cola: respeta límites de Telegram y parte mensajes largos
+outbox = SendQueue(bot, on_forbidden=remove_subscriber)
+
+# --- CAMBIOS DE MERCADO ---
+
+ALERT_EVENTS = (EVENT_DEPEG, EVENT_REPEG)
+# Con varios procesos cada uno ve los mismos cambios: solo uno avisa al admin
+ALERTS_ENABLED = True
+
+def on_market_changes(events):
+    """Consumidor del stream de cambios: alerta al admin e invalida solo lo afectado."""
+    alerts = [e for e in events if e["type"] in ALERT_EVENTS]
+    admin = get_admin_id()
+    if alerts and admin and ALERTS_ENABLED:
+        outbox.send(admin, "🔔 Alerta de mercado\n" + render_events(alerts), parse_mode="")
+
+    # Los reportes persistidos solo se descartan si mencionan alguna moneda que cambió
+    changed = {e["symbol"] for e in events}
+    for cid, last in get_storage().items("reports").items():
+        if isinstance(last, dict) and changed & set(re.findall(r"[A-Z0-9]{2,10}", last.get("text") or "")):
+            get_storage().delete("reports", cid)
+            metrics.incr("report_invalidations")
+
+SNAPSHOT_DIFF.subscribe(on_market_changes)
+
 # --- MANEJADORES DE COMANDOS ---
 
 @bot.message_handler(commands=['start'])
 def cmd_start(message):
     chat_id = message.chat.id
-    state = load_full_state()
-    ensure_brain(state) 
     
-    # Corregido: Usar una clave consistente para el administrador
-    if not state.get("admin_chat_id"):
-        state["admin_chat_id"] = chat_id
-        save_full_state(state)
+    # Un único admin para todo el bot (namespace "admin" del storage)
+    if not get_admin_id():
+        set_chat_id(chat_id)
         msg = "👑 *¡Bienvenido, Administrador!* Bot configurado con éxito."
     else:
         msg = "🚀 *OrtelliCryptoAI Activo.* ¿Qué cripto analizamos hoy?"
     
-    bot.send_message(chat_id, msg)
+    outbox.send(chat_id, msg)
 
 @bot.message_handler(commands=['ayuda'])
 def cmd_help(message):
@@ -69,20 +137,166 @@ def cmd_help(message):
         "• `/analizar` - Reporte general de mercado.\n"
         "• `/top` - Ver las monedas con mejor score.\n"
         "• Enviá un ticker (ej: `BTC`) para análisis rápido.\n"
+        "• `/suscribir diario|horario` - Recibir el resumen automático.\n"
+        "• `/desuscribir` - Dejar de recibir el resumen.\n"
+        "• `/cartera` - Valuación, P&L y riesgo de tu cartera.\n"
+        "• `/agregar BTC 0.5 [precio]` / `/quitar BTC [cantidad]` - Cargar posiciones.\n"
+        "• Preferencias: `riesgo bajo`, `evitá memecoins`, `enfocate en SOL y ETH`, `top 10`, `mediano plazo`.\n"
+        "• Moneda: `precios en pesos`, `precios en dólar MEP`, `moneda EUR`, `moneda BTC` (por defecto USD).\n"
         "• Hablá normal: el bot aprende tus preferencias de riesgo."
     )
-    bot.reply_to(message, help_text)
+    outbox.send(message.chat.id, help_text, reply_to=message.message_id)
+
+@bot.message_handler(commands=['suscribir'])
+def cmd_subscribe(message):
+    chat_id = message.chat.id
+    parts = (message.text or "").split()
+    freq = parts[1].lower() if len(parts) > 1 else "diario"
+    if freq not in FREQUENCIES:
+        outbox.send(chat_id, "⚠️ Usá `/suscribir diario` o `/suscribir horario`.")
+        return
+
+    get_storage().put("subscribers", chat_id, freq)
+    outbox.send(chat_id, f"✅ Suscripto al resumen *{freq}*.")
+
+@bot.message_handler(commands=['desuscribir'])
+def cmd_unsubscribe(message):
+    remove_subscriber(message.chat.id)
+    outbox.send(message.chat.id, "👋 Listo, no vas a recibir más resúmenes.")
+
+@bot.message_handler(commands=['stats'])
+def cmd_stats(message):
+    chat_id = message.chat.id
+    if chat_id != get_admin_id():
+        outbox.send(chat_id, "🔒 Comando solo para el administrador.")
+        return
+
+    # `/stats prom` devuelve el texto crudo de Prometheus. Métricas con `_`, `{` y `*`:
+    # van como texto plano (parse_mode="", con None telebot aplica el Markdown por defecto)
+    if "prom" in (message.text or "").lower():
+        outbox.send(chat_id, metrics.render_prometheus(), parse_mode="")
+        return
+    metrics.set_gauge("outbox_pending", outbox.pending())
+    outbox.send(chat_id, STARTUP.report() + "\n\n" + metrics.render_stats_text(), parse_mode="")
+
+@bot.message_handler(commands=['cache'])
+def cmd_cache(message):
+    """Admin: `/cache`, `/cache invalidar <ns>`, `/cache precalentar <ns>`."""
+    chat_id = message.chat.id
+    if chat_id != get_admin_id():
+        outbox.send(chat_id, "🔒 Comando solo para el administrador.")
+        return
+
+    parts = (message.text or "").split()
+    action = parts[1].lower() if len(parts) > 1 else "stats"
+    namespace = parts[2] if len(parts) > 2 else None
+
+    if action == "invalidar":
+        result = CACHE_REGISTRY.invalidate(namespace)
+        lines = [f"🧹 Invalidado ({namespace or 'todos'}):"] + [f"• {n}: {c} entradas" for n, c in result.items()]
+    elif action == "precalentar":
+        result = CACHE_REGISTRY.prewarm(namespace)
+        lines = [f"🔥 Pre-calentado ({namespace or 'todos'}):"] + [f"• {n}: {r}" for n, r in result.items()]
+    else:
+        lines = ["🗃️ Cachés registrados:"]
+        for name, st in CACHE_REGISTRY.stats(namespace or (action if action != "stats" else None)).items():
+            ratio = st.get("hit_ratio")
+            lines.append(
+                f"• {name}: {st.get('items_count', 0)} ítems, "
+                f"{st.get('memory_bytes', 0) / 1024:.0f} KB, "
+                f"hit {'-' if ratio is None else f'{ratio:.0%}'}, "
+                f"evict {st.get('evictions', 0)}, stale {st.get('stale_served', 0)}, "
+                f"edad máx {st.get('oldest_age_s') or 0:.0f}s"
+            )
+    outbox.send(chat_id, "\n".join(lines), parse_mode="")
+
+@bot.message_handler(commands=['cambios'])
+def cmd_changes(message):
+    """Admin: últimos eventos del stream de cambios entre snapshots."""
+    chat_id = message.chat.id
+    if chat_id != get_admin_id():
+        outbox.send(chat_id, "🔒 Comando solo para el administrador.")
+        return
+    st = SNAPSHOT_DIFF.get_stats()
+    header = (f"🔀 Cambios de mercado ({st['snapshots']} snapshots, {st['tracked']} monedas, "
+              f"{st['rows_unchanged']} filas sin cambios):")
+    outbox.send(chat_id, header + "\n" + render_events(SNAPSHOT_DIFF.events_since(0)), parse_mode="")
+
+# --- CARTERA ---
+
+def _market_snapshot():
+    rows, _ = verify_prices(fetch_market_universe())
+    return rows
+
+@bot.message_handler(commands=['cartera'])
+def cmd_portfolio(message):
+    chat_id = message.chat.id
+    if reply_while_warming(chat_id):
+        return
+    rows = _market_snapshot()
+    PORTFOLIO.revalue(rows)
+    currency = get_session(load_full_state(chat_id), chat_id)["facts"].get("currency", "USD")
+    rate = FX.rate(currency, rows)
+    if rate is None:
+        currency, rate = "USD", 1.0
+    outbox.send(chat_id, render_portfolio(PORTFOLIO.summary(chat_id), currency, rate))
+
+@bot.message_handler(commands=['agregar'])
+def cmd_add_holding(message):
+    """`/agregar SYM CANTIDAD [PRECIO]`: sin precio se toma el actual como costo."""
+    chat_id = message.chat.id
+    parts = (message.text or "").split()
+    try:
+        sym = parts[1].upper().replace("$", "")
+        qty = parse_amount(parts[2])
+        price = parse_amount(parts[3]) if len(parts) > 3 else None
+    except (IndexError, ValueError):
+        outbox.send(chat_id, "⚠️ Usá `/agregar BTC 0.5` o `/agregar BTC 0.5 60000`.")
+        return
+
+    if price is None:
+        row = next((r for r in _market_snapshot() if (r.get("symbol") or "").upper() == sym), None)
+        if not row:
+            outbox.send(chat_id, f"⚠️ No encontré *{sym}* en el mercado. Indicá el precio de compra.")
+            return
+        price = float(row.get("price") or row.get("current_price") or 0)
+    try:
+        pos = PORTFOLIO.add(chat_id, sym, qty, price)
+    except ValueError as e:
+        outbox.send(chat_id, f"⚠️ {e}")
+        return
+    outbox.send(chat_id, f"✅ *{sym}*: {pos['qty']:g} (costo promedio {fmt_price(pos['cost'] / pos['qty'])}).")
+
+@bot.message_handler(commands=['quitar'])
+def cmd_remove_holding(message):
+    chat_id = message.chat.id
+    parts = (message.text or "").split()
+    try:
+        sym = parts[1].upper().replace("$", "")
+        qty = parse_amount(parts[2]) if len(parts) > 2 else None
+    except (IndexError, ValueError):
+        outbox.send(chat_id, "⚠️ Usá `/quitar BTC` o `/quitar BTC 0.1`.")
+        return
+    if PORTFOLIO.remove(chat_id, sym, qty):
+        outbox.send(chat_id, f"🗑️ Listo, actualicé *{sym}* en tu cartera.")
+    else:
+        outbox.send(chat_id, f"⚠️ No tenés *{sym}* en la cartera.")
 
 @bot.message_handler(commands=['analizar', 'top'])
 def cmd_market_report(message):
     chat_id = message.chat.id
+    if reply_while_warming(chat_id):
+        return
     bot.send_chat_action(chat_id, 'typing')
     
-    state = load_full_state()
+    state = load_full_state(chat_id)
     # Pasamos el texto del comando para que el engine sepa qué filtrar
     response = build_engine_analysis(message.text, chat_id, state)
     
-    bot.send_message(chat_id, response)
+    outbox.send(chat_id, response)
+    # Queda persistido para responder durante el próximo arranque
+    if response and not response.startswith(("⚠️", "❌", "🤯")):
+        get_storage().put("reports", chat_id, {"text": response, "ts": time.time()})
 
 # --- PROCESAMIENTO DE LENGUAJE NATURAL ---
 
@@ -93,9 +307,12 @@ def handle_natural_language(message):
     
     # 1. Aprender de los tickers mencionados globalmente
     register_user_interest(user_text)
+
+    if reply_while_warming(chat_id, reply_to=message.message_id):
+        return
     
     # 2. Cargar estado fresco para esta sesión
-    state = load_full_state()
+    state = load_full_state(chat_id)
     
     bot.send_chat_action(chat_id, 'typing')
     
@@ -104,15 +321,75 @@ def handle_natural_language(message):
         # Esto evita que los mensajes se guarden doble o se crucen
         response = build_engine_analysis(user_text, chat_id, state)
         
-        bot.reply_to(message, response)
+        outbox.send(chat_id, response, reply_to=message.message_id)
         
     except Exception as e:
         logger.error(f"💥 Error en handle_natural_language: {e}")
-        bot.send_message(chat_id, "⚠️ Tuve un problema al procesar tu mensaje. Probá de nuevo.")
+        outbox.send(chat_id, "⚠️ Tuve un problema al procesar tu mensaje. Probá de nuevo.")
 
 # --- INICIO ---
 
+def start_services(worker_index: int = 0):
+    """Servicios de fondo de un proceso que atiende chats (polling o worker del webhook)."""
+    global ALERTS_ENABLED
+    ALERTS_ENABLED = worker_index == 0
+    # Warm-up en paralelo (mercado, exchanges, noticias, estado, LLM) mientras ya escuchamos
+    STARTUP.start(default_tasks())
+    outbox.start()
+    if not SHARED_SNAPSHOT.is_reader:
+        start_price_stream()  # Worker multi-proceso: el stream es uno solo, en el padre
+    # Singletons del despliegue: un solo scheduler de digest y un solo /metrics
+    if worker_index == 0:
+        metrics.start_metrics_server()
+        start_digest_scheduler(outbox, get_subscribers)
+
+def process_update(update: dict):
+    """Procesa un update crudo de Telegram (JSON del webhook) en el hilo actual."""
+    bot.process_new_updates([types.Update.de_json(update)])
+
+SHARED_NEWS_LIMIT = 200
+
+def shared_sections() -> dict:
+    """Lo que el refrescador publica para los workers: una sola descarga por despliegue."""
+    return {
+        "market": fetch_market_universe(),
+        "exchanges": aggregate_prices(),
+        "news": fetch_news(limit_total=SHARED_NEWS_LIMIT),
+        "fx": FX.table(),
+    }
+
+def run_webhook():
+    global ALERTS_ENABLED
+    secret = webhook.resolve_secret()  # Sin secreto no se arranca: cualquiera podría postear updates
+    if webhook.WEBHOOK_PROCESSES > 0:
+        # El segmento compartido y los procesos se crean antes de arrancar cualquier hilo (fork seguro)
+        SHARED_SNAPSHOT.create()
+        atexit.register(SHARED_SNAPSHOT.close)
+        if create_live_segment():
+            atexit.register(LIVE_SNAPSHOT.close)
+        pool = webhook.ProcessPool(webhook.WEBHOOK_PROCESSES, process_update, init=start_services)
+        # El padre solo refresca datos y recibe updates; los avisos salen del worker 0
+        ALERTS_ENABLED = False
+        SHARED_SNAPSHOT.start_publisher(shared_sections)
+        start_live_publisher()
+    else:
+        start_services()
+        pool = webhook.ShardedExecutor(webhook.WEBHOOK_THREADS, process_update)
+    server = webhook.WebhookServer(pool, secret)
+
+    if webhook.WEBHOOK_REGISTER:
+        url = webhook.WEBHOOK_URL.rstrip("/") + webhook.WEBHOOK_PATH
+        bot.remove_webhook()
+        bot.set_webhook(url=url, secret_token=secret, drop_pending_updates=True)
+        logger.info(f"🪝 Webhook registrado en {url}")
+    server.serve_forever()
+
 if __name__ == "__main__":
-    logger.info("🚀 Bot iniciado y escuchando...")
-    # Agregamos skip_pending para que no procese mensajes viejos al arrancar
-    bot.infinity_polling(timeout=60, long_polling_timeout=30, skip_pending=True)
+    if webhook.WEBHOOK_URL:
+        logger.info("🚀 Bot iniciado en modo webhook...")
+        run_webhook()
+    else:
+        logger.info("🚀 Bot iniciado y escuchando...")
+        start_services()
+        # Agregamos skip_pending para que no procese mensajes viejos al arrancar
+        bot.infinity_polling(timeout=60, long_polling_timeout=30, skip_pending=True)
@@ -1,10 +1,39 @@
+import os
+import re
 import time
+import atexit
 import json
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
 
+from core.storage import get_storage
+from core.cache import CACHE_REGISTRY, approx_size
+from core.prefs import parse_preferences, apply_patch, is_settings_only
+
 logger = logging.getLogger(__name__)
 
+# Tiering de sesiones: las activas viven en un LRU en memoria (hot); las que pasan
+# IDLE_SECONDS sin mensajes se compactan (historial -> resumen corto) y quedan
+# solo en el storage (cold) hasta que el chat vuelve a escribir.
+HOT_SESSIONS = int(os.getenv("BRAIN_HOT_SESSIONS", "256"))
+IDLE_SECONDS = float(os.getenv("BRAIN_IDLE_SECONDS", "1800"))
+SWEEP_INTERVAL = 60
+MAX_HISTORY = 20
+SUMMARY_MAX_LEN = 400
+
+_HOT: "OrderedDict[str, Dict]" = OrderedDict()
+_HOT_LOCK = threading.RLock()
+_LAST_SWEEP = 0.0
+
+# Hash de lo último persistido por sesión hot: solo se escriben las que cambiaron
+_PERSISTED: Dict[str, bytes] = {}
+
+# Tickers en el texto original: "$sol" o palabras ya en mayúsculas ("BTC")
+_TICKER_RE = re.compile(r"\$([A-Za-z]{2,5})\b|\b([A-Z]{2,5})\b")
+
 def _now() -> float: return time.time()
 
 def _trim(s: str, max_len: int = 800) -> str:
@@ -26,35 +55,208 @@ def get_session(state: Dict, chat_id: int) -> Dict:
         }
     sess = brain["sessions"][sid]
     if "history" not in sess: sess["history"] = []
-    if "facts" not in sess: sess["facts"] = []
+    if not isinstance(sess.get("facts"), dict): sess["facts"] = {}
     return sess
 
 def add_turn(state: Dict, chat_id: int, role: str, text: str):
     sess = get_session(state, chat_id)
     sess["history"].append({"ts": _now(), "role": role, "text": _trim(text)})
-    if len(sess["history"]) > 20: sess["history"] = sess["history"][-20:]
+    if len(sess["history"]) > MAX_HISTORY: sess["history"] = sess["history"][-MAX_HISTORY:]
+    sess["last_seen"] = _now()
 
 def recent_context_text(state: Dict, chat_id: int) -> str:
     sess = get_session(state, chat_id)
-    lines = [f"{'Usuario' if h['role']=='user' else 'Bot'}: {h['text']}" for h in sess["history"]]
+    lines = [f"Resumen previo: {sess['summary']}"] if sess.get("summary") else []
+    lines += [f"{'Usuario' if h['role']=='user' else 'Bot'}: {h['text']}" for h in sess["history"]]
     return "\n".join(lines).strip()
 
 def apply_patch_to_session(state: Dict, chat_id: int, user_text: str) -> Dict:
-    # Nota: Aquí asumo que mantienes tus funciones detect_mode y extract_prefs_patch
-    # Si no, las incluimos. Por brevedad, retorno la estructura que el engine espera:
+    """Aplica las preferencias que el mensaje declare (parser por reglas) y devuelve las vigentes."""
     sess = get_session(state, chat_id)
+    patch = parse_preferences(user_text)
+    if patch:
+        apply_patch(sess, patch)
+        logger.info(f"⚙️ Preferencias de {chat_id} actualizadas: {patch}")
+    facts = sess.get("facts") or {}
     return {
         "mode": sess.get("last_mode", "SEMANAL"),
+        "horizon": facts.get("horizon"),  # Solo si el usuario lo eligió (define la columna de variación)
         "top_n": sess.get("last_top_n", 20),
-        "risk_pref": sess.get("facts", {}).get("risk_pref", "Medio"),
-        "avoid": sess.get("facts", {}).get("avoid", []),
-        "focus": sess.get("facts", {}).get("focus", []),
-        "context": recent_context_text(state, chat_id)
+        "risk_pref": facts.get("risk_pref", "Medio"),
+        "avoid": facts.get("avoid", []),
+        "focus": facts.get("focus", []),
+        "avoid_memecoins": facts.get("avoid_memecoins", False),
+        "currency": facts.get("currency", "USD"),
+        "context": recent_context_text(state, chat_id),
+        "patch": patch,
+        "settings_only": is_settings_only(user_text, patch),
     }
 
+# --- TIERING HOT / COLD ---
+
+def compact_session(sess: Dict) -> Dict:
+    """Colapsa el historial en un resumen corto (tickers mencionados + último pedido)."""
+    history = sess.get("history") or []
+    if not history:
+        return sess
+    user_turns = [h.get("text", "") for h in history if h.get("role") == "user"]
+    tickers: List[str] = []
+    for text in user_turns:
+        for dollar, plain in _TICKER_RE.findall(text):
+            t = (dollar or plain).upper()
+            if t not in tickers:
+                tickers.append(t)
+    parts = [sess.get("summary") or ""]
+    if tickers:
+        parts.append("Habló de " + ", ".join(tickers[-8:]) + ".")
+    if user_turns:
+        parts.append(f"Último pedido: {_trim(user_turns[-1], 160)}")
+    summary = " ".join(p for p in parts if p).strip()
+    if len(summary) > SUMMARY_MAX_LEN:
+        summary = "..." + summary[-SUMMARY_MAX_LEN:]
+
+    compacted = {k: v for k, v in sess.items() if k != "history"}
+    compacted.update({"history": [], "summary": summary, "compacted_at": _now()})
+    return compacted
+
+def _encode_session(sess: Dict):
+    raw = json.dumps(sess, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return raw, hashlib.blake2b(raw, digest_size=16).digest()
+
+def _spill(sid: str, sess: Dict) -> None:
+    """Saca una sesión del tier hot: se compacta y se escribe al storage."""
+    cold = compact_session(sess)
+    raw, digest = _encode_session(cold)
+    if cold is not sess or _PERSISTED.get(sid) != digest:
+        get_storage().put_encoded("sessions", {sid: raw})
+    _PERSISTED.pop(sid, None)
+
+def _admit(sid: str, sess: Dict) -> None:
+    """Agrega/refresca una sesión en el LRU y expulsa las menos usadas si sobra."""
+    with _HOT_LOCK:
+        _HOT[sid] = sess
+        _HOT.move_to_end(sid)
+        overflow = []
+        while len(_HOT) > HOT_SESSIONS:
+            overflow.append(_HOT.popitem(last=False))
+    for old_sid, old_sess in overflow:
+        _VIEW.evictions += 1
+        try:
+            _spill(old_sid, old_sess)
+        except Exception as e:
+            logger.error(f"❌ Error bajando la sesión {old_sid} a cold: {e}")
+
+def evict_idle(max_idle: float = IDLE_SECONDS) -> int:
+    """Compacta y baja a disco las sesiones hot sin actividad reciente."""
+    cutoff = _now() - max_idle
+    with _HOT_LOCK:
+        idle = [(sid, sess) for sid, sess in _HOT.items()
+                if (sess.get("last_seen") or sess.get("created_at") or 0) < cutoff]
+        for sid, _ in idle:
+            _HOT.pop(sid, None)
+    for sid, sess in idle:
+        try:
+            _spill(sid, sess)
+        except Exception as e:
+            logger.error(f"❌ Error compactando la sesión {sid}: {e}")
+    if idle:
+        _VIEW.expirations += len(idle)
+        logger.info(f"🧊 {len(idle)} sesiones inactivas compactadas a cold.")
+    return len(idle)
+
+def _maybe_sweep() -> None:
+    global _LAST_SWEEP
+    now = _now()
+    if now - _LAST_SWEEP >= SWEEP_INTERVAL:
+        _LAST_SWEEP = now
+        evict_idle()
+
+def load_brain_state(chat_id: Optional[int] = None) -> Dict:
+    """Arma el estado de trabajo con la sesión del chat (hot en memoria o rehidratada del storage)."""
+    state: Dict[str, Any] = {"brain": {"sessions": {}}}
+    if chat_id is None:
+        return state
+    sid = str(chat_id)
+    with _HOT_LOCK:
+        sess = _HOT.get(sid)
+        if sess is not None:
+            _HOT.move_to_end(sid)
+            _VIEW.hits += 1
+    if sess is None:
+        _VIEW.misses += 1
+        try:
+            raw = get_storage().get("sessions", chat_id)
+            if isinstance(raw, dict):
+                sess = raw
+                _PERSISTED[sid] = _encode_session(sess)[1]
+                _admit(sid, sess)
+        except Exception as e:
+            logger.error(f"❌ Error cargando sesión {chat_id}: {e}")
+    if sess is not None:
+        state["brain"]["sessions"][sid] = sess
+    return state
+
 def save_brain_state(state: Dict):
+    """Persiste en una transacción solo las sesiones que cambiaron desde la última escritura."""
     try:
-        with open("brain_state.json", "w", encoding="utf-8") as f:
-            json.dump(state, f, indent=4)
+        sessions = ensure_brain(state).get("sessions", {})
+        changed = {}
+        for sid, sess in sessions.items():
+            raw, digest = _encode_session(sess)
+            if _PERSISTED.get(sid) != digest:
+                changed[sid] = (raw, digest)
+        if changed:
+            get_storage().put_encoded("sessions", {sid: raw for sid, (raw, _) in changed.items()})
+            for sid, (_, digest) in changed.items():
+                _PERSISTED[sid] = digest
+        for sid, sess in sessions.items():
+            _admit(sid, sess)
+        _maybe_sweep()
     except Exception as e:
         logger.error(f"❌ Error guardando brain: {e}")
+
+def flush_hot_sessions() -> int:
+    """Baja todas las sesiones hot a disco (sin compactar) y vacía el LRU."""
+    with _HOT_LOCK:
+        items = list(_HOT.items())
+        _HOT.clear()
+    pending = {}
+    for sid, sess in items:
+        raw, digest = _encode_session(sess)
+        if _PERSISTED.get(sid) != digest:
+            pending[sid] = raw
+        _PERSISTED.pop(sid, None)
+    if pending:
+        get_storage().put_encoded("sessions", pending)
+    return len(items)
+
+class _BrainCacheView:
+    """Expone el tier hot de sesiones en el registro de cachés."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with _HOT_LOCK:
+            sample = list(_HOT.values())[:20]
+            n = len(_HOT)
+        per_item = (sum(approx_size(s) for s in sample) / len(sample)) if sample else 0
+        return {
+            "items_count": n,
+            "usage_percent": round(n / HOT_SESSIONS * 100, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_bytes": int(per_item * n),
+        }
+
+    def invalidate(self) -> int:
+        return flush_hot_sessions()
+
+_VIEW = _BrainCacheView()
+CACHE_REGISTRY.register("brain.sessions", _VIEW)
+atexit.register(flush_hot_sessions)
@@ -1,26 +1,48 @@
+import sys
 import time
 import threading
 import logging
-from typing import Any, Optional, Dict, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # Configuración de diagnóstico
 logger = logging.getLogger(__name__)
 
+def approx_size(obj: Any, seen: Optional[set] = None, depth: int = 0) -> int:
+    """Estimación recursiva (acotada) del tamaño en memoria de un objeto."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or depth > 6:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen, depth + 1) + approx_size(v, seen, depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, seen, depth + 1) for v in obj)
+    return size
+
 class TTLCache:
     """
     Caché de alto rendimiento para el OrtelliCryptoAI.
     Optimizado para evitar bloqueos (Rate Limits) en APIs externas.
+    Si recibe `name`, se registra en CACHE_REGISTRY para métricas y administración.
     """
 
-    def __init__(self, ttl_seconds: int = 60, max_items: int = 512):
+    def __init__(self, ttl_seconds: int = 60, max_items: int = 512, name: Optional[str] = None):
         self.ttl = int(ttl_seconds)
         self.max_items = int(max_items)
+        self.name = name
         self._lock = threading.Lock()
-        self._data: Dict[str, Tuple[float, Any]] = {}  # key -> (expires_at, value)
-        
+        self._data: Dict[str, Tuple[float, Any, float]] = {}  # key -> (expires_at, value, stored_at)
+
         # Métricas para el Inspector
         self.hits = 0
         self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_served = 0
+
+        if name:
+            CACHE_REGISTRY.register(name, self)
 
     def _now(self) -> float:
         return time.time()
@@ -33,41 +55,48 @@ class TTLCache:
                 if not item:
                     self.misses += 1
                     return default
-                
-                expires_at, value = item
-                
-                # Si permitimos datos viejos (stale) en caso de emergencia
-                if allow_stale:
-                    self.hits += 1
-                    return value
-                
+
+                expires_at, value, _ = item
+
                 if self._now() <= expires_at:
                     self.hits += 1
                     return value
-                
-                # Expirado: limpieza inmediata
-                self._data.pop(str(key), None)
+
+                # Si permitimos datos viejos (stale) en caso de emergencia
+                if allow_stale:
+                    self.stale_served += 1
+                    return value
+
+                # Expirado: se conserva para poder servirlo como stale si la API cae;
+                # la limpieza real la hace _evict_some cuando hace falta espacio
                 self.misses += 1
                 return default
         except Exception as e:
             logger.error(f"❌ Error crítico leyendo caché: {e}")
             return default
 
+    def age(self, key: str) -> Optional[float]:
+        """Segundos desde que se guardó la entrada (aunque esté vencida)."""
+        with self._lock:
+            item = self._data.get(str(key))
+        return (self._now() - item[2]) if item else None
+
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
         """Guarda datos con validación de integridad."""
         if value is None:
             return
 
         ttl = self.ttl if ttl_seconds is None else int(ttl_seconds)
-        expires_at = self._now() + ttl
-        
+        now = self._now()
+        expires_at = now + ttl
+
         try:
             with self._lock:
                 # Si el cache está lleno, forzamos limpieza inteligente
-                if len(self._data) >= self.max_items:
+                if len(self._data) >= self.max_items and str(key) not in self._data:
                     self._evict_some()
-                
-                self._data[str(key)] = (expires_at, value)
+
+                self._data[str(key)] = (expires_at, value, now)
                 logger.debug(f"💾 Guardado en caché: {key} (vence en {ttl}s)")
         except Exception as e:
             logger.error(f"❌ Error crítico escribiendo caché: {e}")
@@ -83,30 +112,51 @@ class TTLCache:
             self.misses = 0
             logger.info("🧹 Memoria caché vaciada manualmente.")
 
+    def invalidate(self) -> int:
+        """Vacía las entradas pero conserva las métricas acumuladas."""
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+        return n
+
     def get_stats(self) -> Dict[str, Any]:
         """DIAGNÓSTICO: Devuelve el estado de salud del caché."""
         with self._lock:
+            now = self._now()
             usage_pct = (len(self._data) / self.max_items) * 100
             total_reqs = self.hits + self.misses
             efficiency = (self.hits / total_reqs * 100) if total_reqs > 0 else 0
-            
+            ages = [now - stored for _, _, stored in self._data.values()]
+            stale = sum(1 for exp, _, _ in self._data.values() if exp < now)
+            sample = list(self._data.values())[:20]
+            per_item = (sum(approx_size(v) for _, v, _ in sample) / len(sample)) if sample else 0
+
             return {
                 "items_count": len(self._data),
                 "usage_percent": round(usage_pct, 2),
                 "efficiency_percent": round(efficiency, 2),
                 "hits": self.hits,
-                "misses": self.misses
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_served": self.stale_served,
+                "stale_items": stale,
+                "ttl_seconds": self.ttl,
+                "oldest_age_s": round(max(ages), 1) if ages else None,
+                "mean_age_s": round(sum(ages) / len(ages), 1) if ages else None,
+                "memory_bytes": int(per_item * len(self._data)),
             }
 
     def _evict_some(self) -> None:
         """Estrategia de limpieza: LRU (Least Recently Used) simplificado."""
         now = self._now()
-        
+
         # 1. Borrar expirados primero
-        expired = [k for k, (exp, _) in self._data.items() if exp < now]
+        expired = [k for k, (exp, _, _) in self._data.items() if exp < now]
         for k in expired:
             self._data.pop(k, None)
-        
+        self.expirations += len(expired)
+
         # 2. Si sigue lleno, borrar el 20% que expira más pronto
         if len(self._data) >= self.max_items:
             # Ordenamos por tiempo de expiración
@@ -114,4 +164,76 @@ class TTLCache:
             num_to_delete = max(1, int(len(sorted_items) * 0.2))
             for i in range(num_to_delete):
                 self._data.pop(sorted_items[i][0], None)
+            self.evictions += num_to_delete
             logger.warning(f"⚠️ Caché lleno. Se forzó la eliminación de {num_to_delete} ítems.")
+
+class CacheRegistry:
+    """
+    Registro global de cachés del bot. Cualquier objeto con `get_stats()` e
+    `invalidate()` puede registrarse. Los nombres usan puntos como namespace
+    ("exchange.binance"), así se puede invalidar o pre-calentar por prefijo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches: Dict[str, Any] = {}
+        self._warmers: Dict[str, Callable[[], Any]] = {}
+
+    def register(self, name: str, cache: Any, warmer: Optional[Callable[[], Any]] = None) -> None:
+        with self._lock:
+            if name in self._caches and self._caches[name] is not cache:
+                logger.warning(f"⚠️ Caché '{name}' registrado dos veces; se reemplaza.")
+            self._caches[name] = cache
+            if warmer:
+                self._warmers[name] = warmer
+
+    def set_warmer(self, name: str, warmer: Callable[[], Any]) -> None:
+        with self._lock:
+            self._warmers[name] = warmer
+
+    def _match(self, namespace: Optional[str]) -> List[str]:
+        with self._lock:
+            names = sorted(self._caches)
+        if not namespace:
+            return names
+        return [n for n in names if n == namespace or n.startswith(namespace + ".")]
+
+    def names(self) -> List[str]:
+        return self._match(None)
+
+    def stats(self, namespace: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for name in self._match(namespace):
+            try:
+                st = self._caches[name].get_stats()
+                total = st.get("hits", 0) + st.get("misses", 0)
+                st["hit_ratio"] = round(st.get("hits", 0) / total, 3) if total else None
+                out[name] = st
+            except Exception as e:
+                out[name] = {"error": str(e)}
+        return out
+
+    def invalidate(self, namespace: Optional[str] = None) -> Dict[str, int]:
+        """Vacía los cachés del namespace. Devuelve cuántas entradas borró cada uno."""
+        out = {}
+        for name in self._match(namespace):
+            out[name] = self._caches[name].invalidate() or 0
+        logger.info(f"🧹 Cachés invalidados ({namespace or 'todos'}): {out}")
+        return out
+
+    def prewarm(self, namespace: Optional[str] = None) -> Dict[str, str]:
+        """Ejecuta los warmers registrados del namespace (ej: bajar el snapshot antes de que lo pidan)."""
+        out = {}
+        for name in self._match(namespace):
+            warmer = self._warmers.get(name)
+            if not warmer:
+                continue
+            t0 = time.time()
+            try:
+                warmer()
+                out[name] = f"ok ({time.time() - t0:.2f}s)"
+            except Exception as e:
+                out[name] = f"error: {e}"
+        return out
+
+CACHE_REGISTRY = CacheRegistry()
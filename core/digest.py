@@ -0,0 +1,71 @@
+import os
+import time
+import logging
+from typing import Callable, Dict, List
+
+from core.sources import fetch_coingecko_top100
+from core.market import verify_prices, is_stable, is_gold
+from core.outbox import SendQueue
+
+try:
+    from core.news import fetch_news
+except ImportError:
+    def fetch_news(limit_total: int = 15): return []
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {"diario", "horario"}
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", "9"))
+DIGEST_TZ = os.getenv("DIGEST_TZ", "America/Argentina/Buenos_Aires")
+
+def _fmt_row(r: Dict) -> str:
+    return f"• *{r['symbol'].upper()}* ${r.get('current_price', 0):,} ({r.get('price_change_percentage_24h', 0):+.2f}%)"
+
+def render_digest(freq: str = "diario", n: int = 5) -> str:
+    """Arma el resumen UNA sola vez; el mismo texto se reparte a todos los suscriptores."""
+    rows, _ = verify_prices(fetch_coingecko_top100())
+    rows = [r for r in rows if not is_stable(r) and not is_gold(r)]
+    if not rows:
+        return ""
+
+    by_change = sorted(rows, key=lambda r: float(r.get("price_change_percentage_24h") or 0), reverse=True)
+    title = "🗞️ *Resumen diario*" if freq == "diario" else "⏱️ *Resumen horario*"
+    lines = [title, "", "🚀 *Mejores 24h:*"]
+    lines += [_fmt_row(r) for r in by_change[:n]]
+    lines += ["", "📉 *Peores 24h:*"]
+    lines += [_fmt_row(r) for r in by_change[-n:][::-1]]
+
+    news = fetch_news(3)
+    if news:
+        lines += ["", "📰 *Titulares:*"]
+        lines += [f"• {it['title']}" for it in news]
+    return "\n".join(lines)
+
+def run_digest(outbox: SendQueue, get_subscribers: Callable[[str], List[int]], freq: str) -> int:
+    """Renderiza y hace fan-out del digest para una frecuencia."""
+    chat_ids = get_subscribers(freq)
+    if not chat_ids:
+        return 0
+    t0 = time.time()
+    text = render_digest(freq)
+    if not text:
+        logger.warning(f"⚠️ Digest {freq} vacío (sin datos de mercado). Se omite.")
+        return 0
+    count = outbox.broadcast(chat_ids, text)
+    logger.info(f"📬 Digest {freq}: {count} chats (render {time.time() - t0:.2f}s)")
+    return count
+
+def start_digest_scheduler(outbox: SendQueue, get_subscribers: Callable[[str], List[int]]):
+    """Programa los digests (diario a DIGEST_HOUR y horario en el minuto 0)."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler(timezone=DIGEST_TZ)
+    scheduler.add_job(run_digest, "cron", hour=DIGEST_HOUR, minute=0,
+                      args=[outbox, get_subscribers, "diario"], id="digest_diario",
+                      max_instances=1, coalesce=True, misfire_grace_time=600)
+    scheduler.add_job(run_digest, "cron", minute=0,
+                      args=[outbox, get_subscribers, "horario"], id="digest_horario",
+                      max_instances=1, coalesce=True, misfire_grace_time=120)
+    scheduler.start()
+    logger.info(f"🗓️ Digest programado (diario {DIGEST_HOUR}:00 {DIGEST_TZ} + horario).")
+    return scheduler
@@ -1,78 +1,114 @@
 import os, json, logging, traceback
 from typing import List, Dict, Optional, Any
 
-from core.sources import fetch_coingecko_top100 
-from core.market import verify_prices, is_stable, is_gold
+from core.sources import fetch_market_universe, market_columns
+from core.market import verify_prices
 # IMPORTACIONES SINCRONIZADAS
-from core.brain import apply_patch_to_session, add_turn, save_brain_state
-from core.learning import register_user_interest, get_learning_boost
+from core.brain import apply_patch_to_session, add_turn, save_brain_state, get_session
+from core.prefs import render_confirmation, MODE_CHANGE_FIELD
+from core.ranking import get_factor_snapshot
+from core.fx import FX, format_money, currency_label
+from core.learning import register_user_interest
 from core.llm_gemini import gemini_render
 
+from core.news_index import NEWS_INDEX
+from core import metrics
+
 try:
     from core.news import get_news_summary_for_llm
 except ImportError:
-    def get_news_summary_for_llm(): return "No hay noticias disponibles."
+    def get_news_summary_for_llm(limit=6, symbols=None): return "No hay noticias disponibles."
 
 logger = logging.getLogger(__name__)
 
 def build_engine_analysis(user_text: str, chat_id: int, state: Dict) -> str:
+    with metrics.timer("total"):
+        return _build_engine_analysis(user_text, chat_id, state)
+
+def _build_engine_analysis(user_text: str, chat_id: int, state: Dict) -> str:
     try:
         # 1. BRAIN: Registrar turno del usuario
         add_turn(state, chat_id, "user", user_text)
         
         # 2. BRAIN: Obtener contexto y preferencias personales
         user_prefs = apply_patch_to_session(state, chat_id, user_text)
+
+        # 2b. Mensaje solo de configuración: confirmación templada, sin mercado ni LLM
+        if user_prefs.get("settings_only"):
+            reply = render_confirmation(user_prefs["patch"], get_session(state, chat_id))
+            add_turn(state, chat_id, "bot", reply)
+            save_brain_state(state)
+            metrics.incr("llm_skipped", reason="prefs")
+            return reply
         
         # 3. LEARNING: Registrar interés en tickers mencionados
         register_user_interest(user_text)
 
         # 4. MERCADO: Obtener datos
-        raw_rows = fetch_coingecko_top100()
+        with metrics.timer("fetch_market"):
+            raw_rows = fetch_market_universe()
         if not raw_rows: return "❌ Error de conexión con el mercado."
 
-        rows, _ = verify_prices(raw_rows)
-        final_rows = []
-        for r in rows:
-            sym = r.get("symbol", "").upper()
-            if is_stable(r) or is_gold(r) or sym in user_prefs.get("avoid", []):
-                continue
-            
-            # Unimos Mercado + Learning (Boost de popularidad)
-            p_change = float(r.get("price_change_percentage_24h") or 0)
-            pop_boost = get_learning_boost(sym)
-            focus_boost = 5.0 if sym in user_prefs.get("focus", []) else 0.0
-            
-            r["engine_score"] = p_change + pop_boost + focus_boost
-            final_rows.append(r)
+        with metrics.timer("verify_prices"):
+            rows, _ = verify_prices(raw_rows)
+        NEWS_INDEX.set_universe(raw_rows)
+        # Ranking multi-factor: factores normalizados por snapshot + pesos según el perfil del usuario
+        top_limit = user_prefs.get("top_n", 20)
+        change_field = MODE_CHANGE_FIELD.get(user_prefs.get("horizon"), "price_change_percentage_24h")
+        with metrics.timer("scoring"):
+            # Worker: los factores se leen de las columnas del segmento compartido (si ninguna fila se cayó)
+            columns = market_columns(raw_rows) if len(rows) == len(raw_rows) else None
+            snap = get_factor_snapshot(rows, columns)
+            final_rows = snap.ranked_rows(user_prefs, top_limit)
 
-        final_rows.sort(key=lambda x: x.get("engine_score", 0), reverse=True)
+        # El ranking se calcula en USD; la moneda del usuario solo cambia la vista
+        currency = user_prefs.get("currency", "USD")
 
         # 5. Ticker directo (CORREGIDO)
         query = user_text.upper().strip().replace("$", "")
-        for r in final_rows:
-            current_sym = r.get("symbol", "").upper()
-            if current_sym == query:
-                trend = "🚀" if r.get("price_change_percentage_24h", 0) > 0 else "📉"
-                return f"{trend} *{r['name']} ({current_sym})*\n💰 Precio: ${r.get('current_price'):,}\n📊 Var. 24h: {r.get('price_change_percentage_24h'):.2f}%"
+        i = snap.symbol_index.get(query)
+        if i is not None and snap.eligible[i]:
+            current_sym = query
+            if currency == "USD":
+                r = snap.rows[i]
+                price_text = f"${r.get('price') or r.get('current_price'):,}"
+            else:
+                (r,), currency = FX.rescale([snap.rows[i]], currency, reference=rows)
+                price_text = format_money(r.get('price') or r.get('current_price'), currency)
+                if currency_label(currency) != currency:  # AR$ oficial vs MEP
+                    price_text += f" ({currency_label(currency)})"
+            trend = "🚀" if r.get("price_change_percentage_24h", 0) > 0 else "📉"
+            live = " ⚡" if r.get("price_source") == "stream" else ""
+            return f"{trend} *{r['name']} ({current_sym})*\n💰 Precio: {price_text}{live}\n📊 Var. 24h: {r.get('price_change_percentage_24h'):.2f}%"
 
         # 6. Preparar Gemini
-        top_limit = user_prefs.get("top_n", 20)
-        market_summary = [{"s": r['symbol'].upper(), "p": r['current_price'], "c": f"{r['price_change_percentage_24h']:.1f}%"} for r in final_rows[:top_limit]]
+        if currency != "USD":
+            final_rows, currency = FX.rescale(final_rows, currency, reference=rows)
+        market_summary = [{"s": r['symbol'].upper(), "p": r['current_price'], "c": f"{float(r.get(change_field) or r.get('price_change_percentage_24h') or 0):.1f}%"} for r in final_rows]
         
+        # Noticias: solo las de las monedas que el usuario mencionó (si hay)
+        asked_symbols = NEWS_INDEX.symbols_in_text(user_text)
+        with metrics.timer("news"):
+            news_block = get_news_summary_for_llm(symbols=asked_symbols)
+
         sys_prompt = "Sos un analista financiero experto (City argentina). Usá negritas para tickers."
         user_prompt = (
             f"HISTORIAL:\n{user_prefs.get('context')}\n\n"
-            f"PREFERENCIAS: Riesgo {user_prefs.get('risk_pref')}. Foco en: {user_prefs.get('focus')}\n\n"
+            f"PREFERENCIAS: Riesgo {user_prefs.get('risk_pref')}. Horizonte {user_prefs.get('mode')}. "
+            f"Foco en: {user_prefs.get('focus')}. Evitar: {user_prefs.get('avoid')}\n\n"
+            f"MONEDA DE LOS PRECIOS: {currency_label(currency)}\n"
             f"DATOS: {json.dumps(market_summary)}\n\n"
-            f"NOTICIAS: {get_news_summary_for_llm()}\n\n"
+            f"NOTICIAS: {news_block}\n\n"
             f"PREGUNTA: {user_text}"
         )
 
-        ai_res = gemini_render(sys_prompt, user_prompt)
+        with metrics.timer("llm"):
+            ai_res = gemini_render(sys_prompt, user_prompt)
         
         if ai_res and "Error" not in ai_res:
             add_turn(state, chat_id, "bot", ai_res) # BRAIN: Guardar respuesta bot
-            save_brain_state(state) # PERSISTENCIA FINAL
+            with metrics.timer("save_state"):
+                save_brain_state(state) # PERSISTENCIA FINAL
             
         return ai_res or "⚠️ La IA no respondió."
 
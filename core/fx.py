@@ -0,0 +1,186 @@
+import os
+import time
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from core import metrics
+from core.cache import TTLCache
+from core.shared_snapshot import SHARED_SNAPSHOT
+
+logger = logging.getLogger(__name__)
+
+# Multi-moneda: el mercado se baja UNA vez en USD y cualquier otra moneda sale de
+# reescalar ese snapshot con una tabla chica de tipos de cambio que se refresca aparte.
+# Las tasas son "unidades de la moneda por 1 USD".
+
+FX_TTL = int(os.getenv("FX_TTL", "900"))
+DOLARAPI_URL = os.getenv("FX_ARS_URL", "https://dolarapi.com/v1/dolares")
+EUR_URL = os.getenv("FX_EUR_URL", "https://api.frankfurter.app/latest")
+TIMEOUT = 10
+
+CURRENCIES: Dict[str, Dict[str, str]] = {
+    "USD": {"label": "USD", "prefix": "$"},
+    "ARS": {"label": "ARS oficial", "prefix": "AR$"},
+    "MEP": {"label": "ARS MEP", "prefix": "AR$"},
+    "EUR": {"label": "EUR", "prefix": "€"},
+    "BTC": {"label": "BTC", "prefix": "₿"},
+}
+DEFAULT_CURRENCY = "USD"
+
+# Casas de dolarapi.com que usamos ("bolsa" = MEP)
+_DOLARAPI_CASAS = {"oficial": "ARS", "bolsa": "MEP"}
+
+# Campos en unidades de moneda (los porcentajes y el ranking no cambian)
+PRICE_FIELDS = (
+    "current_price", "price", "market_cap", "fully_diluted_valuation", "total_volume",
+    "high_24h", "low_24h", "price_change_24h", "market_cap_change_24h", "ath", "atl",
+)
+
+def _get_json(url: str, params: Optional[dict] = None):
+    try:
+        r = requests.get(url, params=params, timeout=TIMEOUT, headers={"User-Agent": "OrtelliCryptoAI/1.0"})
+        r.raise_for_status()
+        return r.json()
+    except Exception as e:
+        logger.warning(f"⚠️ Tipo de cambio no disponible ({url.split('/')[2]}): {e}")
+        return None
+
+def fetch_ars_rates() -> Dict[str, float]:
+    """Oficial y MEP (precio de venta) desde dolarapi.com."""
+    data = _get_json(DOLARAPI_URL)
+    out = {}
+    for item in data if isinstance(data, list) else []:
+        code = _DOLARAPI_CASAS.get(item.get("casa"))
+        if code and item.get("venta"):
+            out[code] = float(item["venta"])
+    return out
+
+def fetch_eur_rate() -> Dict[str, float]:
+    data = _get_json(EUR_URL, params={"from": "USD", "to": "EUR"})
+    rate = ((data or {}).get("rates") or {}).get("EUR")
+    return {"EUR": float(rate)} if rate else {}
+
+def _btc_usd(rows: Optional[Sequence[Dict]]) -> Optional[float]:
+    if rows is None:
+        from core.sources import fetch_market_universe
+        rows = fetch_market_universe()
+    for r in rows:
+        if (r.get("symbol") or "").upper() == "BTC":
+            price = float(r.get("price") or r.get("current_price") or 0)
+            return price or None
+    return None
+
+class FxTable:
+    """Tabla de tipos de cambio fiat (cacheada) + BTC derivado del propio snapshot."""
+
+    def __init__(self):
+        self._cache = TTLCache(ttl_seconds=FX_TTL, max_items=4, name="fx.rates")
+        self._lock = threading.Lock()
+        self._views: Dict[str, Tuple[Tuple[int, ...], float, List[Dict], List[Dict]]] = {}  # moneda -> última vista
+
+    def table(self) -> Dict[str, float]:
+        """Tasas fiat vigentes. Si una fuente falla se mantiene su último valor conocido."""
+        shared = SHARED_SNAPSHOT.read("fx")  # Worker: la tabla la publica el refrescador
+        if shared is not None:
+            return shared
+        table = self._cache.get("table")
+        if table is not None:
+            return table
+        with self._lock:
+            table = self._cache.get("table")
+            if table is not None:
+                return table
+            old = self._cache.get("table", allow_stale=True) or {}
+            table = {"USD": 1.0, **{k: v for k, v in old.items() if k != "ts"}}
+            fresh = {**fetch_ars_rates(), **fetch_eur_rate()}
+            if not fresh:
+                metrics.incr("fx_refresh_failures")
+            table.update(fresh)
+            table["ts"] = time.time()
+            self._cache.set("table", table)
+            return table
+
+    def rate(self, currency: str, rows: Optional[Sequence[Dict]] = None) -> Optional[float]:
+        """Unidades de `currency` por 1 USD, o None si no hay dato."""
+        currency = (currency or DEFAULT_CURRENCY).upper()
+        if currency == "USD":
+            return 1.0
+        if currency == "BTC":
+            btc = _btc_usd(rows)
+            return 1.0 / btc if btc else None
+        return self.table().get(currency)
+
+    def rescale(self, rows: Sequence[Dict], currency: str,
+                reference: Optional[Sequence[Dict]] = None,
+                columns: Optional[Tuple[int, Dict[str, np.ndarray]]] = None) -> Tuple[List[Dict], str]:
+        """
+        Vista del snapshot USD en otra moneda (una multiplicación vectorizada por campo).
+        `reference` es el universo completo para tasas derivadas (BTC) cuando `rows` es un recorte.
+        `columns` = (versión, vistas) del segmento compartido: los montos se leen de ahí.
+        Se cachea la última vista por moneda (mismas filas y misma tasa = gratis). Si falta la tasa, devuelve USD.
+        """
+        currency = (currency or DEFAULT_CURRENCY).upper()
+        rate = self.rate(currency, reference if reference is not None else rows) if currency in CURRENCIES else None
+        if rate is None or currency == "USD":
+            return list(rows), "USD"
+
+        # Huella por identidad de filas: las del caché de páginas se reutilizan entre llamadas
+        # (la vista guarda referencias, así que los id no se reciclan mientras viva)
+        ids = tuple(map(id, rows))
+        hit = self._views.get(currency)
+        if hit and hit[0] == ids and hit[1] == rate:
+            return hit[3], currency
+
+        version, views = columns or (0, {})
+        out = rescale_rows(rows, rate, views) if views else None
+        if out is None or not SHARED_SNAPSHOT.intact(version):
+            out = rescale_rows(rows, rate)  # Sin vistas, o el refrescador reescribió el slot mientras leíamos
+        metrics.incr("fx_rescales", currency=currency)
+        self._views[currency] = (ids, rate, list(rows), out)
+        return out, currency
+
+    def get_stats(self) -> Dict[str, float]:
+        return {k: v for k, v in self.table().items() if k != "ts"}
+
+def rescale_rows(rows: Sequence[Dict], rate: float, columns: Optional[Dict[str, np.ndarray]] = None) -> List[Dict]:
+    """
+    Copia de las filas con los campos monetarios multiplicados por `rate`. Con `columns`
+    (vistas numéricas alineadas a `rows`) los montos salen de ahí; NaN = campo ausente.
+    """
+    out = [dict(r) for r in rows]
+    if not out:
+        return out
+    for field in PRICE_FIELDS:
+        view = (columns or {}).get(field)
+        if view is not None:
+            col = view.astype(float)
+            present = ~np.isnan(col)
+            for row, v, ok in zip(out, (col * rate).tolist(), present.tolist()):
+                if ok:
+                    row[field] = v
+            continue
+        values = [r.get(field) for r in rows]
+        if all(v is None for v in values):
+            continue
+        col = np.array([np.nan if v is None else v for v in values], dtype=float) * rate
+        for row, v, orig in zip(out, col.tolist(), values):
+            if orig is not None:
+                row[field] = v
+    return out
+
+def format_money(value: float, currency: str = DEFAULT_CURRENCY) -> str:
+    """Monto con el prefijo de la moneda (mismo criterio de decimales que la cartera)."""
+    currency = (currency or DEFAULT_CURRENCY).upper()
+    if currency == "BTC":
+        return f"₿{value:.8f}".rstrip("0").rstrip(".")
+    prefix = CURRENCIES.get(currency, CURRENCIES[DEFAULT_CURRENCY])["prefix"]
+    return f"{prefix}{value:,.2f}" if abs(value) >= 1 else f"{prefix}{value:.6g}"
+
+def currency_label(currency: Optional[str]) -> str:
+    return CURRENCIES.get((currency or DEFAULT_CURRENCY).upper(), CURRENCIES[DEFAULT_CURRENCY])["label"]
+
+FX = FxTable()
@@ -1,38 +1,83 @@
-import json, os, threading, math
+import threading, math
 from typing import Dict, Any
 
-LEARN_FILE = "learning_state.json"
-_CACHED_STATE = None
+from core.storage import get_storage
+from core.cache import CACHE_REGISTRY, approx_size
+
+# Contadores de interés por ticker: viven en el namespace "interest" del storage.
+# _CACHED_STATE es el espejo en memoria (se recarga si otro proceso escribió).
+_CACHED_STATE: Dict[str, int] = None
+_CACHED_VERSION = None
+_REVISION = 0            # Sube con cada cambio del espejo (para cachés derivados como el ranking)
 _STATE_LOCK = threading.Lock()
 
-def load_learning():
-    global _CACHED_STATE
+def load_learning() -> Dict[str, int]:
+    global _CACHED_STATE, _CACHED_VERSION, _REVISION
+    store = get_storage()
     with _STATE_LOCK:
-        if _CACHED_STATE is not None: return _CACHED_STATE
-        if not os.path.exists(LEARN_FILE): return {}
+        version = store.data_version()
+        if _CACHED_STATE is not None and version == _CACHED_VERSION:
+            _VIEW.hits += 1
+            return _CACHED_STATE
+        _VIEW.misses += 1
         try:
-            with open(LEARN_FILE, "r", encoding="utf-8") as f:
-                _CACHED_STATE = json.load(f)
-                return _CACHED_STATE
-        except: return {}
+            _CACHED_STATE = store.counters("interest")
+        except Exception:
+            _CACHED_STATE = _CACHED_STATE or {}
+        _CACHED_VERSION = version
+        _REVISION += 1
+        return _CACHED_STATE
 
-def save_learning(state):
-    with _STATE_LOCK:
-        with open(LEARN_FILE, "w", encoding="utf-8") as f:
-            json.dump(state, f, indent=4)
+def revision() -> int:
+    """Contador que cambia cada vez que cambian los contadores de interés en memoria."""
+    load_learning()  # Recarga si otro proceso escribió
+    return _REVISION
 
 def register_user_interest(text: str):
+    global _REVISION
     if not text: return
     words = text.upper().replace("$", "").split()
-    state = load_learning()
-    changed = False
+    deltas: Dict[str, int] = {}
     for w in words:
         if 2 <= len(w) <= 5 and w.isalpha():
-            state[w] = state.get(w, 0) + 1
-            changed = True
-    if changed: save_learning(state)
+            deltas[w] = deltas.get(w, 0) + 1
+    if not deltas: return
+
+    state = load_learning()
+    # Un solo UPSERT incremental en lugar de reescribir el JSON entero
+    get_storage().incr_many("interest", deltas)
+    with _STATE_LOCK:
+        for w, d in deltas.items():
+            state[w] = state.get(w, 0) + d
+        _REVISION += 1
 
 def get_learning_boost(symbol: str) -> float:
     state = load_learning()
     count = state.get(symbol.upper(), 0)
     return min(math.log10(count + 1) * 3, 10.0) if count > 0 else 0.0
+
+class _LearningCacheView:
+    """Adaptador para que el espejo de contadores aparezca en el registro de cachés."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = _CACHED_STATE or {}
+        return {
+            "items_count": len(state),
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_bytes": approx_size(state),
+        }
+
+    def invalidate(self) -> int:
+        global _CACHED_STATE
+        with _STATE_LOCK:
+            n = len(_CACHED_STATE or {})
+            _CACHED_STATE = None
+        return n
+
+_VIEW = _LearningCacheView()
+CACHE_REGISTRY.register("learning.interest", _VIEW, warmer=load_learning)
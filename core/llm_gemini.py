@@ -1,41 +1,65 @@
 import os
 import logging
-import google.generativeai as genai
+import threading
 from typing import Optional
 
+from core import metrics
+
 # Configuración de Logging para Diagnóstico
 logger = logging.getLogger(__name__)
 
-# Configuración Global
-API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_NAME = "gemini-1.5-flash"
 
-def setup_gemini():
-    """Configura la API de forma segura al inicio."""
-    if not API_KEY:
-        logger.error("❌ GEMINI_API_KEY no detectada en las variables de entorno.")
-        return False
-    try:
-        genai.configure(api_key=API_KEY)
-        return True
-    except Exception as e:
-        logger.error(f"❌ Error configurando Google AI: {e}")
-        return False
+# El SDK de Google tarda en importarse: se carga recién en el primer uso (o en el warm-up)
+_genai = None
+_MODEL = None
+_READY: Optional[bool] = None
+_INIT_LOCK = threading.Lock()
 
-# Inicializamos una vez
-GEMINI_READY = setup_gemini()
+def setup_gemini() -> bool:
+    """Importa y configura el SDK una sola vez. La API key se lee acá (después de load_dotenv)."""
+    global _genai, _READY
+    if _READY is not None:
+        return _READY
+    with _INIT_LOCK:
+        if _READY is not None:
+            return _READY
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.error("❌ GEMINI_API_KEY no detectada en las variables de entorno.")
+            _READY = False
+            return _READY
+        try:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _genai = genai
+            _READY = True
+        except Exception as e:
+            logger.error(f"❌ Error configurando Google AI: {e}")
+            _READY = False
+        return _READY
+
+def _get_model():
+    global _MODEL
+    if _MODEL is None and setup_gemini():
+        # Usamos 1.5-flash: es el más rápido y tiene la cuota más alta para gratis
+        _MODEL = _genai.GenerativeModel(MODEL_NAME)
+    return _MODEL
+
+def warm_up() -> bool:
+    """Deja el cliente listo antes del primer mensaje (lo llama core.startup)."""
+    return _get_model() is not None
 
 def gemini_render(system_prompt: str, user_prompt: str) -> str:
     """
     Motor de análisis de lenguaje natural.
     Diseñado para máxima estabilidad en el Tier Gratuito de Google.
     """
-    if not GEMINI_READY:
+    model = _get_model()
+    if model is None:
         return "⚠️ Error: La IA no está configurada correctamente en Railway."
 
     try:
-        # Usamos 1.5-flash: es el más rápido y tiene la cuota más alta para gratis
-        model = genai.GenerativeModel('gemini-1.5-flash')
-
         # UNIFICACIÓN ESTRATÉGICA: 
         # Combinamos todo en un solo bloque con separadores claros.
         full_input = (
@@ -66,6 +90,11 @@ def gemini_render(system_prompt: str, user_prompt: str) -> str:
             generation_config=generation_config
         )
 
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.incr("llm_tokens", getattr(usage, "prompt_token_count", 0) or 0, kind="prompt")
+            metrics.incr("llm_tokens", getattr(usage, "candidates_token_count", 0) or 0, kind="output")
+
         # VALIDACIÓN DE RESPUESTA
         if not response or not response.text:
             logger.warning("⚠️ Gemini devolvió una respuesta vacía o fue bloqueada por filtros.")
@@ -82,6 +111,7 @@ def gemini_render(system_prompt: str, user_prompt: str) -> str:
 
     except Exception as e:
         error_msg = str(e)
+        metrics.incr("llm_errors")
         logger.error(f"💥 Fallo en el motor Gemini: {error_msg}")
 
         # DIAGNÓSTICO ESPECÍFICO
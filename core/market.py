@@ -9,6 +9,8 @@ except ImportError:
     # Fallback por si sources no está listo
     def verify_price_multi_source(p, s): return 1, "OK"
 
+from core.pricebook import PRICE_BOOK
+
 logger = logging.getLogger(__name__)
 
 # Listas de categorías actualizadas
@@ -70,12 +72,21 @@ def verify_prices(rows: List[Dict]) -> Tuple[List[Dict], Dict]:
             symbol = (r.get("symbol") or "").upper()
             
             # Verificación cruzada (si existe la función en sources)
-            ok_count, _ = verify_price_multi_source(price, symbol)
+            ok_count, status = verify_price_multi_source(price, symbol)
             
             # Clonamos y enriquecemos el diccionario
             rr = dict(r)
             rr["verified"] = ok_count >= 1
+            rr["sources_ok"] = ok_count
+            rr["verification"] = status
             rr["price"] = price
+            rr["price_source"] = "coingecko"
+
+            # Si el stream está activo, el precio en vivo pisa al snapshot REST
+            live = PRICE_BOOK.get(symbol)
+            if live:
+                rr["price"] = live
+                rr["price_source"] = "stream"
             rr["risk_level"] = estimate_risk(rr)
             rr["is_meme"] = (rr.get("market_cap_rank") or 999) > 200 # Marcamos como sospechosa si está muy abajo
             
@@ -1,17 +1,20 @@
-import json
 import os
+import copy
+import atexit
 import logging
 import threading
 from typing import Dict, Any, Optional
 
+from core.storage import get_storage
+
 logger = logging.getLogger(__name__)
 
-# En Railway, si no hay volumen montado, esto es temporal por cada deploy.
-# Centralizamos la ruta para que siempre apunte al lugar correcto.
-STATE_PATH = os.getenv("STATE_PATH", "core/state.json")
+# El estado vive en el backend unificado (core.storage); core/state.json solo se migra.
+# Lock de seguridad para evitar que dos hilos escriban al mismo tiempo
+_STATE_LOCK = threading.RLock()
 
-# Lock de seguridad para evitar que dos procesos escriban al mismo tiempo
-_STATE_LOCK = threading.Lock()
+# Ventana de agrupación de escrituras (segundos)
+SAVE_DEBOUNCE = float(os.getenv("STATE_SAVE_DEBOUNCE", "1.0"))
 
 def _default_state() -> Dict[str, Any]:
     """Define la estructura base del bot para evitar errores de llave inexistente."""
@@ -24,70 +27,120 @@ def _default_state() -> Dict[str, Any]:
             "avoid": [],                
             "avoid_memecoins": False,   
         },
-        "brain": {"sessions": {}}       # Conector con learning.py
     }
 
-def load_state() -> Dict[str, Any]:
-    """Carga el estado con validación de estructura (Safe Load)."""
-    with _STATE_LOCK:
+class _StateCache:
+    """
+    Estado en memoria del proceso: se lee del storage una sola vez y se
+    revalida con data_version (detecta commits de otros procesos). Las
+    escrituras se agrupan (debounce) en una sola transacción.
+    """
+
+    def __init__(self):
+        self.state: Optional[Dict[str, Any]] = None
+        self.version: Optional[int] = None
+        self.dirty = False
+        self.timer: Optional[threading.Timer] = None
+        self.disk_reads = 0
+        self.disk_writes = 0
+
+    def current(self) -> Dict[str, Any]:
+        """Devuelve el estado vivo (sin copiar). Llamar con _STATE_LOCK tomado."""
+        store = get_storage()
+        version = store.data_version()
+        if self.state is not None and (self.dirty or version == self.version):
+            if self.dirty and version != self.version:
+                logger.warning("⚠️ El estado cambió en otro proceso con escrituras locales pendientes; gana la versión local.")
+            return self.state
+
+        if self.state is not None:
+            logger.info("🔄 Estado modificado por otro proceso. Recargando.")
+        state = _default_state()
         try:
-            if not os.path.exists(STATE_PATH):
-                logger.info("📄 No se encontró archivo de estado. Creando uno nuevo.")
-                return _default_state()
-                
-            with open(STATE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            # Merge inteligente: asegura que si agregamos funciones nuevas al bot, 
-            # el JSON viejo no rompa el sistema.
-            state = _default_state()
-            if isinstance(data, dict):
-                if "chat_id" in data: state["chat_id"] = data["chat_id"]
-                if "prefs" in data: state["prefs"].update(data["prefs"])
-                if "brain" in data: state["brain"] = data["brain"]
-                if "is_active" in data: state["is_active"] = data["is_active"]
-                
-            return state
+            admin = store.items("admin")
+            if "chat_id" in admin: state["chat_id"] = admin["chat_id"]
+            if "is_active" in admin: state["is_active"] = admin["is_active"]
+            state["prefs"].update(store.get("prefs", "global", {}))
+            self.disk_reads += 1
         except Exception as e:
             logger.error(f"❌ Error crítico cargando el estado: {e}")
-            return _default_state()
+        self.state, self.version = state, version
+        return self.state
 
-def save_state(state: Dict[str, Any]) -> None:
-    """Guarda el estado usando escritura atómica y validación de directorio."""
-    with _STATE_LOCK:
+    def mark_dirty(self) -> None:
+        """Programa una escritura diferida: varias modificaciones seguidas = un solo write."""
+        self.dirty = True
+        if self.timer is None:
+            self.timer = threading.Timer(SAVE_DEBOUNCE, flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def write(self) -> None:
+        """Guarda el estado en una transacción. Llamar con _STATE_LOCK tomado."""
+        self.timer = None
+        if not self.dirty or self.state is None:
+            return
         try:
-            # Asegurar que la carpeta core/ existe
-            dir_name = os.path.dirname(os.path.abspath(STATE_PATH))
-            if not os.path.exists(dir_name):
-                os.makedirs(dir_name, exist_ok=True)
-            
-            # Guardado atómico (Temporal -> Reemplazo)
-            temp_path = STATE_PATH + ".tmp"
-            with open(temp_path, "w", encoding="utf-8") as f:
-                json.dump(state, f, ensure_ascii=False, indent=4)
-            
-            os.replace(temp_path, STATE_PATH)
+            store = get_storage()
+            with store.transaction():
+                store.put("admin", "chat_id", self.state.get("chat_id"))
+                store.put("admin", "is_active", bool(self.state.get("is_active", True)))
+                store.put("prefs", "global", self.state.get("prefs") or {})
+            # Nuestros propios commits no cambian data_version para esta conexión
+            self.version = store.data_version()
+            self.dirty = False
+            self.disk_writes += 1
             logger.debug("✅ Estado guardado exitosamente.")
         except Exception as e:
             logger.error(f"❌ Error guardando el estado: {e}")
 
+_CACHE = _StateCache()
+
+def load_state() -> Dict[str, Any]:
+    """Devuelve una copia del estado (servida desde memoria si nadie lo modificó)."""
+    with _STATE_LOCK:
+        return copy.deepcopy(_CACHE.current())
+
+def save_state(state: Dict[str, Any]) -> None:
+    """Reemplaza el estado en memoria y agenda la escritura."""
+    with _STATE_LOCK:
+        _CACHE.state = copy.deepcopy(state)
+        _CACHE.mark_dirty()
+
+def flush() -> None:
+    """Fuerza la escritura pendiente (se llama solo al vencer el debounce y al salir)."""
+    with _STATE_LOCK:
+        _CACHE.write()
+
+atexit.register(flush)
+
+def get_state_stats() -> Dict[str, Any]:
+    return {"disk_reads": _CACHE.disk_reads, "disk_writes": _CACHE.disk_writes, "dirty": _CACHE.dirty}
+
 def get_admin_id() -> Optional[int]:
     """Recupera el chat_id del dueño para funciones administrativas."""
-    st = load_state()
-    return st.get("chat_id")
+    with _STATE_LOCK:
+        return _CACHE.current().get("chat_id")
 
 def set_chat_id(chat_id: int) -> None:
     """Define quién es el administrador principal del bot."""
-    st = load_state()
-    st["chat_id"] = int(chat_id)
-    save_state(st)
+    with _STATE_LOCK:
+        _CACHE.current()["chat_id"] = int(chat_id)
+        _CACHE.mark_dirty()
     logger.info(f"👑 Admin ID configurado: {chat_id}")
 
 def update_prefs(patch: Dict[str, Any]) -> Dict[str, Any]:
     """Actualiza preferencias globales de filtrado."""
-    st = load_state()
-    prefs = st.get("prefs", _default_state()["prefs"])
+    with _STATE_LOCK:
+        st = _CACHE.current()
+        prefs = st.get("prefs", _default_state()["prefs"])
+        _apply_prefs_patch(prefs, patch)
+        st["prefs"] = prefs
+        _CACHE.mark_dirty()
+        return dict(prefs)
 
+def _apply_prefs_patch(prefs: Dict[str, Any], patch: Dict[str, Any]) -> None:
+    """Valida y aplica un patch de preferencias sobre el dict recibido."""
     # Riesgo
     if "risk" in patch and patch["risk"] in {"LOW", "MEDIUM", "HIGH"}:
         prefs["risk"] = patch["risk"]
@@ -105,11 +158,8 @@ def update_prefs(patch: Dict[str, Any]) -> Dict[str, Any]:
                     current.add(item.upper().strip())
             prefs[key] = sorted(list(current))
 
-    st["prefs"] = prefs
-    save_state(st)
-    return prefs
-
 def clear_all_state() -> None:
     """Borra todo y reinicia el bot a fábrica."""
     save_state(_default_state())
+    flush()
     logger.warning("🚨 ESTADO REINICIADO POR COMPLETO.")
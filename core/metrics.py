@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Con METRICS_ENABLED=0 todas las llamadas son no-ops (costo despreciable)
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+WINDOW = 1024            # Muestras por histograma (ventana móvil)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL = nullcontext()
+_LOCK = threading.Lock()
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class _Histogram:
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+    def quantiles(self) -> Dict[float, float]:
+        data = sorted(self.samples)
+        if not data:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: data[min(len(data) - 1, int(q * len(data)))] for q in QUANTILES}
+
+_COUNTERS: Dict[LabelKey, float] = {}
+_GAUGES: Dict[LabelKey, float] = {}
+_HISTOGRAMS: Dict[LabelKey, _Histogram] = {}
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _LOCK:
+        _COUNTERS[k] = _COUNTERS.get(k, 0) + value
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    if not ENABLED:
+        return
+    with _LOCK:
+        _GAUGES[_key(name, labels)] = float(value)
+
+def observe(name: str, value: float, **labels) -> None:
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _LOCK:
+        h = _HISTOGRAMS.get(k)
+        if h is None:
+            h = _HISTOGRAMS[k] = _Histogram()
+        h.samples.append(value)
+        h.count += 1
+        h.total += value
+
+@contextmanager
+def _timed(name: str, labels: Dict[str, str]):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+def timer(stage: str):
+    """Mide la duración de una etapa: `with timer("verify_prices"): ...`"""
+    if not ENABLED:
+        return _NULL
+    return _timed("stage_seconds", {"stage": stage})
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _GAUGES.clear()
+        _HISTOGRAMS.clear()
+
+# --- EXPORTADORES ---
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+def render_prometheus() -> str:
+    """Exporta todo en formato de texto de Prometheus (histogramas como summary)."""
+    with _LOCK:
+        counters = dict(_COUNTERS)
+        gauges = dict(_GAUGES)
+        hists = {k: (h.quantiles(), h.count, h.total) for k, h in _HISTOGRAMS.items()}
+
+    lines, typed = [], set()
+    for (name, labels), v in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE ortelli_{name} counter")
+            typed.add(name)
+        lines.append(f"ortelli_{name}{_fmt_labels(labels)} {v}")
+    for (name, labels), v in sorted(gauges.items()):
+        if name not in typed:
+            lines.append(f"# TYPE ortelli_{name} gauge")
+            typed.add(name)
+        lines.append(f"ortelli_{name}{_fmt_labels(labels)} {v}")
+    for (name, labels), (qs, count, total) in sorted(hists.items()):
+        if name not in typed:
+            lines.append(f"# TYPE ortelli_{name} summary")
+            typed.add(name)
+        for q, v in qs.items():
+            lines.append(f"ortelli_{name}{_fmt_labels(labels, ('quantile', str(q)))} {v:.6f}")
+        lines.append(f"ortelli_{name}_count{_fmt_labels(labels)} {count}")
+        lines.append(f"ortelli_{name}_sum{_fmt_labels(labels)} {total:.6f}")
+    return "\n".join(lines) + "\n"
+
+def render_stats_text() -> str:
+    """Resumen legible para el comando /stats (solo admin)."""
+    if not ENABLED:
+        return "📊 Métricas desactivadas (METRICS_ENABLED=0)."
+    with _LOCK:
+        hists = sorted(_HISTOGRAMS.items())
+        counters = sorted(_COUNTERS.items())
+
+    lines = ["📊 Latencias (p50 / p95 / p99)"]
+    for (name, labels), h in hists:
+        qs = h.quantiles()
+        label = ",".join(v for _, v in labels) or name
+        unit, mult = ("ms", 1000) if name.endswith("_seconds") else ("", 1)
+        lines.append(
+            f"• {label}: {qs[0.5] * mult:.0f} / {qs[0.95] * mult:.0f} / {qs[0.99] * mult:.0f}{unit} (n={h.count})"
+        )
+    if counters:
+        lines += ["", "🔢 Contadores"]
+        for (name, labels), v in counters:
+            label = ",".join(f"{k}={val}" for k, val in labels)
+            lines.append(f"• {name}{'{' + label + '}' if label else ''}: {v:g}")
+    return "\n".join(lines)
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Endpoint /metrics opcional para que Prometheus scrapee (METRICS_PORT > 0)."""
+    if not ENABLED or not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Métricas Prometheus en :{port}/metrics")
+    return server
@@ -2,15 +2,28 @@ import time
 import requests
 import logging
 import os
-from typing import Dict, List, Tuple, Optional, Any
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional, Any
+
+from core import metrics
+from core.cache import TTLCache, CACHE_REGISTRY
+from core.shared_snapshot import SHARED_SNAPSHOT
 
 # Configuración de Logging con formato de diagnóstico
 logger = logging.getLogger(__name__)
 
-# Configuración de URLs
-COINGECKO_MARKETS = "https://api.coingecko.com/api/v3/coins/markets"
-BINANCE_TICKER = "https://api.binance.com/api/v3/ticker/price"
-COINBASE_TICKER = "https://api.exchange.coinbase.com/products/{product_id}/ticker"
+# Configuración de URLs (las bases se pueden apuntar a servidores stub locales para pruebas)
+BINANCE_BASE = os.getenv("BINANCE_BASE_URL", "https://api.binance.com")
+COINBASE_BASE = os.getenv("COINBASE_BASE_URL", "https://api.exchange.coinbase.com")
+KRAKEN_BASE = os.getenv("KRAKEN_BASE_URL", "https://api.kraken.com")
+
+COINGECKO_MARKETS = os.getenv("COINGECKO_MARKETS_URL", "https://api.coingecko.com/api/v3/coins/markets")
+BINANCE_TICKER = BINANCE_BASE + "/api/v3/ticker/price"
+COINBASE_TICKER = COINBASE_BASE + "/products/{product_id}/ticker"
+COINBASE_STATS = COINBASE_BASE + "/products/stats"
+KRAKEN_TICKER = KRAKEN_BASE + "/0/public/Ticker"
 
 DEFAULT_TIMEOUT = 15  # Reducido para evitar que el bot se cuelgue
 HEADERS = {"User-Agent": "OrtelliCryptoAI/1.0", "Accept": "application/json"}
@@ -19,27 +32,40 @@ HEADERS = {"User-Agent": "OrtelliCryptoAI/1.0", "Accept": "application/json"}
 TTL_COINGECKO = 300  # 5 minutos para evitar baneos
 TTL_BINANCE = 60     # 1 minuto
 TTL_COINBASE = 60
+TTL_KRAKEN = 60
+TTL_AGGREGATE = 30   # El agregado se recalcula como mucho cada 30s
+
+# Reglas de agregación
+MAX_STALENESS = 180      # Una fuente sin datos frescos en 3 min se excluye
+PRICE_TOLERANCE = 0.02   # 2% contra la mediana para contar en el quórum
 
-# Almacenamiento persistente en memoria durante la ejecución
-_CACHES: Dict[str, Dict[str, Tuple[float, Any]]] = {
-    "coingecko": {}, "binance": {}, "coinbase": {}, "kraken": {}
+# Almacenamiento persistente en memoria durante la ejecución (un caché por fuente)
+_CACHES: Dict[str, TTLCache] = {
+    "coingecko": TTLCache(TTL_COINGECKO, 16, name="exchange.coingecko"),
+    "binance": TTLCache(TTL_BINANCE, 16, name="exchange.binance"),
+    "coinbase": TTLCache(TTL_COINBASE, 16, name="exchange.coinbase"),
+    "kraken": TTLCache(TTL_KRAKEN, 16, name="exchange.kraken"),
 }
 
 def _now() -> float:
     return time.time()
 
 def _cache_get(source: str, key: str, ttl: int):
-    item = _CACHES.get(source, {}).get(key)
-    if not item: return None
-    ts, val = item
-    if _now() - ts < ttl:
-        return val
-    return None
+    val = _CACHES[source].get(key)
+    metrics.incr("cache_requests", source=source, result="hit" if val is not None else "miss")
+    return val
 
 def _cache_set(source: str, key: str, val):
     if val is not None:
-        if source not in _CACHES: _CACHES[source] = {}
-        _CACHES[source][key] = (_now(), val)
+        _CACHES[source].set(key, val)
+
+def _cache_stale(source: str, key: str, empty):
+    """Fallback agresivo: lo último que tengamos, aunque esté vencido."""
+    val = _CACHES[source].get(key, allow_stale=True)
+    if val is None:
+        return empty
+    metrics.incr("cache_stale_served", source=source)
+    return val
 
 def _get_json(url: str, params=None, headers=None, timeout: int = DEFAULT_TIMEOUT):
     """Encapsulador de requests con manejo de errores inteligente."""
@@ -95,8 +121,7 @@ def fetch_coingecko_top100(vs: str = "usd") -> List[dict]:
         return rows
     
     # Fallback agresivo: si la API falla, devolver lo último que tengamos
-    old = _CACHES["coingecko"].get(key)
-    return old[1] if old else []
+    return _cache_stale("coingecko", key, [])
 
 # --- BINANCE ---
 def binance_prices_usdt() -> Dict[str, float]:
@@ -110,8 +135,181 @@ def binance_prices_usdt() -> Dict[str, float]:
         _cache_set("binance", key, out)
         return out
     
-    old = _CACHES["binance"].get(key)
-    return old[1] if old else {}
+    return _cache_stale("binance", key, {})
+
+# --- COINBASE ---
+def coinbase_prices_usd() -> Dict[str, float]:
+    """Último precio de todos los pares -USD en un solo request (/products/stats)."""
+    key = "stats:usd"
+    cached = _cache_get("coinbase", key, TTL_COINBASE)
+    if cached: return cached
+
+    data = _get_json(COINBASE_STATS)
+    if data and isinstance(data, dict):
+        out = {}
+        for product_id, stats in data.items():
+            base, _, quote = product_id.partition("-")
+            last = ((stats or {}).get("stats_24hour") or {}).get("last")
+            if quote == "USD" and last:
+                out[base.upper()] = float(last)
+        _cache_set("coinbase", key, out)
+        return out
+
+    return _cache_stale("coinbase", key, {})
+
+# --- KRAKEN ---
+# Kraken usa códigos legacy (XXBTZUSD, XDGUSD...): los normalizamos a tickers comunes
+KRAKEN_ALIASES = {"XBT": "BTC", "XDG": "DOGE"}
+# Pares de 8 caracteres con "ZUSD" que no siguen el formato legacy X<base>Z<quote>
+KRAKEN_PAIRS = {"USDTZUSD": "USDT"}
+
+def _kraken_base(pair: str) -> Optional[str]:
+    if pair in KRAKEN_PAIRS:
+        base = KRAKEN_PAIRS[pair]
+    elif len(pair) == 8 and pair[0] in "XZ" and pair.endswith("ZUSD"):
+        # Solo el formato legacy completo (XXBTZUSD, XETHZUSD): en el resto la X/Z
+        # es parte del ticker (XTZUSD = XTZ, BLZUSD = BLZ, XCNUSD = XCN)
+        base = pair[1:4]
+    elif pair.endswith("USD"):
+        base = pair[:-3]
+    else:
+        return None
+    return KRAKEN_ALIASES.get(base, base) or None
+
+def kraken_prices_usd() -> Dict[str, float]:
+    """Último precio de todos los pares contra USD en un solo request."""
+    key = "ticker:usd"
+    cached = _cache_get("kraken", key, TTL_KRAKEN)
+    if cached: return cached
+
+    data = _get_json(KRAKEN_TICKER)
+    if data and isinstance(data, dict) and not data.get("error"):
+        out = {}
+        for pair, tick in (data.get("result") or {}).items():
+            base = _kraken_base(pair)
+            last = (tick or {}).get("c") or []
+            if base and last:
+                out[base] = float(last[0])
+        _cache_set("kraken", key, out)
+        return out
+
+    return _cache_stale("kraken", key, {})
+
+def _binance_prices_usd() -> Dict[str, float]:
+    """Binance cotiza contra USDT: lo tomamos como USD y normalizamos a ticker base."""
+    return {sym[:-4]: p for sym, p in binance_prices_usdt().items() if sym.endswith("USDT")}
+
+# --- AGREGACIÓN MULTI-EXCHANGE ---
+EXCHANGE_FETCHERS: Dict[str, Callable[[], Dict[str, float]]] = {
+    "binance": _binance_prices_usd,
+    "coinbase": coinbase_prices_usd,
+    "kraken": kraken_prices_usd,
+}
+
+_CACHE_SOURCE = {"binance": ("binance", "ticker:usdt"), "coinbase": ("coinbase", "stats:usd"), "kraken": ("kraken", "ticker:usd")}
+
+class _SourceHealth:
+    """Latencia y salud de cada exchange, para diagnóstico y exclusión."""
+
+    def __init__(self):
+        self.latencies_ms = deque(maxlen=50)
+        self.ok = 0
+        self.errors = 0
+        self.status = "unknown"
+        self.symbols = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies_ms)
+        return {
+            "status": self.status,
+            "ok": self.ok,
+            "errors": self.errors,
+            "symbols": self.symbols,
+            "latency_ms_p50": round(lat[len(lat) // 2], 1) if lat else None,
+            "latency_ms_max": round(lat[-1], 1) if lat else None,
+        }
+
+_HEALTH: Dict[str, _SourceHealth] = {name: _SourceHealth() for name in EXCHANGE_FETCHERS}
+_AGG_LOCK = threading.Lock()
+_AGG = TTLCache(TTL_AGGREGATE, 4, name="exchange.aggregate")
+
+def _data_age(name: str) -> Optional[float]:
+    source, key = _CACHE_SOURCE[name]
+    return _CACHES[source].age(key)
+
+def _poll_source(name: str) -> Tuple[str, Dict[str, float]]:
+    """Consulta un exchange y decide si su dato es usable (fresco) o se excluye."""
+    health = _HEALTH.setdefault(name, _SourceHealth())
+    t0 = time.perf_counter()
+    try:
+        prices = EXCHANGE_FETCHERS[name]() or {}
+    except Exception as e:
+        logger.error(f"❌ Fuente {name} rota: {e}")
+        prices = {}
+    health.latencies_ms.append((time.perf_counter() - t0) * 1000)
+
+    age = _data_age(name)
+    if age is not None:
+        metrics.set_gauge("source_data_age_seconds", age, source=name)
+    if not prices or age is None:
+        health.status, health.errors = "down", health.errors + 1
+        return name, {}
+    if age > MAX_STALENESS:
+        # Viene del fallback de cache viejo: no sirve como referencia
+        health.status, health.errors = "stale", health.errors + 1
+        return name, {}
+    health.status, health.ok, health.symbols = "ok", health.ok + 1, len(prices)
+    return name, prices
+
+def aggregate_prices(force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Consulta todos los exchanges en paralelo y arma, por símbolo,
+    la mediana de referencia y el quórum de fuentes que coinciden.
+    """
+    if not force:
+        shared = SHARED_SNAPSHOT.read("exchanges")  # Worker: lo publica el refrescador
+        if shared is not None:
+            return shared
+
+    with _AGG_LOCK:
+        cached = None if force else _AGG.get("prices")
+        if cached is not None:
+            return cached
+
+        with ThreadPoolExecutor(max_workers=len(EXCHANGE_FETCHERS)) as pool:
+            results = dict(pool.map(_poll_source, EXCHANGE_FETCHERS))
+
+        by_symbol: Dict[str, Dict[str, float]] = {}
+        for name, prices in results.items():
+            for sym, p in prices.items():
+                if p > 0:
+                    by_symbol.setdefault(sym, {})[name] = p
+
+        out = {}
+        for sym, quotes in by_symbol.items():
+            ref = median(list(quotes.values()))
+            agreeing = [n for n, p in quotes.items() if abs(p - ref) / ref <= PRICE_TOLERANCE]
+            out[sym] = {
+                "median": ref,
+                "quorum": len(agreeing),
+                "sources": quotes,
+                "outliers": [n for n in quotes if n not in agreeing],
+            }
+
+        _AGG.set("prices", out)
+        return out
+
+def reference_price(symbol: str) -> Optional[Dict[str, Any]]:
+    """Precio de referencia multi-exchange para un ticker (o None si nadie lo lista)."""
+    return aggregate_prices().get((symbol or "").upper())
+
+def get_source_stats() -> Dict[str, Dict[str, Any]]:
+    """DIAGNÓSTICO: estado, latencia y cobertura por exchange."""
+    stats = {name: h.snapshot() for name, h in _HEALTH.items()}
+    for name in stats:
+        age = _data_age(name)
+        stats[name]["data_age_s"] = round(age, 1) if age is not None else None
+    return stats
 
 # --- VERIFICACIÓN MULTI-FUENTE ---
 def median(values: List[float]) -> Optional[float]:
@@ -124,15 +322,20 @@ def median(values: List[float]) -> Optional[float]:
 def verify_price_multi_source(price: float, symbol: str) -> Tuple[int, str]:
     """
     Función requerida por el Engine para validar un precio específico.
+    Cuenta CoinGecko + cada exchange que coincide con la mediana de referencia.
     """
-    bn = binance_prices_usdt()
-    sources_count = 1 # Ya tenemos CoinGecko
-    ticker = f"{symbol.upper()}USDT"
-    
-    if ticker in bn:
-        binance_p = bn[ticker]
-        diff = abs(price - binance_p) / price
-        if diff < 0.05: # Menos del 5% de diferencia
-            sources_count += 1
-            
-    return sources_count, "OK"
+    if price <= 0:
+        return 0, "invalid_price"
+
+    ref = reference_price(symbol)
+    if not ref:
+        return 1, "coingecko_only"
+
+    if abs(price - ref["median"]) / ref["median"] > PRICE_TOLERANCE:
+        # Los exchanges no respaldan el precio de CoinGecko
+        return 0, "coingecko_outlier"
+    count = ref["quorum"] + 1
+    return count, f"quorum_{count}/{len(ref['sources']) + 1}"
+
+# Pre-calentamiento desde el registro de cachés (/cache precalentar exchange)
+CACHE_REGISTRY.set_warmer("exchange.aggregate", lambda: aggregate_prices(force=True))
@@ -1,9 +1,14 @@
-import time
 import requests
 import xml.etree.ElementTree as ET
 import logging
 import re
-from typing import List, Dict, Optional
+from email.utils import parsedate_to_datetime
+from typing import Iterable, List, Dict, Optional
+
+from core.news_index import NEWS_INDEX
+from core import metrics
+from core.cache import TTLCache, CACHE_REGISTRY
+from core.shared_snapshot import SHARED_SNAPSHOT
 
 logger = logging.getLogger(__name__)
 
@@ -18,19 +23,14 @@ RSS_FEEDS = [
 ]
 
 _TTL = 900  # 15 minutos
-_CACHE: Dict[str, tuple] = {}
+_CACHE = TTLCache(ttl_seconds=_TTL, max_items=8, name="news.feed")
 
 def _cache_get(key: str):
-    item = _CACHE.get(key)
-    if not item: return None
-    ts, val = item
-    if time.time() - ts < _TTL:
-        return val
-    return None
+    return _CACHE.get(key)
 
 def _cache_set(key: str, val):
     if val:
-        _CACHE[key] = (time.time(), val)
+        _CACHE.set(key, val)
 
 def clean_html(text: str) -> str:
     """Limpia etiquetas HTML y entidades raras de las descripciones RSS."""
@@ -40,6 +40,12 @@ def clean_html(text: str) -> str:
     # Quita espacios extra
     return " ".join(text.split())
 
+def _parse_date(raw: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(raw).timestamp() if raw else None
+    except Exception:
+        return None
+
 def fetch_rss(url: str) -> List[Dict]:
     """Descarga y parsea noticias con manejo de errores de encoding."""
     try:
@@ -60,19 +66,33 @@ def fetch_rss(url: str) -> List[Dict]:
                 items.append({
                     "title": title,
                     "link": link,
-                    "source": source_domain
+                    "source": source_domain,
+                    "summary": clean_html(it.findtext("description") or "")[:300],
+                    "ts": _parse_date(it.findtext("pubDate") or ""),
                 })
         return items
     except Exception as e:
         logger.warning(f"⚠️ Fuente RSS caída o lenta ({url.split('/')[2]}): {e}")
         return []
 
+_LAST_SHARED: Optional[List[Dict]] = None
+
 def fetch_news(limit_total: int = 15) -> List[Dict]:
     """Motor de noticias con deduplicación y fallback."""
+    global _LAST_SHARED
+    shared = SHARED_SNAPSHOT.read("news")  # Worker: el refrescador ya bajó y deduplicó los feeds
+    if shared is not None:
+        if shared is not _LAST_SHARED:
+            NEWS_INDEX.add_articles(shared)  # Una vez por versión publicada
+            _LAST_SHARED = shared
+        return shared[:limit_total]
+
     key = "news_feed_unified"
     cached = _cache_get(key)
     if cached:
+        metrics.incr("cache_requests", source="news", result="hit")
         return cached[:limit_total]
+    metrics.incr("cache_requests", source="news", result="miss")
 
     all_items = []
     for feed in RSS_FEEDS:
@@ -80,8 +100,10 @@ def fetch_news(limit_total: int = 15) -> List[Dict]:
 
     if not all_items:
         # Si todo falló, intentamos devolver el cache aunque esté vencido
-        old = _CACHE.get(key)
-        return old[1][:limit_total] if old else []
+        old = _CACHE.get(key, allow_stale=True)
+        if old:
+            metrics.incr("cache_stale_served", source="news")
+        return old[:limit_total] if old else []
 
     # Deduplicación por título (algunos feeds repiten noticias con distinto link)
     seen_titles = set()
@@ -93,14 +115,24 @@ def fetch_news(limit_total: int = 15) -> List[Dict]:
             unique_news.append(it)
 
     _cache_set(key, unique_news)
+    # Índice invertido incremental: solo las noticias nuevas se procesan
+    NEWS_INDEX.add_articles(unique_news)
     return unique_news[:limit_total]
 
-def get_news_summary_for_llm(limit: int = 6) -> str:
+def get_news_summary_for_llm(limit: int = 6, symbols: Optional[Iterable[str]] = None) -> str:
     """
     Formatea las noticias para el Engine. 
-    Asegura que Gemini reciba info fresca para su análisis.
+    Si la pregunta menciona monedas, solo inyecta las noticias de esas monedas
+    (prompt más chico y más relevante); si no, los titulares generales.
     """
     news = fetch_news(limit)
+    symbols = list(symbols or [])
+    if symbols:
+        related = NEWS_INDEX.query(symbols, limit=min(limit, 4))
+        if related:
+            header = f"📰 NOTICIAS SOBRE {', '.join(symbols[:5])}:\n"
+            return header + "\n".join(f"- {n['title']} (Vía: {n['source']})" for n in related)
+
     if not news:
         return "No hay noticias de impacto encontradas en la última hora."
     
@@ -109,3 +141,6 @@ def get_news_summary_for_llm(limit: int = 6) -> str:
     lines = [f"- {n['title']} (Vía: {n['source']})" for n in news]
     
     return header + "\n".join(lines)
+
+# Pre-calentamiento desde el registro de cachés
+CACHE_REGISTRY.set_warmer("news.feed", fetch_news)
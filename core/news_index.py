@@ -0,0 +1,145 @@
+import re
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Set
+
+from core.signals import extract_symbols, score_article
+
+logger = logging.getLogger(__name__)
+
+MAX_ARTICLES = 500        # Ventana de noticias recientes indexadas
+MAX_PER_SYMBOL = 20       # Postings por símbolo (las más nuevas)
+MIN_NAME_LEN = 4          # Nombres muy cortos ("Sui", "Ton") generan falsos positivos
+
+# Palabras que en el texto del usuario se confunden con tickers reales
+USER_STOPWORDS = {"DE", "EL", "LA", "LOS", "LAS", "QUE", "CON", "POR", "UNA", "UN", "ES", "EN", "LO", "MI", "HOY", "YA", "SI", "NO"}
+# En texto del usuario un ticker cuenta solo si viene con $ o escrito en mayúsculas:
+# "sol", "link" u "one" en minúscula son palabras comunes, no SOL/LINK/ONE
+USER_TICKER_RE = re.compile(r"\$([A-Za-z0-9]{2,10})\b|(?<![\w$])([A-Z0-9]{2,10})\b")
+
+def _article_id(item: Dict) -> str:
+    raw = (item.get("link") or "") + "\x00" + (item.get("title") or "")
+    return hashlib.blake2b(raw.encode("utf-8", "ignore"), digest_size=10).hexdigest()
+
+class NewsIndex:
+    """
+    Índice invertido símbolo -> noticias recientes.
+    Se alimenta de forma incremental (solo se procesan artículos nuevos)
+    y valida los símbolos contra el universo del snapshot de mercado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._articles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._postings: Dict[str, deque] = {}
+        self._symbols: Set[str] = set()
+        self._names: Dict[str, str] = {}       # nombre en minúscula -> símbolo
+        self._name_re: Optional[re.Pattern] = None
+        self._universe_key: Optional[int] = None
+
+    # --- Universo ---
+
+    def set_universe(self, rows: Iterable[Dict]) -> None:
+        """Actualiza símbolos/nombres válidos. Si el universo no cambió, no hace nada."""
+        rows = list(rows)
+        key = hash(tuple((r.get("symbol") or "").upper() for r in rows))
+        if key == self._universe_key:
+            return
+
+        symbols, names = set(), {}
+        for r in rows:
+            sym = (r.get("symbol") or "").upper().strip()
+            name = (r.get("name") or "").strip().lower()
+            if not sym:
+                continue
+            symbols.add(sym)
+            if len(name) >= MIN_NAME_LEN and name not in names:
+                names[name] = sym  # Ranking descendente: gana la moneda más grande
+
+        name_re = None
+        if names:
+            alts = sorted(names, key=len, reverse=True)
+            name_re = re.compile(r"\b(" + "|".join(map(re.escape, alts)) + r")\b", re.IGNORECASE)
+
+        with self._lock:
+            self._symbols, self._names, self._name_re = symbols, names, name_re
+            self._universe_key = key
+            # El universo cambió: re-validamos lo que ya teníamos (ventana acotada)
+            self._postings.clear()
+            for aid, art in self._articles.items():
+                art["symbols"] = self._match(art["title"] + " " + art.get("summary", ""))
+                self._post(aid, art["symbols"])
+
+    # --- Indexado ---
+
+    def _match(self, text: str) -> List[str]:
+        found = extract_symbols(text, self._symbols)
+        if self._name_re:
+            found += [self._names[m.lower()] for m in self._name_re.findall(text)]
+        return list(dict.fromkeys(found))
+
+    def _post(self, aid: str, symbols: List[str]) -> None:
+        for sym in symbols:
+            self._postings.setdefault(sym, deque(maxlen=MAX_PER_SYMBOL)).append(aid)
+
+    def add_articles(self, items: Iterable[Dict]) -> int:
+        """Indexa solo las noticias que no vimos antes. Devuelve cuántas eran nuevas."""
+        added = 0
+        with self._lock:
+            for it in items:
+                aid = _article_id(it)
+                if aid in self._articles:
+                    continue
+                art = {
+                    "title": it.get("title") or "",
+                    "summary": it.get("summary") or "",
+                    "source": it.get("source") or "",
+                    "link": it.get("link") or "",
+                    "ts": float(it.get("ts") or time.time()),
+                }
+                art["score"] = score_article(art)[0]
+                art["symbols"] = self._match(art["title"] + " " + art["summary"])
+                self._articles[aid] = art
+                self._post(aid, art["symbols"])
+                added += 1
+
+            while len(self._articles) > MAX_ARTICLES:
+                self._articles.popitem(last=False)  # Los postings huérfanos se ignoran al consultar
+        if added:
+            logger.debug(f"🗂️ NewsIndex: {added} noticias nuevas indexadas.")
+        return added
+
+    # --- Consultas ---
+
+    def symbols_in_text(self, text: str) -> List[str]:
+        """Tickers/nombres del universo mencionados en una pregunta del usuario."""
+        if not text or not self._symbols:
+            return []
+        found = []
+        for dollar, plain in USER_TICKER_RE.findall(text):
+            sym = (dollar or plain).upper()
+            if sym in self._symbols and sym not in USER_STOPWORDS and not sym.isdigit():
+                found.append(sym)
+        if self._name_re:
+            found += [self._names[m.lower()] for m in self._name_re.findall(text)]
+        return list(dict.fromkeys(found))
+
+    def query(self, symbols: Iterable[str], limit: int = 4) -> List[Dict]:
+        """Noticias sobre esos símbolos: más recientes primero, desempate por impacto."""
+        with self._lock:
+            hits: Dict[str, Dict] = {}
+            for sym in symbols:
+                for aid in self._postings.get(sym.upper(), ()):
+                    art = self._articles.get(aid)
+                    if art is not None:
+                        hits[aid] = art
+        ranked = sorted(hits.values(), key=lambda a: (a["ts"], a["score"]), reverse=True)
+        return ranked[:limit]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"articles": len(self._articles), "symbols_indexed": len(self._postings), "universe": len(self._symbols)}
+
+NEWS_INDEX = NewsIndex()
@@ -0,0 +1,230 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from core.ratelimit import TokenBucket
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Límites oficiales de Telegram (con margen de seguridad)
+TELEGRAM_MAX_LEN = 4096
+GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "25"))          # ~30 msg/s por bot
+PRIVATE_INTERVAL = float(os.getenv("TG_CHAT_INTERVAL", "1.0"))   # 1 msg/s por chat privado
+GROUP_INTERVAL = float(os.getenv("TG_GROUP_INTERVAL", "3.0"))    # 20 msg/min por grupo
+MAX_RETRIES = 5
+
+# Prioridades: las respuestas interactivas siempre pasan antes que el digest masivo
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LEN) -> List[str]:
+    """Corta mensajes largos respetando párrafos, líneas y palabras (en ese orden)."""
+    text = text or ""
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    rest = text
+    while len(rest) > limit:
+        window = rest[:limit]
+        cut = -1
+        cut = limit  # Sin separador en la segunda mitad de la ventana: corte duro (evita pedazos chicos)
+        for sep in ("\n\n", "\n", " "):
+            pos = window.rfind(sep)
+            if pos > limit // 2:
+                cut = pos
+                break
+        chunks.append(rest[:cut].rstrip())
+        rest = rest[cut:].lstrip()
+    if rest:
+        chunks.append(rest)
+    return chunks
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Extrae retry_after de un ApiTelegramException (429) sin acoplarnos a telebot."""
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    params = (getattr(exc, "result_json", None) or {}).get("parameters") or {}
+    return float(params.get("retry_after") or 1)
+
+class _Job:
+    __slots__ = ("chat_id", "text", "reply_to", "parse_mode", "attempts", "enqueued_at")
+
+    def __init__(self, chat_id: int, text: str, reply_to: Optional[int], parse_mode: Optional[str]):
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_to = reply_to
+        self.parse_mode = parse_mode
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+class SendQueue:
+    """
+    Cola de salida con rate limit global (token bucket) y ritmo por chat.
+    Reintenta ante 429 respetando retry_after y parte mensajes > 4096 caracteres.
+    """
+
+    def __init__(self, bot: Any, workers: int = 4, global_rate: float = GLOBAL_RATE,
+                 on_forbidden: Optional[Callable[[int], None]] = None):
+        self.bot = bot
+        self.workers = int(workers)
+        self.on_forbidden = on_forbidden
+        self._bucket = TokenBucket(global_rate, capacity=global_rate)
+        self._cond = threading.Condition()
+        self._queues: Dict[int, list] = {PRIORITY_INTERACTIVE: [], PRIORITY_BULK: []}
+        self._seq = itertools.count()
+        self._next_allowed: Dict[int, float] = {}
+        self._in_flight: Set[int] = set()
+        self._held: Dict[int, int] = {}   # chat -> seq del trabajo que espera reintento (nadie lo pasa)
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+        # Métricas
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # --- API pública ---
+
+    def send(self, chat_id: int, text: str, reply_to: Optional[int] = None,
+             parse_mode: Optional[str] = "Markdown", priority: int = PRIORITY_INTERACTIVE) -> int:
+        """Encola un mensaje (partido si hace falta). Devuelve cuántas partes se encolaron."""
+        parts = split_message(text)
+        now = time.monotonic()
+        with self._cond:
+            for i, part in enumerate(parts):
+                job = _Job(chat_id, part, reply_to if i == 0 else None, parse_mode)
+                heapq.heappush(self._queues[priority], (now, next(self._seq), job))
+            self._cond.notify_all()
+        return len(parts)
+
+    def broadcast(self, chat_ids: List[int], text: str, parse_mode: Optional[str] = "Markdown") -> int:
+        """Fan-out masivo: un mismo texto ya renderizado a muchos chats, con prioridad baja."""
+        count = 0
+        for cid in chat_ids:
+            self.send(cid, text, parse_mode=parse_mode, priority=PRIORITY_BULK)
+            count += 1
+        logger.info(f"📣 Broadcast encolado para {count} chats.")
+        return count
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def start(self) -> "SendQueue":
+        if self._running:
+            return self
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"outbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, drain_timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + drain_timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"pending": self.pending(), "sent": self.sent, "failed": self.failed, "retried": self.retried}
+
+    # --- Internos ---
+
+    def _chat_interval(self, chat_id: int) -> float:
+        # En Telegram los grupos tienen id negativo
+        return GROUP_INTERVAL if int(chat_id) < 0 else PRIVATE_INTERVAL
+
+    def _push(self, ready_at: float, seq: int, job: _Job, priority: int) -> None:
+        heapq.heappush(self._queues[priority], (ready_at, seq, job))
+        self._cond.notify_all()
+
+    def _next_job(self):
+        """Toma el próximo trabajo listo, respetando prioridad y ritmo por chat."""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                wake_at = None
+                for prio in (PRIORITY_INTERACTIVE, PRIORITY_BULK):
+                    q = self._queues[prio]
+                    while q and q[0][0] <= now:
+                        ready_at, seq, job = heapq.heappop(q)
+                        allowed = self._next_allowed.get(job.chat_id, 0.0)
+                        held = self._held.get(job.chat_id, seq)
+                        if job.chat_id in self._in_flight or allowed > now or held != seq:
+                            # Conserva el seq original para mantener el orden de las partes
+                            heapq.heappush(q, (max(allowed, now + 0.05), seq, job))
+                            continue
+                        self._held.pop(job.chat_id, None)
+                        self._in_flight.add(job.chat_id)
+                        return prio, seq, job
+                    if q:
+                        wake_at = q[0][0] if wake_at is None else min(wake_at, q[0][0])
+                self._cond.wait(timeout=None if wake_at is None else max(0.01, wake_at - now))
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            item = self._next_job()
+            if item is None:
+                return
+            prio, seq, job = item
+            if job.attempts == 0:
+                metrics.observe("outbox_queue_wait_seconds", time.monotonic() - job.enqueued_at,
+                                priority="interactive" if prio == PRIORITY_INTERACTIVE else "bulk")
+            self._bucket.acquire()
+            retry_in = self._deliver(job)
+            with self._cond:
+                self._in_flight.discard(job.chat_id)
+                self._next_allowed[job.chat_id] = time.monotonic() + max(retry_in or 0, self._chat_interval(job.chat_id))
+                if retry_in is not None:
+                    # FIFO por chat: lo que se encoló después espera a que este reintento salga
+                    self._held[job.chat_id] = seq
+                    self._push(self._next_allowed[job.chat_id], seq, job, prio)
+                else:
+                    self._cond.notify_all()
+
+    def _deliver(self, job: _Job) -> Optional[float]:
+        """Envía un mensaje. Devuelve segundos para reintentar, o None si terminó (ok o descartado)."""
+        job.attempts += 1
+        try:
+            self.bot.send_message(job.chat_id, job.text, parse_mode=job.parse_mode,
+                                  reply_to_message_id=job.reply_to)
+            self.sent += 1
+            return None
+        except Exception as e:
+            code = getattr(e, "error_code", None)
+            retry = _retry_after(e)
+            if retry is not None and job.attempts < MAX_RETRIES:
+                self.retried += 1
+                logger.warning(f"⏳ 429 en chat {job.chat_id}: reintento en {retry}s")
+                if retry >= 5:
+                    self._bucket.pause(retry)  # Flood global: frenamos a todos
+                return retry
+            if code == 400 and job.parse_mode != "" and "parse" in str(e).lower() and job.attempts < MAX_RETRIES:
+                # Markdown roto (típico en respuestas de la IA): reenviamos como texto plano.
+                # "" y no None: con None telebot vuelve al parse_mode por defecto del bot (Markdown)
+                job.parse_mode = ""
+                return 0.0
+            if code == 400 and job.reply_to and "reply" in str(e).lower():
+                job.reply_to = None
+                return 0.0
+            if code == 403:
+                logger.info(f"🚫 Chat {job.chat_id} bloqueó al bot. Se descarta.")
+                if self.on_forbidden:
+                    try: self.on_forbidden(job.chat_id)
+                    except Exception as cb_err: logger.error(f"❌ Error en on_forbidden: {cb_err}")
+            self.failed += 1
+            logger.error(f"❌ No se pudo enviar a {job.chat_id}: {e}")
+            return None
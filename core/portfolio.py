@@ -0,0 +1,280 @@
+import math
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from core.storage import get_storage
+from core.market import estimate_risk
+from core.fx import format_money, currency_label
+
+logger = logging.getLogger(__name__)
+
+# Carteras de todos los usuarios como matriz dispersa usuarios x símbolos (formato COO:
+# fila, columna, cantidad, costo). Revaluar a todos es un producto contra el vector de
+# precios del snapshot + un np.bincount por usuario; las consultas son por índice.
+
+RISK_BUCKETS = ("LOW", "MEDIUM", "HIGH", "UNKNOWN")
+_RISK_INDEX = {r: i for i, r in enumerate(RISK_BUCKETS)}
+
+def parse_amount(raw: str) -> float:
+    """Cantidad o precio escrito por el usuario ("0,5" o "0.5"). Solo finitos y positivos."""
+    value = float(raw.replace(",", "."))
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"Monto inválido: {raw}")
+    return value
+
+class PortfolioBook:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._holdings: Dict[int, Dict[str, Dict[str, float]]] = {}  # chat_id -> {SYM: {qty, cost}}
+        self._loaded = False
+        self._dirty = True
+
+        # Matriz COO (se reconstruye solo si cambiaron las tenencias)
+        self._user_index: Dict[int, int] = {}
+        self._users: List[int] = []
+        self._sym_index: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._cols = np.zeros(0, dtype=np.int64)
+        self._qty = np.zeros(0)
+        self._cost = np.zeros(0)
+        self._entries: Dict[int, np.ndarray] = {}   # fila de usuario -> posiciones en el COO
+
+        # Última valuación
+        self._prices: Optional[np.ndarray] = None
+        self._risk: Optional[np.ndarray] = None
+        self._entry_value = np.zeros(0)
+        self._value = np.zeros(0)
+        self._basis = np.zeros(0)
+        self._exposure = np.zeros((0, len(RISK_BUCKETS)))
+        self.revaluations = 0
+
+    # --- Persistencia ---
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        try:
+            for cid, h in get_storage().items("holdings").items():
+                if isinstance(h, dict) and h:
+                    self._holdings[int(cid)] = h
+        except Exception as e:
+            logger.error(f"❌ Error cargando carteras: {e}")
+        self._loaded = True
+        self._dirty = True
+
+    def _persist(self, chat_id: int) -> None:
+        h = self._holdings.get(chat_id)
+        if h:
+            get_storage().put("holdings", chat_id, h)
+        else:
+            get_storage().delete("holdings", chat_id)
+
+    # --- Altas y bajas ---
+
+    def add(self, chat_id: int, symbol: str, qty: float, price: float) -> Dict[str, float]:
+        """Suma cantidad a una posición; el costo promedio se pondera por cantidad."""
+        if not (math.isfinite(qty) and math.isfinite(price)) or qty <= 0 or price < 0:
+            raise ValueError("La cantidad debe ser positiva y el precio no negativo.")
+        sym = symbol.upper()
+        with self._lock:
+            self._ensure_loaded()
+            pos = self._holdings.setdefault(chat_id, {}).setdefault(sym, {"qty": 0.0, "cost": 0.0})
+            pos["qty"] += qty
+            pos["cost"] += qty * price
+            self._dirty = True
+            self._persist(chat_id)
+            return dict(pos)
+
+    def remove(self, chat_id: int, symbol: str, qty: Optional[float] = None) -> bool:
+        """Resta cantidad (o borra la posición entera). El costo baja en proporción."""
+        if qty is not None and (not math.isfinite(qty) or qty <= 0):
+            raise ValueError("La cantidad debe ser positiva.")
+        sym = symbol.upper()
+        with self._lock:
+            self._ensure_loaded()
+            pos = (self._holdings.get(chat_id) or {}).get(sym)
+            if not pos:
+                return False
+            if qty is None or qty >= pos["qty"]:
+                del self._holdings[chat_id][sym]
+                if not self._holdings[chat_id]:
+                    del self._holdings[chat_id]
+            else:
+                pos["cost"] *= (pos["qty"] - qty) / pos["qty"]
+                pos["qty"] -= qty
+            self._dirty = True
+            self._persist(chat_id)
+            return True
+
+    def holdings(self, chat_id: int) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            self._ensure_loaded()
+            return {s: dict(p) for s, p in (self._holdings.get(chat_id) or {}).items()}
+
+    # --- Matriz ---
+
+    def _rebuild(self) -> None:
+        """Reconstruye el COO desde las tenencias (O(nnz), solo tras cambios)."""
+        users, sym_index, symbols = [], {}, []
+        rows, cols, qty, cost = [], [], [], []
+        for cid, pos in self._holdings.items():
+            u = len(users)
+            users.append(cid)
+            for sym, p in pos.items():
+                c = sym_index.get(sym)
+                if c is None:
+                    c = sym_index[sym] = len(symbols)
+                    symbols.append(sym)
+                rows.append(u)
+                cols.append(c)
+                qty.append(float(p["qty"]))
+                cost.append(float(p["cost"]))
+
+        self._users = users
+        self._user_index = {cid: i for i, cid in enumerate(users)}
+        self._symbols, self._sym_index = symbols, sym_index
+        self._rows = np.asarray(rows, dtype=np.int64)
+        self._cols = np.asarray(cols, dtype=np.int64)
+        self._qty = np.asarray(qty, dtype=float)
+        self._cost = np.asarray(cost, dtype=float)
+        order = np.argsort(self._rows, kind="stable")
+        bounds = np.searchsorted(self._rows[order], np.arange(len(users) + 1))
+        self._entries = {u: order[bounds[u]:bounds[u + 1]] for u in range(len(users))}
+        self._prices = None  # Obliga a revaluar con el nuevo layout
+        self._dirty = False
+
+    def revalue(self, rows: Iterable[Dict]) -> bool:
+        """
+        Revalúa todas las carteras contra el snapshot. Devuelve False si los
+        precios no cambiaron desde la última vez (no recalcula nada).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._dirty:
+                self._rebuild()
+
+            n_sym = len(self._symbols)
+            prices = np.zeros(n_sym)
+            risk = np.full(n_sym, _RISK_INDEX["UNKNOWN"], dtype=np.int64)
+            seen = np.zeros(n_sym, dtype=bool)
+            for r in rows:
+                c = self._sym_index.get((r.get("symbol") or "").upper())
+                if c is None or seen[c]:
+                    continue  # Símbolo repetido: gana el primero (mayor market cap), como en /agregar
+                seen[c] = True
+                prices[c] = float(r.get("price") or r.get("current_price") or 0)
+                risk[c] = _RISK_INDEX.get(r.get("risk_level") or estimate_risk(r), _RISK_INDEX["UNKNOWN"])
+
+            if self._prices is not None and np.array_equal(prices, self._prices) and np.array_equal(risk, self._risk):
+                return False
+
+            n_users = len(self._users)
+            entry_value = self._qty * prices[self._cols]
+            self._entry_value = entry_value
+            self._value = np.bincount(self._rows, weights=entry_value, minlength=n_users)
+            self._basis = np.bincount(self._rows, weights=self._cost, minlength=n_users)
+            k = len(RISK_BUCKETS)
+            self._exposure = np.bincount(
+                self._rows * k + risk[self._cols], weights=entry_value, minlength=n_users * k
+            ).reshape(n_users, k)
+            self._prices, self._risk = prices, risk
+            self.revaluations += 1
+            return True
+
+    # --- Consultas ---
+
+    def summary(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Valuación de un usuario (requiere revalue previo). O(1) + sus posiciones."""
+        with self._lock:
+            u = self._user_index.get(chat_id)
+            if u is None or self._prices is None or u >= len(self._value):
+                return None
+            value = float(self._value[u])
+            basis = float(self._basis[u])
+            positions = []
+            for e in self._entries.get(u, ()):
+                c = int(self._cols[e])
+                ev = float(self._entry_value[e])
+                cost = float(self._cost[e])
+                positions.append({
+                    "symbol": self._symbols[c],
+                    "qty": float(self._qty[e]),
+                    "price": float(self._prices[c]),
+                    "value": ev,
+                    "cost": cost,
+                    "pnl": ev - cost,
+                    "pnl_pct": ((ev - cost) / cost * 100) if cost else 0.0,
+                    "allocation_pct": (ev / value * 100) if value else 0.0,
+                    "risk": RISK_BUCKETS[int(self._risk[c])],
+                    "priced": bool(self._prices[c] > 0),
+                })
+            positions.sort(key=lambda p: p["value"], reverse=True)
+            exposure = self._exposure[u]
+            return {
+                "value": value,
+                "cost": basis,
+                "pnl": value - basis,
+                "pnl_pct": ((value - basis) / basis * 100) if basis else 0.0,
+                "exposure_pct": {b: (float(exposure[i]) / value * 100) if value else 0.0
+                                 for i, b in enumerate(RISK_BUCKETS) if exposure[i] > 0},
+                "positions": positions,
+            }
+
+    def pnl_table(self) -> Dict[int, Dict[str, float]]:
+        """P&L de todos los usuarios en una pasada (para avisos masivos)."""
+        with self._lock:
+            if self._prices is None:
+                return {}
+            pnl = self._value - self._basis
+            pct = np.divide(pnl, self._basis, out=np.zeros_like(pnl), where=self._basis > 0) * 100
+            return {cid: {"value": float(self._value[u]), "pnl": float(pnl[u]), "pnl_pct": float(pct[u])}
+                    for cid, u in self._user_index.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "symbols": len(self._symbols),
+                "positions": int(self._rows.size),
+                "revaluations": self.revaluations,
+            }
+
+def fmt_price(v: float) -> str:
+    return f"${v:,.2f}" if v >= 1 else f"${v:.6g}"
+
+def _money(v: float, currency: str, rate: float, signed: bool = False) -> str:
+    """Monto en la moneda del usuario (las posiciones se guardan en USD)."""
+    if currency == "USD":
+        return f"${v:+,.2f}" if signed else f"${v:,.2f}"
+    text = format_money(abs(v) * rate if signed else v * rate, currency)
+    return ("+" if v >= 0 else "-") + text if signed else text
+
+def render_portfolio(summary: Optional[Dict[str, Any]], currency: str = "USD", rate: float = 1.0) -> str:
+    """Texto para /cartera (en la moneda preferida del usuario, reescalada desde USD)."""
+    if not summary or not summary["positions"]:
+        return "💼 Tu cartera está vacía. Agregá posiciones con `/agregar BTC 0.5` (opcional: precio de compra)."
+    sign = "🟢" if summary["pnl"] >= 0 else "🔴"
+    lines = [
+        f"💼 *Tu cartera:* {_money(summary['value'], currency, rate)}"
+        + (f" ({currency_label(currency)})" if currency_label(currency) != currency else ""),
+        f"{sign} P&L: {_money(summary['pnl'], currency, rate, signed=True)} ({summary['pnl_pct']:+.1f}%)",
+        "",
+    ]
+    for p in summary["positions"]:
+        if not p["priced"]:
+            price = "sin precio"
+        else:
+            price = fmt_price(p["price"]) if currency == "USD" else format_money(p["price"] * rate, currency)
+        lines.append(
+            f"• *{p['symbol']}* {p['qty']:g} @ {price} → {_money(p['value'], currency, rate)} "
+            f"({p['allocation_pct']:.1f}%) {p['pnl_pct']:+.1f}%"
+        )
+    if summary["exposure_pct"]:
+        lines += ["", "⚖️ Riesgo: " + " · ".join(f"{k} {v:.0f}%" for k, v in summary["exposure_pct"].items())]
+    return "\n".join(lines)
+
+PORTFOLIO = PortfolioBook()
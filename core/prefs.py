@@ -0,0 +1,238 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+from core.news_index import NEWS_INDEX, USER_STOPWORDS
+from core.fx import CURRENCIES, currency_label
+
+logger = logging.getLogger(__name__)
+
+# Parser de preferencias por reglas: "riesgo bajo", "evitá memecoins", "enfocate en SOL y ETH",
+# "top 10", "mediano plazo", "mostrame los precios en pesos". Si el mensaje es solo de
+# configuración, no pasa por el LLM.
+
+RISK_LEVELS = ("Bajo", "Medio", "Alto")
+MODES = ("DIARIO", "SEMANAL", "MENSUAL")
+TOP_N_MIN, TOP_N_MAX = 3, 50
+
+# Columna de variación según el horizonte que el usuario eligió explícitamente
+# (facts["horizon"]). Sin elección, el modo por defecto (SEMANAL) sigue usando 24h.
+MODE_CHANGE_FIELD = {
+    "DIARIO": "price_change_percentage_24h",
+    "SEMANAL": "price_change_percentage_7d_in_currency",
+    "MENSUAL": "price_change_percentage_30d_in_currency",
+}
+
+# Riesgo bajo = solo las más grandes por market cap (None = sin límite)
+RISK_MAX_RANK = {"Bajo": 30, "Medio": None, "Alto": None}
+
+MEMECOINS = {"DOGE", "SHIB", "PEPE", "BONK", "WIF", "FLOKI", "BRETT", "POPCAT", "MEW", "TRUMP", "MOG", "NEIRO"}
+
+_RISK_ALIASES = {
+    "bajo": "Bajo", "conservador": "Bajo",
+    "medio": "Medio", "moderado": "Medio",
+    "alto": "Alto", "agresivo": "Alto",
+}
+_HORIZON_ALIASES = {"corto": "DIARIO", "mediano": "SEMANAL", "largo": "MENSUAL"}
+
+RISK_RE = re.compile(
+    r"\b(?:riesgo|perfil)\s+(bajo|medio|moderado|alto)\b|\b(conservador|agresivo)\b", re.IGNORECASE
+)
+TOP_RE = re.compile(
+    r"\btop\s*(\d{1,3})\b|\b(?:mostrame|mostr[aá]|listame)\s+(\d{1,3})\s+(?:monedas|criptos|coins|tokens)\b",
+    re.IGNORECASE,
+)
+MODE_RE = re.compile(
+    r"\b(?:modo|plazo|horizonte|vista)\s+(diario|semanal|mensual)\b|\b(corto|mediano|largo)\s+plazo\b",
+    re.IGNORECASE,
+)
+RESET_RE = re.compile(
+    r"\b(?:borr[aá]|resete[aá]|reinici[aá]|olvid[aá])\w*\s+(?:(?:mis|las|tus)\s+)?(?:preferencias|filtros)\b",
+    re.IGNORECASE,
+)
+# Moneda preferida: pide un verbo/sustantivo de contexto ("precios en pesos", "pasalo a euros",
+# "moneda MEP") para que "invertir en bitcoin" no cambie la moneda. Los verbos van en imperativo
+# ("cotizame", "mostrá"): "el BTC cotiza en dólares" describe, no configura
+_CURRENCY_WORDS = (r"pesos(?:\s+(?:al\s+)?(?:mep|oficial(?:es)?|bolsa))?|d[oó]lar(?:es)?(?:\s+(?:mep|bolsa))?"
+                   r"|euros?|btc|bitcoin|sats|ars|usd|eur|mep")
+CURRENCY_RE = re.compile(
+    rf"\b(?:precios?|valores?|montos?|cotiz[aá](?:me|lo|los|mel[oa]s?)|cotizá|mostr[aá](?:me|lo|los|mel[oa]s?)|mostrá"
+    rf"|pas[aá](?:lo|los|me|mel[oa]s?)|pasá|expres[aá]\w*|ver(?:lo|los)?)\s+"
+    rf"(?:(?:los|las|el|la|todo|me|mis)\s+)*(?:en|a)\s+({_CURRENCY_WORDS})\b"
+    rf"|\b(?:moneda|divisa)\s*:?\s*(?:en\s+)?({_CURRENCY_WORDS})\b",
+    re.IGNORECASE,
+)
+
+def _currency_code(raw: str) -> str:
+    raw = raw.lower()
+    if "mep" in raw or "bolsa" in raw:
+        return "MEP"
+    if raw.startswith("peso") or raw == "ars":
+        return "ARS"
+    if raw.startswith("d") or raw == "usd":
+        return "USD"
+    if raw.startswith("eur"):
+        return "EUR"
+    return "BTC"
+
+MEME_RE = re.compile(r"\bmeme\s*coins?\b|\bmemecoins?\b|\bmemes\b", re.IGNORECASE)
+
+# Disparadores de listas: el texto que sigue (hasta el próximo disparador o fin de frase) son tickers
+_AVOID = r"evit[aá](?:r|me)?|sac[aá](?:r|me)?|exclu[ií](?:r|me)?|ignor[aá](?:r|me)?|nada de|no quiero(?: ver)?"
+_FOCUS = (r"enf[oó]ca(?:te|rme|me|r)?\s+en|foco\s+en|concentr[aá](?:te|rme)?\s+en|prefiero"
+          r"|me\s+interesan?|segu[ií](?:me)?")
+TRIGGER_RE = re.compile(rf"\b(?:(?P<avoid>{_AVOID})|(?P<focus>{_FOCUS}))\b", re.IGNORECASE)
+CLAUSE_END_RE = re.compile(r"[.;!?\n]")
+
+# Si aparece una pregunta o un pedido, además de aplicar el patch se sigue al análisis.
+# "que" sin tilde es casi siempre conjunción ("evitá memecoins que no me gustan"): solo
+# cuenta como pregunta al principio de la oración
+REQUEST_RE = re.compile(
+    r"[?¿]|\bqué\b|(?:^|(?<=[.;!\n]))\s*que\b"
+    r"|\b(?:c[oó]mo|cu[aá]l(?:es)?|cu[aá]nt[oa]s?|dame|analiz\w*|recomend\w*|mir[aá]r?|conviene|deber[ií]a)\b",
+    re.IGNORECASE,
+)
+
+def _sentence_at(text: str, pos: int) -> str:
+    """Oración que contiene `pos`, con su signo final (el "?" la marca como pregunta)."""
+    begin = max(text.rfind(c, 0, pos) for c in ".;!?\n") + 1
+    m = CLAUSE_END_RE.search(text, pos)
+    return text[begin:m.end() if m else len(text)]
+
+def _is_request(text: str, pos: int) -> bool:
+    """True si la oración de `pos` es una pregunta o pedido ("no quiero perder plata, ¿qué conviene?")."""
+    return bool(REQUEST_RE.search(_sentence_at(text, pos)))
+
+def _setting(regex: "re.Pattern", text: str) -> Optional["re.Match"]:
+    """Primer match de `regex` en una oración de configuración ("¿qué conviene a largo plazo?" no guarda nada)."""
+    return next((m for m in regex.finditer(text) if not _is_request(text, m.start())), None)
+
+_EXPLICIT_TICKER_RE = re.compile(r"\$([A-Za-z0-9]{2,10})\b|\b([A-Z][A-Z0-9]{1,9})\b")
+
+def _symbols(clause: str) -> Dict[str, List[str]]:
+    """Tickers/nombres de la cláusula validados contra el snapshot (vía NEWS_INDEX)."""
+    explicit = []
+    for dollar, plain in _EXPLICIT_TICKER_RE.findall(clause):
+        sym = (dollar or plain).upper()
+        if sym not in USER_STOPWORDS:
+            explicit.append(sym)
+
+    known = NEWS_INDEX.symbols_in_text(clause)
+    if not known and not NEWS_INDEX.get_stats().get("universe"):
+        # Universo todavía vacío (arranque): aceptamos lo que el usuario escribió explícito
+        return {"valid": list(dict.fromkeys(explicit)), "unknown": []}
+    unknown = [s for s in dict.fromkeys(explicit) if s not in known]
+    return {"valid": known, "unknown": unknown}
+
+def parse_preferences(text: str) -> Dict[str, Any]:
+    """
+    Extrae un patch de preferencias de un mensaje. Devuelve {} si no hay nada.
+    Claves posibles: risk_pref, mode, top_n, currency, focus, avoid, avoid_memecoins, reset, unknown.
+    """
+    if not text:
+        return {}
+    patch: Dict[str, Any] = {}
+
+    if RESET_RE.search(text):
+        patch["reset"] = True
+
+    m = _setting(RISK_RE, text)
+    if m:
+        patch["risk_pref"] = _RISK_ALIASES[(m.group(1) or m.group(2)).lower()]
+
+    m = _setting(MODE_RE, text)
+    if m:
+        patch["mode"] = m.group(1).upper() if m.group(1) else _HORIZON_ALIASES[m.group(2).lower()]
+
+    m = _setting(TOP_RE, text)
+    if m:
+        patch["top_n"] = max(TOP_N_MIN, min(TOP_N_MAX, int(m.group(1) or m.group(2))))
+
+    m = _setting(CURRENCY_RE, text)  # "¿cuánto cotiza en dólares el BTC?" no cambia la moneda guardada
+    if m:
+        patch["currency"] = _currency_code(m.group(1) or m.group(2))
+
+    triggers = list(TRIGGER_RE.finditer(text))
+    unknown: List[str] = []
+    for i, t in enumerate(triggers):
+        if _is_request(text, t.start()):
+            continue  # Foco/evitar solo se guardan desde cláusulas de configuración
+        end = triggers[i + 1].start() if i + 1 < len(triggers) else len(text)
+        clause = text[t.end():end]
+        stop = CLAUSE_END_RE.search(clause)
+        if stop:
+            clause = clause[:stop.start()]
+        kind = "avoid" if t.group("avoid") else "focus"
+
+        if MEME_RE.search(clause):
+            patch["avoid_memecoins"] = kind == "avoid"
+            clause = MEME_RE.sub(" ", clause)
+        found = _symbols(clause)
+        if found["valid"]:
+            patch.setdefault(kind, [])
+            patch[kind] += [s for s in found["valid"] if s not in patch[kind]]
+        unknown += found["unknown"]
+
+    if patch and unknown:
+        patch["unknown"] = list(dict.fromkeys(unknown))
+    return patch
+
+def is_settings_only(text: str, patch: Dict[str, Any]) -> bool:
+    """True si el mensaje solo cambia preferencias (no hace falta análisis ni LLM)."""
+    if not patch or (text or "").startswith("/"):
+        return False
+    return not REQUEST_RE.search(text)
+
+def apply_patch(sess: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica el patch sobre la sesión (facts, last_mode, last_top_n). Devuelve los facts."""
+    facts = sess.get("facts")
+    if not isinstance(facts, dict):
+        facts = sess["facts"] = {}
+
+    if patch.get("reset"):
+        facts.clear()
+        sess["last_mode"] = "SEMANAL"
+        sess["last_top_n"] = 20
+
+    if patch.get("risk_pref") in RISK_LEVELS:
+        facts["risk_pref"] = patch["risk_pref"]
+    if patch.get("mode") in MODES:
+        sess["last_mode"] = patch["mode"]
+        facts["horizon"] = patch["mode"]
+    if "top_n" in patch:
+        sess["last_top_n"] = int(patch["top_n"])
+    if "avoid_memecoins" in patch:
+        facts["avoid_memecoins"] = bool(patch["avoid_memecoins"])
+    if patch.get("currency") in CURRENCIES:
+        facts["currency"] = patch["currency"]
+
+    # Una moneda no puede estar en foco y evitada a la vez: gana lo último que dijo
+    for key, other in (("focus", "avoid"), ("avoid", "focus")):
+        added = patch.get(key) or []
+        if not added:
+            continue
+        facts[key] = list(dict.fromkeys((facts.get(key) or []) + added))
+        facts[other] = [s for s in (facts.get(other) or []) if s not in added]
+    return facts
+
+def render_confirmation(patch: Dict[str, Any], sess: Dict[str, Any]) -> str:
+    """Respuesta templada para cambios de configuración (sin LLM)."""
+    facts = sess.get("facts") or {}
+    lines = ["🧹 Borré tus preferencias." if patch.get("reset") else "⚙️ *Listo, actualicé tus preferencias:*"]
+    lines.append(f"• Riesgo: *{facts.get('risk_pref', 'Medio')}*")
+    lines.append(f"• Horizonte: *{sess.get('last_mode', 'SEMANAL')}* · Top {sess.get('last_top_n', 20)}")
+    if facts.get("currency"):
+        lines.append(f"• Moneda: *{currency_label(facts['currency'])}*")
+    if facts.get("focus"):
+        lines.append(f"• Foco: {', '.join(facts['focus'])}")
+    avoid = list(facts.get("avoid") or [])
+    if facts.get("avoid_memecoins"):
+        avoid.append("memecoins")
+    if avoid:
+        lines.append(f"• Evitar: {', '.join(avoid)}")
+    if patch.get("unknown"):
+        lines.append(f"⚠️ No encontré en el mercado: {', '.join(patch['unknown'])}")
+    return "\n".join(lines)
+
+def max_rank_for(risk_pref: Optional[str]) -> Optional[int]:
+    return RISK_MAX_RANK.get(risk_pref or "Medio")
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import random
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+
+from core.shared_snapshot import SharedSnapshot, SHARED_NAME
+
+logger = logging.getLogger(__name__)
+
+# Stream público de Binance: mini-tickers de todos los pares, cada ~1s
+STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://stream.binance.com:9443/ws/!miniTicker@arr")
+STREAM_ENABLED = os.getenv("PRICE_STREAM", "0") == "1"
+
+MAX_AGE = 120          # Un precio sin actualizar en 2 min ya no se usa
+GAP_RESYNC = 5         # Si perdimos más de 5s de stream, re-sincronizamos por REST
+RECV_TIMEOUT = 30
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60
+QUOTE = "USDT"
+LIVE_PUBLISH_SECONDS = float(os.getenv("PRICE_LIVE_PUBLISH_SECONDS", "1"))
+LIVE_SIZE_MB = 2
+
+# Modo multi-proceso: un solo stream (en el padre) y los workers leen el libro desde un
+# segmento compartido propio que se publica cada ~1s (independiente del snapshot de 30s)
+LIVE_SNAPSHOT = SharedSnapshot(label="live")
+
+class PriceBook:
+    """
+    Libro de precios en memoria (último valor por símbolo).
+    Un solo escritor (el hilo del stream) y lectores sin lock: cada entrada
+    se reemplaza con una asignación atómica de tupla.
+    """
+
+    def __init__(self):
+        self._prices: Dict[str, Tuple[float, float]] = {}  # sym -> (precio, ts del evento)
+        self.connected = False
+        self.last_event_at = 0.0
+        self.updates = 0
+        self.gaps = 0
+
+    def update(self, symbol: str, price: float, ts: Optional[float] = None) -> None:
+        if price > 0:
+            self._prices[symbol] = (price, ts or time.time())
+            self.updates += 1
+
+    def get(self, symbol: str, max_age: float = MAX_AGE) -> Optional[float]:
+        """Precio en vivo, o None si no hay dato o está viejo."""
+        shared = LIVE_SNAPSHOT.read("prices")  # Worker: el libro lo mantiene el stream del padre
+        prices = shared if shared is not None else self._prices
+        item = prices.get((symbol or "").upper())
+        if not item:
+            return None
+        price, ts = item
+        return price if time.time() - ts <= max_age else None
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def export(self) -> Dict[str, Tuple[float, float]]:
+        """Copia del libro para publicar en el segmento compartido."""
+        return dict(self._prices)
+
+    def get_stats(self) -> Dict:
+        return {
+            "connected": self.connected,
+            "symbols": len(self._prices),
+            "updates": self.updates,
+            "gaps": self.gaps,
+            "last_event_age_s": round(time.time() - self.last_event_at, 1) if self.last_event_at else None,
+        }
+
+PRICE_BOOK = PriceBook()
+
+def _apply_frame(book: PriceBook, raw: str) -> Optional[float]:
+    """Aplica un frame de miniTicker (lista o evento suelto). Devuelve el ts del evento."""
+    data = json.loads(raw)
+    events = data if isinstance(data, list) else [data]
+    last_ts = None
+    for ev in events:
+        sym = ev.get("s") or ""
+        if not sym.endswith(QUOTE) or "c" not in ev:
+            continue
+        ts = float(ev.get("E") or 0) / 1000.0 or time.time()
+        book.update(sym[:-len(QUOTE)], float(ev["c"]), ts)
+        last_ts = ts if last_ts is None else max(last_ts, ts)
+    return last_ts
+
+def _resync_from_rest(book: PriceBook) -> None:
+    """Rellena el hueco del stream con un snapshot REST de Binance."""
+    try:
+        from core.multisource import binance_prices_usdt, _data_age
+        prices = binance_prices_usdt()
+        age = _data_age("binance")
+        if not prices or age is None:
+            return
+        # El REST puede venir del caché (hasta TTL_BINANCE de antigüedad o más si es el
+        # fallback vencido): se sella con el momento en que se bajó, no con "ahora"
+        ts = time.time() - age
+        for sym, price in prices.items():
+            if sym.endswith(QUOTE):
+                base = sym[:-len(QUOTE)]
+                current = book._prices.get(base)
+                if current is None or current[1] < ts:  # No pisar un tick del stream más nuevo
+                    book.update(base, price, ts)
+        logger.info(f"🔁 PriceBook re-sincronizado por REST ({len(book)} símbolos).")
+    except Exception as e:
+        logger.error(f"❌ Falló la re-sincronización REST: {e}")
+
+class PriceStream:
+    """Cliente WebSocket con reconexión (backoff exponencial) y manejo de huecos."""
+
+    def __init__(self, book: PriceBook = PRICE_BOOK, url: str = STREAM_URL):
+        self.book = book
+        self.url = url
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "PriceStream":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=RECV_TIMEOUT + 1)
+
+    def _run(self) -> None:
+        import websocket  # websocket-client: solo se carga si el modo stream está activo
+
+        backoff = BACKOFF_MIN
+        while not self._stop.is_set():
+            ws = None
+            try:
+                ws = websocket.create_connection(self.url, timeout=RECV_TIMEOUT)
+                self.book.connected = True
+                backoff = BACKOFF_MIN
+                logger.info(f"📡 Stream de precios conectado: {self.url}")
+
+                # Lo que pasó mientras estuvimos desconectados no llega por el stream
+                prev_ts = self.book.last_event_at or None
+                if prev_ts and time.time() - prev_ts > GAP_RESYNC:
+                    self.book.gaps += 1
+                    _resync_from_rest(self.book)
+                    prev_ts = None  # El REST ya cubrió el hueco: el primer frame no es otro hueco
+
+                while not self._stop.is_set():
+                    raw = ws.recv()
+                    if not raw:
+                        break
+                    ts = _apply_frame(self.book, raw)
+                    if ts is None:
+                        continue
+                    if prev_ts and ts - prev_ts > GAP_RESYNC:
+                        # El servidor se salteó eventos: hueco dentro de la misma conexión
+                        self.book.gaps += 1
+                        _resync_from_rest(self.book)
+                    prev_ts = max(prev_ts or 0.0, ts)
+                    self.book.last_event_at = max(self.book.last_event_at, ts)
+            except Exception as e:
+                logger.warning(f"⚠️ Stream de precios caído: {e}")
+            finally:
+                self.book.connected = False
+                if ws is not None:
+                    try: ws.close()
+                    except Exception: pass
+
+            if not self._stop.is_set():
+                wait = backoff + random.uniform(0, backoff / 2)
+                logger.info(f"🔌 Reconectando stream en {wait:.1f}s...")
+                self._stop.wait(wait)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+
+def start_price_stream() -> Optional[PriceStream]:
+    """Arranca el modo streaming si PRICE_STREAM=1 (opcional)."""
+    if not STREAM_ENABLED:
+        return None
+    return PriceStream().start()
+
+def create_live_segment(name: str = SHARED_NAME + "_live") -> bool:
+    """Crea el segmento del libro en vivo (antes del fork de los workers). Solo con PRICE_STREAM=1."""
+    if not STREAM_ENABLED:
+        return False
+    LIVE_SNAPSHOT.create(name, size_mb=LIVE_SIZE_MB)
+    return True
+
+def start_live_publisher() -> Optional[PriceStream]:
+    """Padre multi-proceso: el único stream del despliegue + su publicación para los workers."""
+    stream = start_price_stream()
+    if stream is not None and LIVE_SNAPSHOT.role == "writer":
+        LIVE_SNAPSHOT.start_publisher(lambda: {"prices": PRICE_BOOK.export()},
+                                      interval=LIVE_PUBLISH_SECONDS, quiet=True)
+    return stream
@@ -0,0 +1,210 @@
+import copy
+import threading
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.market import is_stable, is_gold
+from core.learning import get_learning_boost, load_learning, revision as learning_revision
+from core.prefs import max_rank_for, MEMECOINS
+from core.shared_snapshot import SHARED_SNAPSHOT
+
+logger = logging.getLogger(__name__)
+
+# Ranking multi-factor: cada factor es una columna normalizada (z-score recortado)
+# que se calcula UNA vez por snapshot. El score de un usuario es W·X con su vector
+# de pesos; para muchos usuarios es un solo producto matricial + argpartition.
+
+Z_CLIP = 3.0
+FOCUS_BOOST = 1.5        # En unidades de desvío estándar
+BATCH_USERS = 256        # Usuarios por producto matricial (acota la memoria de la matriz U x N)
+
+def _num(rows: Sequence[Dict], key: str) -> np.ndarray:
+    return np.array([float(r.get(key) or 0) for r in rows], dtype=float)
+
+Column = Callable[[str], np.ndarray]
+
+def _column_reader(rows: Sequence[Dict], columns: Optional[Dict[str, np.ndarray]] = None) -> Column:
+    """`col(key)` -> columna float. Usa las vistas del segmento compartido si las hay (sin recorrer dicts)."""
+    def col(key: str) -> np.ndarray:
+        view = (columns or {}).get(key)
+        if view is None:
+            return _num(rows, key)
+        return np.nan_to_num(view.astype(float), nan=0.0)  # Mismo criterio que _num: ausente = 0
+    return col
+
+# Cada factor recibe las filas y el lector de columnas numéricas
+FACTORS: Dict[str, Callable[[Sequence[Dict], Column], np.ndarray]] = {
+    "mom_24h": lambda rows, col: col("price_change_percentage_24h"),
+    "mom_7d": lambda rows, col: col("price_change_percentage_7d_in_currency"),
+    "mom_30d": lambda rows, col: col("price_change_percentage_30d_in_currency"),
+    # Rotación: volumen relativo al tamaño (liquidez real de la moneda)
+    "volume": lambda rows, col: np.log1p(col("total_volume")) - np.log1p(col("market_cap")),
+    # Tamaño: más market cap = menos riesgo
+    "size": lambda rows, col: np.log1p(col("market_cap")),
+    "popularity": lambda rows, col: np.array([get_learning_boost((r.get("symbol") or "")) for r in rows], dtype=float),
+}
+
+# Pesos por perfil de riesgo (el orden de las claves no importa: se alinean por nombre)
+WEIGHT_PROFILES: Dict[str, Dict[str, float]] = {
+    "Bajo": {"mom_24h": 0.10, "mom_7d": 0.15, "mom_30d": 0.15, "volume": 0.20, "size": 0.35, "popularity": 0.05},
+    "Medio": {"mom_24h": 0.25, "mom_7d": 0.20, "mom_30d": 0.10, "volume": 0.15, "size": 0.15, "popularity": 0.15},
+    "Alto": {"mom_24h": 0.40, "mom_7d": 0.25, "mom_30d": 0.05, "volume": 0.15, "size": -0.10, "popularity": 0.15},
+}
+# El horizonte elegido por el usuario potencia la columna de momentum que le corresponde
+# (sin elección explícita no se potencia ninguna)
+MODE_EMPHASIS = {"DIARIO": "mom_24h", "SEMANAL": "mom_7d", "MENSUAL": "mom_30d"}
+MODE_MULTIPLIER = 1.5
+
+def register_factor(name: str, fn: Callable[[Sequence[Dict], Column], np.ndarray],
+                    weights: Optional[Dict[str, float]] = None) -> None:
+    """
+    Agrega un factor nuevo `fn(rows, col)` (y opcionalmente su peso por perfil); `col(key)`
+    devuelve un campo numérico como array float. Aplica desde el próximo snapshot.
+    """
+    FACTORS[name] = fn
+    for profile, w in (weights or {}).items():
+        WEIGHT_PROFILES.setdefault(profile, {})[name] = w
+    _SNAPSHOT_CACHE.clear()
+
+def _zscore(col: np.ndarray) -> np.ndarray:
+    col = np.nan_to_num(col, nan=0.0, posinf=0.0, neginf=0.0)
+    std = col.std()
+    if std == 0:
+        return np.zeros_like(col)
+    return np.clip((col - col.mean()) / std, -Z_CLIP, Z_CLIP)
+
+def user_weights(prefs: Dict, factor_names: Sequence[str]) -> np.ndarray:
+    """Vector de pesos del usuario alineado a las columnas del snapshot."""
+    profile = WEIGHT_PROFILES.get(prefs.get("risk_pref") or "Medio", WEIGHT_PROFILES["Medio"])
+    w = np.array([profile.get(f, 0.0) for f in factor_names], dtype=float)
+    emphasis = MODE_EMPHASIS.get(prefs.get("horizon") or "")
+    if emphasis in factor_names:
+        w[list(factor_names).index(emphasis)] *= MODE_MULTIPLIER
+    norm = np.abs(w).sum()
+    return w / norm if norm else w
+
+class FactorSnapshot:
+    """Matriz de factores (N monedas x F factores) + máscaras globales de un snapshot."""
+
+    def __init__(self, rows: Sequence[Dict], columns: Optional[Dict[str, np.ndarray]] = None):
+        self.rows = list(rows)
+        self.factor_names = list(FACTORS)
+        self.symbols = [(r.get("symbol") or "").upper() for r in self.rows]
+        self.symbol_index: Dict[str, int] = {}
+        for i, s in enumerate(self.symbols):
+            self.symbol_index.setdefault(s, i)  # Símbolo repetido: gana el de mayor market cap
+        n = len(self.rows)
+        self.X = np.zeros((n, len(self.factor_names)))
+        col = _column_reader(self.rows, columns)
+        for j, name in enumerate(self.factor_names):
+            try:
+                self.X[:, j] = _zscore(FACTORS[name](self.rows, col))
+            except Exception as e:
+                logger.error(f"❌ Factor '{name}' falló: {e}")
+        self.eligible = np.array([not (is_stable(r) or is_gold(r)) for r in self.rows], dtype=bool)
+        self.rank = np.array([r.get("market_cap_rank") or (n + i + 1) for i, r in enumerate(self.rows)], dtype=float)
+        self._meme_idx = np.array([self.symbol_index[s] for s in MEMECOINS if s in self.symbol_index], dtype=np.int64)
+
+    def with_rows(self, rows: Sequence[Dict]) -> "FactorSnapshot":
+        """Misma matriz sobre filas equivalentes (mismo snapshot; cambian precio en vivo y verificación)."""
+        clone = copy.copy(self)
+        clone.rows = list(rows)
+        return clone
+
+    def _indices(self, symbols: Iterable[str]) -> np.ndarray:
+        return np.array([self.symbol_index[s] for s in symbols if s in self.symbol_index], dtype=np.int64)
+
+    def scores(self, prefs_list: Sequence[Dict]) -> np.ndarray:
+        """Scores U x N para una tanda de usuarios (un solo W @ X.T)."""
+        W = np.vstack([user_weights(p, self.factor_names) for p in prefs_list]) if prefs_list else \
+            np.zeros((0, len(self.factor_names)))
+        S = W @ self.X.T
+        S[:, ~self.eligible] = -np.inf
+        for u, p in enumerate(prefs_list):
+            focus = self._indices(p.get("focus") or [])
+            if focus.size:
+                S[u, focus] += FOCUS_BOOST
+            avoid = self._indices(p.get("avoid") or [])
+            if avoid.size:
+                S[u, avoid] = -np.inf
+            if p.get("avoid_memecoins") and self._meme_idx.size:
+                S[u, self._meme_idx] = -np.inf
+            max_rank = max_rank_for(p.get("risk_pref"))
+            if max_rank:
+                S[u, self.rank > max_rank] = -np.inf
+        return S
+
+    def top_k(self, prefs_list: Sequence[Dict], k: int) -> List[np.ndarray]:
+        """Top-k por usuario (índices de fila, de mayor a menor score), en tandas de BATCH_USERS."""
+        out: List[np.ndarray] = []
+        for start in range(0, len(prefs_list), BATCH_USERS):
+            out += _top_k(self.scores(prefs_list[start:start + BATCH_USERS]), k)
+        return out
+
+    def ranked_rows(self, prefs: Dict, k: int) -> List[Dict]:
+        """Top-k de un usuario como filas (con engine_score) para el engine."""
+        S = self.scores([prefs])
+        out = []
+        for i in _top_k(S, k)[0]:
+            row = dict(self.rows[i])
+            row["engine_score"] = round(float(S[0, i]), 4)
+            out.append(row)
+        return out
+
+def _top_k(S: np.ndarray, k: int) -> List[np.ndarray]:
+    """argpartition O(N) por fila + orden de solo k elementos; descarta los excluidos (-inf)."""
+    users, n = S.shape
+    if n == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in range(users)]
+    k = max(1, min(k, n))
+    part = np.argpartition(-S, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (users, 1))
+    out = []
+    for u in range(users):
+        idx = part[u]
+        idx = idx[np.isfinite(S[u, idx])]
+        out.append(idx[np.argsort(-S[u, idx], kind="stable")])
+    return out
+
+_SNAPSHOT_CACHE: Dict[object, FactorSnapshot] = {}
+_SNAPSHOT_LOCK = threading.Lock()
+
+# Todo lo que leen los factores y las máscaras: si cambia cualquiera, el snapshot se recalcula
+_KEY_FIELDS = ("id", "symbol", "market_cap_rank", "price", "current_price", "market_cap", "total_volume",
+               "price_change_percentage_24h", "price_change_percentage_7d_in_currency",
+               "price_change_percentage_30d_in_currency")
+
+def _snapshot_key(rows: Sequence[Dict]) -> int:
+    interest = load_learning()  # El factor popularidad depende de los contadores de interés
+    return hash(tuple(
+        tuple(r.get(f) for f in _KEY_FIELDS) + (interest.get((r.get("symbol") or "").upper(), 0),)
+        for r in rows
+    ))
+
+def get_factor_snapshot(rows: Sequence[Dict],
+                        columns: Optional[Tuple[int, Dict[str, np.ndarray]]] = None) -> FactorSnapshot:
+    """
+    Factores normalizados del snapshot; se reutilizan mientras el mercado no cambie.
+    `columns` = (versión, vistas) del segmento compartido (ver sources.market_columns): la
+    clave sale de la versión publicada y los factores se leen sin recorrer las filas.
+    """
+    version, views = columns or (0, {})
+    key = ("shared", version, len(rows), learning_revision()) if views else _snapshot_key(rows)
+    with _SNAPSHOT_LOCK:
+        snap = _SNAPSHOT_CACHE.get(key)
+    if snap is not None:
+        return snap.with_rows(rows) if views else snap
+    snap = FactorSnapshot(rows, views)
+    if views and not SHARED_SNAPSHOT.intact(version):
+        # El refrescador reescribió el slot mientras leíamos: se recalcula desde las filas
+        return FactorSnapshot(rows)
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT_CACHE.clear()  # Solo interesa el snapshot vigente
+        _SNAPSHOT_CACHE[key] = snap
+    return snap
+
+def rank_for_users(rows: Sequence[Dict], prefs_list: Sequence[Dict], k: int) -> List[List[Dict]]:
+    """Top-k de muchos usuarios en una sola pasada vectorizada (ej: /top para todos los suscriptos)."""
+    snap = get_factor_snapshot(rows)
+    return [[snap.rows[i] for i in idx] for idx in snap.top_k(prefs_list, k)]
@@ -0,0 +1,59 @@
+import time
+import threading
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Limitador de tasa clásico (token bucket) thread-safe.
+    Se usa para respetar los límites globales de APIs externas (Telegram, CoinGecko).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)                      # tokens por segundo
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        self._last = now
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Intenta consumir tokens. Devuelve 0 si pudo, o los segundos a esperar."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta obtener los tokens (o hasta el timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Congela el bucket (ej: la API respondió 429 con retry_after)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + float(seconds))
+            self._tokens = 0.0
+        logger.warning(f"⏸️ Rate limiter pausado {seconds:.1f}s")
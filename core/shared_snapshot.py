@@ -0,0 +1,435 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import threading
+import weakref
+import logging
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Snapshot compartido entre procesos: un proceso refrescador (el padre del webhook) baja
+# mercado, exchanges y noticias y los publica en un segmento de shared memory; los
+# workers lo mapean (solo lectura) y leen sin pegarle a ninguna API. Un contador de versión
+# estilo seqlock (impar = escribiendo) evita lecturas a medio escribir sin locks entre procesos.
+# El payload tiene dos slots que se alternan: las vistas zero-copy de una versión siguen
+# válidas mientras no se publiquen dos versiones más (ver `intact`).
+
+SHARED_NAME = os.getenv("SHARED_SNAPSHOT_NAME", f"ortelli_snapshot_{os.getpid()}")
+SHARED_SIZE_MB = int(os.getenv("SHARED_SNAPSHOT_MB", "32"))
+REFRESH_SECONDS = float(os.getenv("SHARED_REFRESH_SECONDS", "30"))
+FIRST_PUBLISH_WAIT = float(os.getenv("SHARED_WAIT_SECONDS", "20"))  # Espera del worker al primer snapshot
+READ_RETRIES = 50
+
+MAGIC = b"ORTSNAP2"
+# magic, seq, largo del directorio, largo del payload, timestamp de publicación, slot
+_HEADER = struct.Struct("<8sQQQdQ")
+HEADER_SIZE = 64
+_SEQ_OFFSET = 8
+
+# --- Codificación columnar ---
+
+def _column_kind(values: List[Any]) -> str:
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "i8"
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "f8"
+    return "json"
+
+def encode_rows(rows: List[Dict]) -> Dict[str, Any]:
+    """Filas -> columnas: numéricas como arrays contiguos, el resto como listas JSON."""
+    keys: Dict[str, None] = {}
+    for r in rows:
+        keys.update(dict.fromkeys(r))
+    cols = {}
+    for k in keys:
+        values = [r.get(k) for r in rows]
+        kind = _column_kind(values)
+        if kind == "i8":
+            nulls = np.array([v is None for v in values], dtype=np.uint8)
+            data = np.array([0 if v is None else v for v in values], dtype=np.int64)
+            cols[k] = (kind, data, nulls if nulls.any() else None)
+        elif kind == "f8":
+            cols[k] = (kind, np.array([np.nan if v is None else v for v in values], dtype=np.float64), None)
+        else:
+            cols[k] = (kind, values, None)
+    return {"n": len(rows), "columns": cols}
+
+def _decode_rows(n: int, columns: Dict[str, Any]) -> List[Dict]:
+    lists = {}
+    for k, (kind, data, nulls) in columns.items():
+        if kind == "i8":
+            vals = data.tolist()
+            if nulls is not None:
+                vals = [None if z else v for v, z in zip(vals, nulls.tolist())]
+        elif kind == "f8":
+            vals = [None if v != v else v for v in data.tolist()]  # NaN -> None
+        else:
+            vals = data
+        lists[k] = vals
+    keys = list(lists)
+    return [dict(zip(keys, vals)) for vals in zip(*(lists[k] for k in keys))] if keys else [{} for _ in range(n)]
+
+class _Writer:
+    """Arma el payload (directorio JSON + blobs alineados) fuera de la sección crítica."""
+
+    def __init__(self):
+        self.blobs: List[bytes] = []
+        self.size = 0
+
+    def add(self, raw: bytes) -> Dict[str, int]:
+        pad = (-self.size) % 8
+        if pad:
+            self.blobs.append(b"\0" * pad)
+            self.size += pad
+        ref = {"off": self.size, "len": len(raw)}
+        self.blobs.append(raw)
+        self.size += len(raw)
+        return ref
+
+def build_payload(sections: Dict[str, Any]) -> Tuple[bytes, int]:
+    """Secciones -> (bytes, largo del directorio). Listas de filas (dicts) van columnar; lo demás, JSON."""
+    w = _Writer()
+    directory = {}
+    for name, obj in sections.items():
+        if isinstance(obj, list) and obj and all(isinstance(r, dict) for r in obj):
+            enc = encode_rows(obj)
+            cols = {}
+            for k, (kind, data, nulls) in enc["columns"].items():
+                if kind == "json":
+                    cols[k] = {"t": kind, **w.add(json.dumps(data, ensure_ascii=False).encode("utf-8"))}
+                else:
+                    cols[k] = {"t": kind, **w.add(data.tobytes())}
+                    if nulls is not None:
+                        cols[k]["nulls"] = w.add(nulls.tobytes())
+            directory[name] = {"kind": "rows", "n": enc["n"], "columns": cols}
+        else:
+            directory[name] = {"kind": "json", **w.add(json.dumps(obj, ensure_ascii=False).encode("utf-8"))}
+    body = b"".join(w.blobs)
+    head = json.dumps(directory).encode("utf-8")
+    pad = (-len(head)) % 8
+    return head + b" " * pad + body, len(head) + pad
+
+def _map_readonly(name: str) -> Optional[mmap.mmap]:
+    """Mapeo PROT_READ del segmento (POSIX). None si la plataforma no lo permite."""
+    try:
+        import _posixshmem
+    except ImportError:
+        return None
+    fd = _posixshmem.shm_open("/" + name.lstrip("/"), os.O_RDONLY, mode=0o600)
+    try:
+        return mmap.mmap(fd, os.fstat(fd).st_size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+_INSTANCES: "weakref.WeakSet[SharedSnapshot]" = weakref.WeakSet()
+
+class SharedSnapshot:
+    """
+    Segmento de shared memory con un escritor (refrescador) y N lectores (workers).
+    Los workers heredan el segmento por fork (y lo re-mapean de solo lectura) o se
+    conectan por nombre con `attach`.
+    """
+
+    def __init__(self, label: str = "snapshot"):
+        self.label = label
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._ro: Optional[mmap.mmap] = None
+        self._buf: Optional[memoryview] = None   # Escritor: buf del segmento; lector: vista read-only
+        self.name: Optional[str] = None
+        self.role: Optional[str] = None          # "writer" | "reader" | None (desactivado)
+        self._lock = threading.Lock()
+        self._seen_seq = 0
+        self._decoded: Dict[str, Any] = {}
+        self._directory: Dict[str, Any] = {}
+        self._base = 0                           # Offset de los blobs de la versión vista
+        self._waited = False
+        self._last_digest: Optional[bytes] = None
+        self.publishes = 0
+        self.reads = 0
+        self.decodes = 0
+        self.retries = 0
+        _INSTANCES.add(self)
+
+    # --- Ciclo de vida ---
+
+    def create(self, name: str = SHARED_NAME, size_mb: float = SHARED_SIZE_MB) -> "SharedSnapshot":
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=int(size_mb * 1024 * 1024))
+        self._buf = self._shm.buf
+        self.name = name
+        _HEADER.pack_into(self._buf, 0, MAGIC, 0, 0, 0, 0.0, 0)
+        self.role = "writer"
+        logger.info(f"🧠 Segmento compartido '{name}' creado ({size_mb} MB).")
+        return self
+
+    def attach(self, name: str = SHARED_NAME) -> "SharedSnapshot":
+        self.name = name
+        self._ro = _map_readonly(name)
+        if self._ro is None:
+            self._shm = shared_memory.SharedMemory(name=name, create=False)
+        self._use_readonly_view()
+        self.role = "reader"
+        return self
+
+    def _use_readonly_view(self) -> None:
+        self._buf = memoryview(self._ro) if self._ro is not None else self._shm.buf.toreadonly()
+
+    def close(self) -> None:
+        if self.role is None:
+            return
+        shm, ro, role = self._shm, self._ro, self.role
+        self._shm, self._ro, self._buf, self.role = None, None, None, None
+        self._decoded, self._directory = {}, {}
+        try:
+            if ro is not None:
+                ro.close()
+            if shm is not None:
+                shm.close()
+                if role == "writer":
+                    shm.unlink()
+        except BufferError:
+            pass  # Quedan vistas numpy vivas: el mapeo se libera con el proceso
+
+    def _after_fork(self) -> None:
+        # El hijo hereda el mapeo del padre (MAP_SHARED, escribible): lo cambia por uno
+        # de solo lectura del mismo segmento y pasa a ser lector
+        self._lock = threading.Lock()
+        if self.role != "writer":
+            return
+        self.role = "reader"
+        self._last_digest = None
+        try:
+            self._ro = _map_readonly(self.name)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo re-mapear '{self.name}' de solo lectura: {e}")
+            self._ro = None
+        if self._ro is not None:
+            inherited, self._shm = self._shm, None
+            self._buf = None
+            try:
+                inherited.close()
+            except BufferError:
+                pass
+        self._use_readonly_view()
+
+    @property
+    def is_reader(self) -> bool:
+        return self.role == "reader" and self._buf is not None
+
+    def _slot_bounds(self, slot: int) -> Tuple[int, int]:
+        """(offset, capacidad) de un slot: el payload se reparte en dos mitades alineadas a 8."""
+        size = ((len(self._buf) - HEADER_SIZE) // 2) & ~7
+        return HEADER_SIZE + slot * size, size
+
+    # --- Escritura ---
+
+    def _seq(self) -> int:
+        return struct.unpack_from("<Q", self._buf, _SEQ_OFFSET)[0]
+
+    def publish(self, sections: Dict[str, Any]) -> bool:
+        """Publica todas las secciones juntas. Si el contenido no cambió, no escribe."""
+        if self.role != "writer":
+            return False
+        payload, dir_len = build_payload(sections)
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        if digest == self._last_digest:
+            return False
+
+        buf = self._buf
+        _, seq, _, _, _, slot = _HEADER.unpack_from(buf, 0)
+        slot = 1 - slot if seq else 0              # Se escribe el slot que NO leen los workers
+        offset, capacity = self._slot_bounds(slot)
+        if len(payload) > capacity:
+            logger.error(f"❌ Snapshot de {len(payload) / 1e6:.1f} MB no entra en {capacity / 1e6:.1f} MB (SHARED_SNAPSHOT_MB).")
+            metrics.incr("shared_snapshot_overflow", segment=self.label)
+            return False
+
+        struct.pack_into("<Q", buf, _SEQ_OFFSET, seq + 1)            # Impar: escribiendo
+        buf[offset:offset + len(payload)] = payload
+        _HEADER.pack_into(buf, 0, MAGIC, seq + 1, dir_len, len(payload), time.time(), slot)
+        struct.pack_into("<Q", buf, _SEQ_OFFSET, seq + 2)            # Par: consistente
+        self._last_digest = digest
+        self.publishes += 1
+        metrics.set_gauge("shared_snapshot_bytes", len(payload), segment=self.label)
+        return True
+
+    # --- Lectura ---
+
+    def _wait_first_publish(self) -> None:
+        if self._waited:
+            return
+        deadline = time.time() + FIRST_PUBLISH_WAIT
+        while self._seq() == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        self._waited = True
+
+    def _refresh(self) -> bool:
+        """Se posiciona en la última versión consistente (solo copia el directorio)."""
+        self._wait_first_publish()
+        for _ in range(READ_RETRIES):
+            s1 = self._seq()
+            if s1 == 0:
+                return False
+            if s1 & 1:
+                self.retries += 1
+                time.sleep(0.001)
+                continue
+            if s1 == self._seen_seq:
+                return True
+            _, _, dir_len, _, _, slot = _HEADER.unpack_from(self._buf, 0)
+            offset, _ = self._slot_bounds(slot)
+            head = bytes(self._buf[offset:offset + dir_len])
+            if self._seq() != s1:
+                self.retries += 1
+                continue
+            self._directory = json.loads(head)
+            self._base = offset + dir_len
+            self._decoded = {}
+            self._seen_seq = s1
+            return True
+        metrics.incr("shared_snapshot_read_failures", segment=self.label)
+        return False
+
+    def intact(self, version: int) -> bool:
+        """True si el slot de `version` no se reescribió (a lo sumo hubo una publicación después)."""
+        return self._buf is not None and self._seq() <= version + 2
+
+    def _blob(self, ref: Dict[str, int]) -> memoryview:
+        start = self._base + ref["off"]
+        return self._buf[start:start + ref["len"]]
+
+    def _column_views(self, spec: Dict[str, Any]) -> Dict[str, Tuple[str, Any, Any]]:
+        out = {}
+        for k, c in spec["columns"].items():
+            if c["t"] == "json":
+                out[k] = (c["t"], None, None)
+            else:
+                nulls = c.get("nulls")
+                out[k] = (c["t"], np.frombuffer(self._blob(c), dtype=np.dtype(c["t"])),
+                          np.frombuffer(self._blob(nulls), dtype=np.uint8) if nulls else None)
+        return out
+
+    def _decode(self, name: str) -> Any:
+        spec = self._directory.get(name)
+        if spec is None:
+            return None
+        if spec["kind"] == "json":
+            return json.loads(bytes(self._blob(spec)))
+        columns = self._column_views(spec)
+        for k, c in spec["columns"].items():
+            if c["t"] == "json":
+                columns[k] = ("json", json.loads(bytes(self._blob(c))), None)
+        return _decode_rows(spec["n"], columns)
+
+    def read(self, name: str) -> Optional[Any]:
+        """
+        Sección publicada como objetos Python (decodificada una sola vez por versión y
+        directo desde el segmento, sin copiar el payload entero), o None si este proceso
+        no es lector o todavía no hay nada: el llamador usa su propio fetch.
+        """
+        if not self.is_reader:
+            return None
+        with self._lock:
+            for _ in range(READ_RETRIES):
+                if not self._refresh():
+                    return None
+                if name in self._decoded:
+                    self.reads += 1
+                    return self._decoded[name]
+                value = self._decode(name)
+                if self.intact(self._seen_seq):
+                    self._decoded[name] = value
+                    self.decodes += 1
+                    self.reads += 1
+                    return value
+                self.retries += 1  # El escritor alcanzó nuestro slot mientras decodificábamos
+            return None
+
+    def columns(self, name: str, rows: Optional[Sequence[Dict]] = None) -> Tuple[int, Dict[str, np.ndarray]]:
+        """
+        (versión, columnas numéricas) de una sección de filas como vistas read-only sobre
+        el segmento (zero-copy). Las enteras con nulos se omiten (el llamador usa las filas).
+        Con `rows`, solo si esas filas son un prefijo de lo que devolvió `read` en esta misma
+        versión (y las vistas se recortan a su largo); si no, (0, {}).
+        Valen mientras `intact(versión)`: quien derive algo de ellas lo verifica al terminar.
+        """
+        if not self.is_reader:
+            return 0, {}
+        with self._lock:
+            if not self._refresh():
+                return 0, {}
+            spec = self._directory.get(name) or {}
+            if spec.get("kind") != "rows":
+                return 0, {}
+            n = spec["n"]
+            if rows is not None:
+                decoded = self._decoded.get(name)
+                n = len(rows)
+                if not decoded or not n or n > len(decoded) or rows[0] is not decoded[0] \
+                        or rows[n - 1] is not decoded[n - 1]:
+                    return 0, {}
+            out = {k: data[:n] for k, (kind, data, nulls) in self._column_views(spec).items()
+                   if kind != "json" and nulls is None}
+            return self._seen_seq, out
+
+    @property
+    def version(self) -> int:
+        return self._seq() if self._buf is not None else 0
+
+    @property
+    def seen_version(self) -> int:
+        """Versión en la que está posicionado este lector (la de lo último que devolvió `read`)."""
+        return self._seen_seq
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self._buf is None:
+            return {"role": None}
+        _, seq, _, length, ts, _ = _HEADER.unpack_from(self._buf, 0)
+        return {
+            "role": self.role,
+            "version": seq,
+            "bytes": length,
+            "age_s": round(time.time() - ts, 1) if ts else None,
+            "publishes": self.publishes,
+            "reads": self.reads,
+            "decodes": self.decodes,
+            "retries": self.retries,
+        }
+
+    # --- Refrescador ---
+
+    def start_publisher(self, collect: Callable[[], Dict[str, Any]], interval: float = REFRESH_SECONDS,
+                        quiet: bool = False) -> threading.Thread:
+        """Hilo del proceso refrescador: junta las secciones y publica si cambiaron."""
+
+        def _loop():
+            while self.role == "writer":
+                t0 = time.perf_counter()
+                try:
+                    if self.publish(collect()) and not quiet:
+                        logger.info(f"🧠 Snapshot compartido v{self.version} publicado en {time.perf_counter() - t0:.2f}s.")
+                except Exception as e:
+                    logger.error(f"❌ Falló la publicación del segmento '{self.label}': {e}")
+                time.sleep(interval)
+
+        th = threading.Thread(target=_loop, name=f"shared-{self.label}", daemon=True)
+        th.start()
+        return th
+
+def _after_fork_all() -> None:
+    for snap in list(_INSTANCES):
+        snap._after_fork()
+
+SHARED_SNAPSHOT = SharedSnapshot()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_all)
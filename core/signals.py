@@ -1,7 +1,10 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Set
 import re
+import hashlib
 import logging
 
+from core.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 # Diccionario de keywords expandido para análisis de impacto
@@ -24,43 +27,110 @@ KEYWORDS = {
     "bearish": ("sentimiento", 1),
 }
 
+# Sufijos permitidos para que "hack" matchee "hacked" pero "sec" NO matchee "second"
+_SUFFIXES = r"(?:s|es|ed|ing)?"
+# Keywords terminadas en "e" se flexionan desde la raíz: upgrade -> upgraded / upgrading
+_E_SUFFIXES = r"(?:e|es|ed|ing|er|ers)"
+# Formas que no salen de los sufijos comunes: consonante doblada (scammed), sustantivos
+# y adjetivos derivados (hackers, bankruptcy, inflationary, bullishness)
+_KEYWORD_FORMS = {
+    "hack": r"hack(?:s|ed|ing|ers?)?",
+    "exploit": r"exploit(?:s|ed|ing|ers?|ative)?",
+    "scam": r"scam(?:s|m(?:ed|ing|ers?|y))?",
+    "bankrupt": r"bankrupt(?:s|ed|cy|cies)?",
+    "inflation": r"inflation(?:s|ary)?",
+    "airdrop": r"airdrop(?:s|p(?:ed|ing))?",
+    "bullish": r"bullish(?:ly|ness)?",
+    "bearish": r"bearish(?:ly|ness)?",
+}
+
+_GROUP_KEYWORD: Dict[str, str] = {}  # nombre de grupo del regex -> keyword
+
+def _keyword_pattern(kw: str) -> str:
+    if kw in _KEYWORD_FORMS:
+        return _KEYWORD_FORMS[kw]
+    if kw.endswith("e"):
+        return re.escape(kw[:-1]) + _E_SUFFIXES
+    return re.escape(kw) + _SUFFIXES
+
+def _compile_keywords(keywords: Dict[str, Tuple[str, int]]) -> "re.Pattern":
+    """
+    Une todo el diccionario en un único regex con límites de palabra (una sola pasada).
+    Cada keyword es un grupo con nombre (k0, k1...): `m.lastgroup` dice cuál matcheó.
+    """
+    alts = sorted(keywords, key=len, reverse=True)  # Más largos primero ("delist" antes que "listing")
+    groups = "|".join(f"(?P<k{i}>{_keyword_pattern(kw)})" for i, kw in enumerate(alts))
+    pattern = re.compile(r"\b(?:" + groups + r")\b", re.IGNORECASE)
+    _GROUP_KEYWORD.update({f"k{i}": kw for i, kw in enumerate(alts)})
+    return pattern
+
+KEYWORD_RE = _compile_keywords(KEYWORDS)
+
+# Memo de puntajes por hash de artículo: solo las noticias nuevas cuestan CPU
+_SCORE_CACHE = TTLCache(ttl_seconds=6 * 3600, max_items=4096, name="signals.scores")
+
 # Regex mejorado para evitar falsos positivos
 SYMBOL_RE = re.compile(r"\b[A-Z]{3,6}\b") 
+# Con universo conocido podemos aceptar tickers cortos/alfanuméricos (OP, 1INCH) y cashtags
+UNIVERSE_TOKEN_RE = re.compile(r"(?<![\w$])\$?([A-Z0-9]{2,10})\b")
 
-def extract_symbols(text: str) -> List[str]:
-    """Extrae tickers reales evitando palabras comunes del inglés/español."""
+# Lista negra extendida
+STOPWORDS = {
+    "THE", "AND", "FOR", "WITH", "THIS", "THAT", "FROM", "INTO", 
+    "ONTO", "USD", "USDT", "ARE", "CAN", "NEW", "ALL", "BIG", "OUT"
+}
+
+def extract_symbols(text: str, universe: Optional[Set[str]] = None) -> List[str]:
+    """
+    Extrae tickers reales evitando palabras comunes del inglés/español.
+    Si se pasa el universo de mercado, solo devuelve símbolos que existen
+    (y respeta mayúsculas: el llamador decide si normalizar el texto).
+    """
     if not text:
         return []
-    
+
+    if universe is not None:
+        candidates = UNIVERSE_TOKEN_RE.findall(text)
+        out = [c for c in candidates if c in universe and c not in STOPWORDS]
+        return list(dict.fromkeys(out))
+
     candidates = SYMBOL_RE.findall(text.upper())
-    # Lista negra extendida
-    bad = {
-        "THE", "AND", "FOR", "WITH", "THIS", "THAT", "FROM", "INTO", 
-        "ONTO", "USD", "USDT", "ARE", "CAN", "NEW", "ALL", "BIG", "OUT"
-    }
     
     out = []
     for c in candidates:
-        if c not in bad and not c.isdigit():
+        if c not in STOPWORDS and not c.isdigit():
             out.append(c)
     return list(dict.fromkeys(out))
 
+def _article_key(item: Dict) -> str:
+    raw = (item.get("title") or "") + "\x00" + (item.get("summary") or "")
+    return hashlib.blake2b(raw.encode("utf-8", "ignore"), digest_size=12).hexdigest()
+
 def score_article(item: Dict) -> Tuple[int, List[str], List[str]]:
-    """Analiza una noticia y le asigna un puntaje de relevancia."""
-    t = (item.get("title") or "").lower()
-    s = (item.get("summary") or "").lower()
-    combined = t + " " + s
+    """Analiza una noticia y le asigna un puntaje de relevancia (memoizado por contenido)."""
+    key = _article_key(item)
+    cached = _SCORE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    combined = (item.get("title") or "") + " " + (item.get("summary") or "")
 
     tags = []
     score = 0
-    
-    for kw, (tag, weight) in KEYWORDS.items():
-        if kw in combined:
-            tags.append(tag)
-            score += weight
+    seen = set()
+    for m in KEYWORD_RE.finditer(combined):
+        kw = _GROUP_KEYWORD[m.lastgroup]
+        if kw in seen:
+            continue  # Cada keyword suma una sola vez, igual que antes
+        seen.add(kw)
+        tag, weight = KEYWORDS[kw]
+        tags.append(tag)
+        score += weight
 
     symbols = extract_symbols(item.get("title", ""))
-    return score, list(dict.fromkeys(tags)), symbols
+    result = (score, list(dict.fromkeys(tags)), symbols)
+    _SCORE_CACHE.set(key, result)
+    return result
 
 def build_news_signals(news: List[Dict], max_items: int = 10) -> Dict:
     """
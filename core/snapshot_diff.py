@@ -0,0 +1,197 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from core import metrics
+from core.market import is_stable
+
+logger = logging.getLogger(__name__)
+
+# Umbrales de los eventos de cambio entre snapshots consecutivos
+PRICE_MOVE_PCT = float(os.getenv("DIFF_PRICE_MOVE_PCT", "5"))    # % desde el último precio informado
+RANK_MOVE = int(os.getenv("DIFF_RANK_MOVE", "5"))                # puestos
+DEPEG_PCT = float(os.getenv("DIFF_DEPEG_PCT", "1"))              # % de desvío de 1 USD
+MAX_EVENTS = 1000
+
+EVENT_NEW = "new"
+EVENT_DROPPED = "dropped"
+EVENT_RANK = "rank_move"
+EVENT_PRICE = "price_move"
+EVENT_DEPEG = "depeg"
+EVENT_REPEG = "repeg"
+
+# Campos que definen el contenido de una fila: si no cambió ninguno, la fila no cuesta nada
+_HASH_FIELDS = ("symbol", "market_cap_rank", "current_price", "market_cap", "total_volume",
+                "price_change_percentage_24h")
+
+def row_hash(row: Dict) -> bytes:
+    raw = "\x1f".join(str(row.get(f)) for f in _HASH_FIELDS)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+
+class _Tracked:
+    """Lo que recordamos de cada moneda entre snapshots."""
+    __slots__ = ("digest", "symbol", "rank", "price", "ref_price", "stable", "depegged")
+
+    def __init__(self, digest: bytes, symbol: str, rank: Optional[int], price: float, stable: bool):
+        self.digest = digest
+        self.symbol = symbol
+        self.rank = rank
+        self.price = price
+        self.ref_price = price     # Precio contra el que se mide el próximo price_move
+        self.stable = stable
+        self.depegged = False
+
+class SnapshotDiff:
+    """
+    Compara snapshots consecutivos del mercado y emite eventos de cambio
+    (altas/bajas, saltos de ranking, movimientos de precio, depegs).
+    Los consumidores se suscriben o leen el stream con `events_since(seq)`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, _Tracked] = {}
+        self._version: Optional[Hashable] = None
+        self._primed = False       # Ya hubo un snapshot base (el primero no emite altas)
+        self._seq = 0
+        self._events: deque = deque(maxlen=MAX_EVENTS)
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self.snapshots = 0
+        self.rows_unchanged = 0
+        self.rows_changed = 0
+
+    def subscribe(self, fn: Callable[[List[Dict]], None]) -> None:
+        """fn recibe la lista de eventos de cada snapshot que cambió algo."""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def _event(self, kind: str, symbol: str, now: float, **data) -> Dict[str, Any]:
+        self._seq += 1
+        ev = {"seq": self._seq, "type": kind, "symbol": symbol, "ts": now, **data}
+        self._events.append(ev)
+        return ev
+
+    def observe(self, rows: Sequence[Dict], version: Optional[Hashable] = None) -> List[Dict]:
+        """
+        Procesa un snapshot completo. Si `version` es igual a la anterior no hace nada
+        (O(1)): el llamador la cambia solo cuando descargó datos nuevos. Un snapshot
+        vacío (falla sin caché) se ignora: no es que todas las monedas salieron del ranking.
+        """
+        if not rows:
+            return []
+        with self._lock:
+            if version is not None and version == self._version:
+                return []
+            self._version = version
+            first = not self._primed
+            self._primed = True
+            now = time.time()
+            events: List[Dict] = []
+            current: Dict[str, _Tracked] = {}
+
+            for r in rows:
+                cid = r.get("id") or r.get("symbol")
+                if not cid:
+                    continue
+                digest = row_hash(r)
+                prev = self._rows.get(cid)
+                if prev is not None and prev.digest == digest:
+                    current[cid] = prev
+                    self.rows_unchanged += 1
+                    continue
+                self.rows_changed += 1
+
+                symbol = (r.get("symbol") or "").upper()
+                rank = r.get("market_cap_rank")
+                price = float(r.get("current_price") or 0)
+                tracked = _Tracked(digest, symbol, rank, price, is_stable(r))
+                current[cid] = tracked
+
+                if prev is None:
+                    if not first:
+                        events.append(self._event(EVENT_NEW, symbol, now, rank=rank, price=price))
+                else:
+                    tracked.ref_price = prev.ref_price
+                    tracked.depegged = prev.depegged
+                    if rank and prev.rank and abs(rank - prev.rank) >= RANK_MOVE:
+                        events.append(self._event(EVENT_RANK, symbol, now, rank=rank, prev_rank=prev.rank))
+                    if prev.ref_price > 0 and price > 0 and not tracked.stable:
+                        move = (price - prev.ref_price) / prev.ref_price * 100
+                        if abs(move) >= PRICE_MOVE_PCT:
+                            events.append(self._event(EVENT_PRICE, symbol, now, price=price,
+                                                      prev_price=prev.ref_price, change_pct=round(move, 2)))
+                            tracked.ref_price = price
+
+                if tracked.stable and price > 0:
+                    off = abs(price - 1.0) * 100
+                    if off >= DEPEG_PCT and not tracked.depegged:
+                        tracked.depegged = True
+                        events.append(self._event(EVENT_DEPEG, symbol, now, price=price, deviation_pct=round(off, 2)))
+                    elif off < DEPEG_PCT / 2 and tracked.depegged:
+                        tracked.depegged = False
+                        events.append(self._event(EVENT_REPEG, symbol, now, price=price))
+
+            if not first:
+                for cid, prev in self._rows.items():
+                    if cid not in current:
+                        events.append(self._event(EVENT_DROPPED, prev.symbol, now, prev_rank=prev.rank))
+
+            self._rows = current
+            self.snapshots += 1
+            listeners = list(self._listeners)
+
+        for ev in events:
+            metrics.incr("snapshot_events", type=ev["type"])
+        if events:
+            logger.info(f"🔀 Snapshot: {len(events)} cambios ({', '.join(sorted({e['type'] for e in events}))}).")
+            for fn in listeners:
+                try:
+                    fn(events)
+                except Exception as e:
+                    logger.error(f"❌ Listener de cambios falló: {e}")
+        return events
+
+    def events_since(self, seq: int = 0, types: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Stream de cambios: eventos con seq > `seq` (acotado a los últimos MAX_EVENTS)."""
+        with self._lock:
+            return [e for e in self._events if e["seq"] > seq and (not types or e["type"] in types)]
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked": len(self._rows),
+                "snapshots": self.snapshots,
+                "rows_changed": self.rows_changed,
+                "rows_unchanged": self.rows_unchanged,
+                "events": self._seq,
+            }
+
+def render_events(events: Sequence[Dict], limit: int = 15) -> str:
+    """Resumen legible de eventos (alertas / comando de admin)."""
+    lines = []
+    for e in list(events)[-limit:]:
+        sym = e["symbol"]
+        if e["type"] == EVENT_NEW:
+            lines.append(f"🆕 {sym} entró al ranking (#{e.get('rank')})")
+        elif e["type"] == EVENT_DROPPED:
+            lines.append(f"👋 {sym} salió del ranking (era #{e.get('prev_rank')})")
+        elif e["type"] == EVENT_RANK:
+            arrow = "⬆️" if e["rank"] < e["prev_rank"] else "⬇️"
+            lines.append(f"{arrow} {sym} #{e['prev_rank']} → #{e['rank']}")
+        elif e["type"] == EVENT_PRICE:
+            lines.append(f"{'🚀' if e['change_pct'] > 0 else '📉'} {sym} {e['change_pct']:+.1f}% (${e['price']:,.6g})")
+        elif e["type"] == EVENT_DEPEG:
+            lines.append(f"🚨 DEPEG {sym}: ${e['price']:.4f} ({e['deviation_pct']:.2f}% de desvío)")
+        elif e["type"] == EVENT_REPEG:
+            lines.append(f"✅ {sym} recuperó la paridad (${e['price']:.4f})")
+    return "\n".join(lines) or "Sin cambios registrados."
+
+SNAPSHOT_DIFF = SnapshotDiff()
@@ -1,17 +1,24 @@
 import time
+import math
 import requests
 import logging
 import os
-from typing import Dict, Optional, Tuple, List
-from core.cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple, List
+from core.cache import TTLCache, CACHE_REGISTRY
+from core.ratelimit import TokenBucket
+from core import multisource
+from core import metrics
+from core.snapshot_diff import SNAPSHOT_DIFF
+from core.shared_snapshot import SHARED_SNAPSHOT
 
 logger = logging.getLogger(__name__)
 
 # Cache de 10 minutos para proteger la IP del servidor en Railway
-_cache = TTLCache(ttl_seconds=600, max_items=1024)
+_cache = TTLCache(ttl_seconds=600, max_items=1024, name="coingecko.pages")
 
 # Configuración de Endpoints
-COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3/coins/markets"
+COINGECKO_BASE_URL = os.getenv("COINGECKO_MARKETS_URL", "https://api.coingecko.com/api/v3/coins/markets")
 CG_API_KEY = os.getenv("CG_API_KEY") 
 
 # Usamos Session para reutilizar la conexión TCP y ganar velocidad
@@ -36,27 +43,56 @@ def _get_json(url: str, params: Optional[dict] = None, timeout: int = 25) -> Opt
         logger.error(f"❌ Error de red: {e}")
         raise
 
-def fetch_coingecko_top100(vs: str = "usd") -> list:
-    """Obtiene el Top 100 con lógica de resiliencia ante caídas."""
-    key = f"cg:top100:{vs}"
+# --- UNIVERSO DE MERCADO (PAGINADO) ---
+# Tamaño configurable del universo (top 250/500/1000+). CoinGecko admite hasta 250 por página.
+UNIVERSE_SIZE = int(os.getenv("UNIVERSE_SIZE", "250"))
+PAGE_SIZE = 250
+MAX_PARALLEL_PAGES = 4
+
+# Presupuesto compartido de requests a CoinGecko (plan demo: ~30/min)
+_CG_BUDGET = TokenBucket(rate=float(os.getenv("CG_RATE_PER_MIN", "25")) / 60.0, capacity=5)
+
+# Refresco escalonado: el top se refresca seguido, la cola larga mucho menos
+TTL_HEAD = 300
+TTL_TAIL_MAX = 1800
+
+def _page_ttl(page: int) -> int:
+    """TTL por página con desfase para que las páginas no venzan todas juntas."""
+    if page <= 1:
+        return TTL_HEAD
+    return min(TTL_HEAD * page, TTL_TAIL_MAX) + 37 * page
+
+# Sube con cada página descargada de verdad: si no cambió, el snapshot tampoco
+_PAGES_VERSION = 0
+
+def fetch_coingecko_page(page: int, vs: str = "usd", per_page: int = PAGE_SIZE) -> list:
+    """Descarga una página del ranking por market cap, con cache y presupuesto compartido."""
+    global _PAGES_VERSION
+    key = f"cg:page:{vs}:{per_page}:{page}"
     cached = _cache.get(key)
     if cached is not None:
+        metrics.incr("cache_requests", source="coingecko", result="hit")
         return cached
+    metrics.incr("cache_requests", source="coingecko", result="miss")
 
     params = {
         "vs_currency": vs,
         "order": "market_cap_desc",
-        "per_page": 100,
-        "page": 1,
+        "per_page": per_page,
+        "page": page,
         "sparkline": False,
         "price_change_percentage": "24h,7d,30d", # Agregamos 24h para el Engine
     }
 
-    # Estrategia de reintentos: 0s, 10s, 25s
-    for wait in (0, 10, 25):
+    # Estrategia de reintentos: 0s, 10s, 25s (solo el top; la cola larga no vale la espera)
+    waits = (0, 10, 25) if page == 1 else (0,)
+    for wait in waits:
         if wait:
-            logger.warning(f"⏳ Reintentando CoinGecko en {wait}s...")
+            logger.warning(f"⏳ Reintentando CoinGecko (página {page}) en {wait}s...")
             time.sleep(wait)
+        if not _CG_BUDGET.acquire(timeout=30):
+            logger.warning(f"⚠️ Presupuesto de CoinGecko agotado (página {page}).")
+            break
         try:
             data = _get_json(COINGECKO_BASE_URL, params=params)
             if data and isinstance(data, list):
@@ -64,27 +100,105 @@ def fetch_coingecko_top100(vs: str = "usd") -> list:
                 for coin in data:
                     coin["current_price"] = float(coin.get("current_price") or 0)
                     coin["symbol"] = coin.get("symbol", "").upper()
-                
-                _cache.set(key, data)
+
+                _cache.set(key, data, ttl_seconds=_page_ttl(page))
+                _PAGES_VERSION += 1
                 return data
         except Exception as e:
             if "429" not in str(e):
                 break # Si no es saturación, salimos para no perder tiempo
+            _CG_BUDGET.pause(wait or 10)
             continue
 
     # Si todo falla, el 'allow_stale' nos salva: devuelve la última data aunque haya expirado
-    logger.critical("⚠️ Fallo total de API. Usando datos históricos del caché.")
-    return _cache.get(key, allow_stale=True) or []
+    logger.critical(f"⚠️ Fallo de API en página {page}. Usando datos históricos del caché.")
+    stale = _cache.get(key, allow_stale=True)
+    if stale:
+        metrics.incr("cache_stale_served", source="coingecko")
+    return stale or []
+
+def fetch_market_universe(size: Optional[int] = None, vs: str = "usd") -> list:
+    """
+    Obtiene el universo completo descargando las páginas en paralelo
+    y las une en un único snapshot ordenado por ranking.
+    En otra moneda (`vs`) devuelve [] si no hay tipo de cambio.
+    """
+    size = max(1, int(size or UNIVERSE_SIZE))
+
+    # Otras monedas: mismo snapshot USD reescalado con la tabla de FX (sin gastar cuota extra)
+    if (vs or "usd").lower() != "usd":
+        from core.fx import FX, CURRENCIES
+        if vs.upper() in CURRENCIES:
+            usd = fetch_market_universe(size, "usd")
+            rows, currency = FX.rescale(usd, vs.upper(), columns=market_columns(usd))
+            if currency != vs.upper():
+                # Sin tipo de cambio FX.rescale devuelve USD: nunca precios en dólares con etiqueta de otra moneda
+                logger.warning(f"⚠️ Sin tipo de cambio para {vs.upper()}: no hay universo en esa moneda.")
+                metrics.incr("fx_unavailable", currency=vs.upper())
+                return []
+            return rows
+
+    # Worker multi-proceso: el universo lo publica el refrescador en shared memory
+    shared = SHARED_SNAPSHOT.read("market") if vs == "usd" else None
+    if shared and size <= len(shared):
+        if size == UNIVERSE_SIZE:
+            SNAPSHOT_DIFF.observe(shared, version=("shared", SHARED_SNAPSHOT.version))
+        return shared[:size]
+
+    pages = math.ceil(size / PAGE_SIZE)
+
+    if pages == 1:
+        results = [fetch_coingecko_page(1, vs)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(pages, MAX_PARALLEL_PAGES)) as pool:
+            results = list(pool.map(lambda p: fetch_coingecko_page(p, vs), range(1, pages + 1)))
+
+    merged, seen = [], set()
+    for page_rows in results:
+        for coin in page_rows:
+            cid = coin.get("id")
+            if cid in seen:
+                continue  # El ranking puede moverse entre refrescos de páginas distintas
+            seen.add(cid)
+            merged.append(coin)
+
+    merged.sort(key=lambda c: c.get("market_cap_rank") or float("inf"))
+    merged = merged[:size]
+    # Solo el universo canónico y completo alimenta el stream de cambios: un top 100 parcial
+    # o una página que falló sin caché no son "bajas" del ranking
+    if vs == "usd" and size == UNIVERSE_SIZE and merged and all(results):
+        SNAPSHOT_DIFF.observe(merged, version=(size, _PAGES_VERSION))
+    return merged
+
+def market_columns(rows: list) -> Tuple[int, Dict[str, Any]]:
+    """
+    (versión, columnas numéricas zero-copy) del universo compartido si `rows` salió de ahí
+    (`fetch_market_universe` en un worker); si no, (0, {}) y el llamador usa las filas.
+    """
+    return SHARED_SNAPSHOT.columns("market", rows)
+
+def fetch_coingecko_top100(vs: str = "usd") -> list:
+    """Compatibilidad: el Top 100 sale del mismo universo cacheado (sin gastar cuota extra)."""
+    return fetch_market_universe(max(100, UNIVERSE_SIZE), vs)[:100]
 
 def verify_price_multi_source(anchor_price: float, symbol: str) -> Tuple[int, str]:
     """
-    Sistema de validación. Por ahora confía en CG, pero está listo 
-    para expandirse a Binance/Kraken sin romper el Engine.
+    Sistema de validación: compara el precio de CoinGecko contra la
+    mediana de Binance/Coinbase/Kraken (ver core.multisource).
     """
     if anchor_price <= 0:
         return 0, "invalid_price"
-    return 1, "coingecko_verified"
+    try:
+        return multisource.verify_price_multi_source(anchor_price, symbol)
+    except Exception as e:
+        logger.error(f"⚠️ Agregador multi-exchange falló, se confía en CG: {e}")
+        return 1, "coingecko_verified"
+
+def kraken_spot_price_usd(symbol: str) -> Optional[float]:
+    return multisource.kraken_prices_usd().get((symbol or "").upper())
+
+def coinbase_spot_price_usd(symbol: str) -> Optional[float]:
+    return multisource.coinbase_prices_usd().get((symbol or "").upper())
 
-# Fallbacks para compatibilidad con el Arquitecto de Mercado
-def kraken_spot_price_usd(symbol: str): return None
-def coinbase_spot_price_usd(symbol: str): return None
+# Pre-calentamiento desde el registro de cachés
+CACHE_REGISTRY.set_warmer("coingecko.pages", fetch_market_universe)
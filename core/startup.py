@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fases del arranque: booting (imports) -> warming (precalentado en paralelo) -> ready | degraded
+PHASE_BOOTING = "booting"
+PHASE_WARMING = "warming"
+PHASE_READY = "ready"
+PHASE_DEGRADED = "degraded"   # Terminó el warm-up pero alguna tarea falló: se atiende igual
+
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+
+Task = Tuple[str, Callable[[], object]]
+
+class Startup:
+    """
+    Orquesta el arranque: mide cada etapa y corre las tareas de warm-up en
+    paralelo en un hilo de fondo, así el bot puede empezar a escuchar ya.
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._last_mark = self._t0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self.phase = PHASE_BOOTING
+        self.timings: Dict[str, float] = {}      # etapa -> segundos
+        self.errors: Dict[str, str] = {}
+        self.ready_after: Optional[float] = None  # segundos desde el arranque
+
+    def mark(self, stage: str) -> float:
+        """Registra cuánto tardó una etapa sincrónica desde la marca anterior (ej: "imports")."""
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self._last_mark
+            self._last_mark = now
+            self.timings[stage] = elapsed
+        metrics.set_gauge("startup_seconds", elapsed, stage=stage)
+        return elapsed
+
+    def _run_task(self, name: str, fn: Callable[[], object]) -> None:
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = str(e)
+            logger.error(f"❌ Warm-up '{name}' falló: {e}")
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.timings[f"warm.{name}"] = elapsed
+            metrics.set_gauge("startup_seconds", elapsed, stage=f"warm.{name}")
+
+    def warm_up(self, tasks: List[Task], timeout: float = WARMUP_TIMEOUT) -> None:
+        """Corre las tareas en paralelo y bloquea hasta que terminen (o venza el timeout)."""
+        self.phase = PHASE_WARMING
+        metrics.set_gauge("startup_ready", 0)
+        t0 = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix="warmup")
+        futures = [pool.submit(self._run_task, name, fn) for name, fn in tasks]
+        deadline = t0 + timeout
+        for f in futures:
+            try:
+                f.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except Exception:
+                with self._lock:
+                    self.errors.setdefault("timeout", f"warm-up incompleto a los {timeout:.0f}s")
+                break
+        pool.shutdown(wait=False)
+
+        with self._lock:
+            self.timings["warm.total"] = time.perf_counter() - t0
+            self.ready_after = time.perf_counter() - self._t0
+            self.phase = PHASE_DEGRADED if self.errors else PHASE_READY
+        metrics.set_gauge("startup_ready", 1)
+        metrics.set_gauge("startup_seconds", self.ready_after, stage="ready")
+        self._ready.set()
+        logger.info(f"✅ Arranque {self.phase} en {self.ready_after:.2f}s ({self._fmt_timings()})")
+
+    def start(self, tasks: List[Task], timeout: float = WARMUP_TIMEOUT) -> threading.Thread:
+        """Lanza el warm-up en segundo plano y devuelve el hilo."""
+        th = threading.Thread(target=self.warm_up, args=(tasks, timeout), daemon=True, name="startup")
+        th.start()
+        return th
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _fmt_timings(self) -> str:
+        return ", ".join(f"{k} {v:.2f}s" for k, v in self.timings.items())
+
+    def report(self) -> str:
+        """Desglose del arranque para /stats."""
+        with self._lock:
+            timings = dict(self.timings)
+            errors = dict(self.errors)
+        lines = [f"🚦 Arranque: {self.phase}" + (f" en {self.ready_after:.2f}s" if self.ready_after else "")]
+        lines += [f"• {k}: {v * 1000:.0f}ms" for k, v in timings.items()]
+        lines += [f"⚠️ {k}: {v}" for k, v in errors.items()]
+        return "\n".join(lines)
+
+def _warm_market() -> None:
+    from core.sources import fetch_market_universe
+    from core.news_index import NEWS_INDEX
+    rows = fetch_market_universe()
+    NEWS_INDEX.set_universe(rows)
+
+def _warm_exchanges() -> None:
+    from core.multisource import aggregate_prices
+    aggregate_prices(force=True)
+
+def _warm_news() -> None:
+    from core.news import fetch_news
+    fetch_news()
+
+def _warm_state() -> None:
+    from core.memory import load_state
+    from core.learning import load_learning
+    load_state()
+    load_learning()
+
+def _warm_llm() -> None:
+    from core.llm_gemini import warm_up
+    if not warm_up():
+        raise RuntimeError("cliente de Gemini no disponible")
+
+def default_tasks() -> List[Task]:
+    """Snapshot de mercado, precios de exchanges, noticias, estado y cliente LLM: todo en paralelo."""
+    return [
+        ("market", _warm_market),
+        ("exchanges", _warm_exchanges),
+        ("news", _warm_news),
+        ("state", _warm_state),
+        ("llm", _warm_llm),
+    ]
+
+STARTUP = Startup()
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Un único archivo para todo el estado del bot (antes: 3 JSON independientes)
+STORAGE_PATH = os.getenv("STORAGE_PATH", "bot_state.db")
+SCHEMA_VERSION = 1
+
+# Archivos legacy que se migran una sola vez
+LEGACY_BRAIN_FILE = "brain_state.json"
+LEGACY_MEMORY_FILE = os.getenv("STATE_PATH", "core/state.json")
+LEGACY_LEARNING_FILE = "learning_state.json"
+
+# Namespaces tipados: cada uno valida el tipo de valor que acepta
+NAMESPACES: Dict[str, Callable[[Any], bool]] = {
+    "admin": lambda v: v is None or isinstance(v, (int, bool, str)),   # chat_id, is_active
+    "prefs": lambda v: isinstance(v, dict),                            # preferencias globales
+    "sessions": lambda v: isinstance(v, dict),                         # sesión por chat_id
+    "subscribers": lambda v: isinstance(v, str),                       # chat_id -> frecuencia
+    "holdings": lambda v: isinstance(v, dict),                         # chat_id -> {SYM: {qty, cost}}
+    "reports": lambda v: isinstance(v, dict),                          # chat_id -> último /analizar {text, ts}
+    "meta": lambda v: True,
+}
+COUNTER_NAMESPACES = {"interest"}                                      # contadores enteros
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _decode(raw: bytes) -> Any:
+    return json.loads(raw)
+
+class Storage:
+    """
+    Backend único de estado sobre SQLite (WAL).
+    Un solo lock y un solo modelo de transacciones para bot, brain, memory y learning.
+    """
+
+    def __init__(self, path: str = STORAGE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        dir_name = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dir_name, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._tx_depth = 0
+        self.lock_wait_s = 0.0   # Contención acumulada del lock (diagnóstico)
+        self._migrate_schema()
+
+    # --- Esquema ---
+
+    def _migrate_schema(self) -> None:
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            if version < 1:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS kv ("
+                    " ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL,"
+                    " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS counters ("
+                    " ns TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL DEFAULT 0,"
+                    " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+                )
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        logger.info(f"🗄️ Esquema de storage actualizado a v{SCHEMA_VERSION}.")
+
+    # --- Transacciones ---
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transacción de escritura (anidable: solo la externa hace BEGIN/COMMIT)."""
+        t0 = time.perf_counter()
+        with self._lock:
+            self.lock_wait_s += time.perf_counter() - t0
+            outer = self._tx_depth == 0
+            if outer:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth += 1
+            try:
+                yield self._conn
+            except Exception:
+                self._tx_depth -= 1
+                if outer:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._tx_depth -= 1
+                if outer:
+                    self._conn.execute("COMMIT")
+
+    def data_version(self) -> int:
+        """Cambia cuando OTRA conexión (otro proceso) confirmó escrituras."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # --- Key/Value tipado ---
+
+    def _check(self, ns: str, value: Any) -> None:
+        validator = NAMESPACES.get(ns)
+        if validator is None:
+            raise KeyError(f"Namespace desconocido: {ns}")
+        if not validator(value):
+            raise TypeError(f"Valor inválido para namespace '{ns}': {type(value).__name__}")
+
+    def get(self, ns: str, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, str(key))).fetchone()
+        return _decode(row[0]) if row else default
+
+    def items(self, ns: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv WHERE ns=?", (ns,)).fetchall()
+        return {k: _decode(v) for k, v in rows}
+
+    def put(self, ns: str, key: Any, value: Any) -> None:
+        self.put_many(ns, {key: value})
+
+    def put_many(self, ns: str, values: Dict[Any, Any]) -> None:
+        for v in values.values():
+            self._check(ns, v)
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at",
+                [(ns, str(k), _encode(v), now) for k, v in values.items()],
+            )
+
+    def put_encoded(self, ns: str, values: Dict[str, bytes]) -> None:
+        """Variante para quien ya serializó (ej: brain detecta cambios por los bytes)."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at",
+                [(ns, str(k), v, now) for k, v in values.items()],
+            )
+
+    def delete(self, ns: str, key: Any) -> bool:
+        with self.transaction() as conn:
+            cur = conn.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, str(key)))
+            return cur.rowcount > 0
+
+    # --- Contadores ---
+
+    def incr_many(self, ns: str, deltas: Dict[str, int]) -> None:
+        if ns not in COUNTER_NAMESPACES:
+            raise KeyError(f"Namespace de contadores desconocido: {ns}")
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO counters (ns, key, count) VALUES (?, ?, ?)"
+                " ON CONFLICT(ns, key) DO UPDATE SET count = count + excluded.count",
+                [(ns, k, int(d)) for k, d in deltas.items()],
+            )
+
+    def counters(self, ns: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, count FROM counters WHERE ns=?", (ns,)).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# --- MIGRACIÓN DESDE LOS JSON LEGACY ---
+
+def _read_json(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except Exception as e:
+        logger.error(f"⚠️ No se pudo leer {path} para migrar: {e}")
+        return None
+
+def migrate_legacy(store: Storage) -> bool:
+    """Importa brain_state.json, core/state.json y learning_state.json (una sola vez)."""
+    if store.get("meta", "legacy_migrated"):
+        return False
+
+    brain_file = _read_json(LEGACY_BRAIN_FILE) or {}
+    memory_file = _read_json(LEGACY_MEMORY_FILE) or {}
+    learning_file = _read_json(LEGACY_LEARNING_FILE) or {}
+
+    with store.transaction():
+        # Re-chequeo dentro del BEGIN IMMEDIATE: con workers en varios procesos, otro
+        # pudo migrar entre el chequeo de arriba y acá (y los contadores se duplicarían)
+        if store.get("meta", "legacy_migrated"):
+            return False
+        admin_id = memory_file.get("chat_id") or brain_file.get("admin_chat_id")
+        if admin_id is not None:
+            store.put("admin", "chat_id", int(admin_id))
+        if "is_active" in memory_file:
+            store.put("admin", "is_active", bool(memory_file["is_active"]))
+        if isinstance(memory_file.get("prefs"), dict):
+            store.put("prefs", "global", memory_file["prefs"])
+
+        # Sesiones: las de brain_state.json son las que usa el bot; core/state.json solo completa
+        sessions = dict(((memory_file.get("brain") or {}).get("sessions") or {}))
+        sessions.update(((brain_file.get("brain") or {}).get("sessions") or {}))
+        if sessions:
+            store.put_many("sessions", {sid: s for sid, s in sessions.items() if isinstance(s, dict)})
+
+        subs = brain_file.get("subscribers") or {}
+        if subs:
+            store.put_many("subscribers", {cid: str(f) for cid, f in subs.items()})
+
+        counts = {k: int(v) for k, v in learning_file.items() if isinstance(v, (int, float))}
+        if counts:
+            store.incr_many("interest", counts)
+
+        store.put("meta", "legacy_migrated", time.time())
+
+    for path in (LEGACY_BRAIN_FILE, LEGACY_MEMORY_FILE, LEGACY_LEARNING_FILE):
+        if os.path.exists(path):
+            os.replace(path, path + ".migrated")
+    logger.info(f"📦 Migración legacy completa ({len(sessions)} sesiones, {len(counts)} contadores).")
+    return True
+
+_STORE: Optional[Storage] = None
+_STORE_LOCK = threading.Lock()
+
+def get_storage() -> Storage:
+    """Singleton del proceso: abre la base, aplica esquema y migra lo legacy."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                store = Storage()
+                try:
+                    migrate_legacy(store)
+                except Exception as e:
+                    logger.error(f"❌ Falló la migración legacy: {e}")
+                _STORE = store
+    return _STORE
+
+def _reset_after_fork() -> None:
+    """Un proceso hijo (workers del webhook) no debe compartir la conexión SQLite del padre."""
+    global _STORE, _STORE_LOCK
+    _STORE = None
+    _STORE_LOCK = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,274 @@
+import os
+import json
+import hmac
+import queue
+import secrets
+import threading
+import logging
+import multiprocessing
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Modo webhook: Telegram hace POST de cada update a nuestro endpoint. El servidor valida
+# el secreto, responde 200 al instante y deriva el update a un pool de workers con
+# afinidad por chat (mismo chat -> mismo worker), así se respeta el orden de cada chat
+# y la sesión caliente de brain vive en un solo proceso.
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")                     # URL pública (activa el modo webhook)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")          # X-Telegram-Bot-Api-Secret-Token (obligatorio)
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") == "1"  # 0 = no llamar setWebhook (pruebas locales)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8443")))
+WEBHOOK_PROCESSES = int(os.getenv("WEBHOOK_PROCESSES", "0"))   # 0 = todo en este proceso
+WEBHOOK_THREADS = int(os.getenv("WEBHOOK_THREADS", "8"))       # Shards (hilos) por proceso
+QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))        # Por shard; lleno = 503 y Telegram reintenta
+MAX_BODY = 1024 * 1024
+DEDUP_SIZE = 4096
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def resolve_secret(secret: str = WEBHOOK_SECRET, register: bool = WEBHOOK_REGISTER) -> str:
+    """
+    Secreto del endpoint. Sin WEBHOOK_SECRET y registrando nosotros el webhook, se genera
+    uno por arranque (setWebhook se lo pasa a Telegram). Sin registro no hay cómo acordarlo.
+    """
+    if secret:
+        return secret
+    if register:
+        logger.warning("🔑 WEBHOOK_SECRET vacío: se genera uno aleatorio para este arranque.")
+        return secrets.token_urlsafe(32)
+    raise RuntimeError("WEBHOOK_SECRET es obligatorio con WEBHOOK_REGISTER=0 (nadie más puede validar los POST).")
+
+def chat_key(update: Dict[str, Any]) -> int:
+    """Clave de afinidad: el chat del update (o el update_id si no trae chat)."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post",
+                  "my_chat_member", "chat_member", "chat_join_request"):
+        chat = (update.get(field) or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+    cq = update.get("callback_query") or {}
+    chat = (cq.get("message") or {}).get("chat")
+    if chat and "id" in chat:
+        return int(chat["id"])
+    if cq.get("from"):
+        return int(cq["from"]["id"])
+    return int(update.get("update_id") or 0)
+
+class ShardedExecutor:
+    """N hilos con una cola cada uno; un chat siempre cae en el mismo hilo (orden garantizado)."""
+
+    def __init__(self, shards: int, handler: Callable[[Dict], None], name: str = "webhook"):
+        self.handler = handler
+        self._queues = [queue.Queue(maxsize=QUEUE_MAX) for _ in range(max(1, shards))]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"{name}-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            update = q.get()
+            if update is None:
+                return
+            try:
+                self.handler(update)
+            except Exception as e:
+                logger.error(f"💥 Error procesando update {update.get('update_id')}: {e}")
+                metrics.incr("webhook_errors")
+
+    def submit(self, key: int, update: Dict, block: bool = False) -> bool:
+        """Encola en el shard del chat. Con `block` espera lugar (back-pressure hacia el que llama)."""
+        try:
+            self._queues[key % len(self._queues)].put(update, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stop(self) -> None:
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join(timeout=5)
+
+def _process_main(index: int, q, handler: Callable[[Dict], None], init: Optional[Callable[[int], None]], threads: int) -> None:
+    """
+    Loop de un proceso worker: reparte su cola entre hilos por chat. Si un shard está lleno
+    espera en vez de descartar (el update ya tuvo su 200): mientras tanto se llena la cola
+    del proceso y el servidor responde 503, así Telegram reintenta en lugar de perderlo.
+    """
+    if init:
+        init(index)
+    executor = ShardedExecutor(threads, handler, name=f"worker{index}")
+    while True:
+        update = q.get()
+        if update is None:
+            break
+        executor.submit(chat_key(update), update, block=True)
+    executor.stop()
+
+class ProcessPool:
+    """
+    Workers en procesos separados (fork), uno por shard de chat_id. Se crean antes
+    de arrancar cualquier hilo del padre; cada hijo levanta sus propios servicios en `init`.
+    """
+
+    def __init__(self, processes: int, handler: Callable[[Dict], None],
+                 init: Optional[Callable[[int], None]] = None, threads: int = WEBHOOK_THREADS):
+        ctx = multiprocessing.get_context("fork")
+        self._queues = [ctx.Queue(maxsize=QUEUE_MAX) for _ in range(processes)]
+        self._procs = [
+            ctx.Process(target=_process_main, args=(i, q, handler, init, threads), name=f"bot-worker-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for p in self._procs:
+            p.start()
+        logger.info(f"🧵 {processes} procesos worker ({threads} hilos c/u) con afinidad por chat.")
+
+    def submit(self, key: int, update: Dict) -> bool:
+        try:
+            self._queues[key % len(self._queues)].put_nowait(update)
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self) -> int:
+        try:
+            return sum(q.qsize() for q in self._queues)
+        except NotImplementedError:  # macOS no implementa qsize
+            return -1
+
+    def alive(self) -> List[bool]:
+        return [p.is_alive() for p in self._procs]
+
+    def stop(self) -> None:
+        for q in self._queues:
+            q.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
+
+class _Dedup:
+    """update_ids recientes: Telegram reintenta si no recibió el 200 a tiempo."""
+
+    def __init__(self, size: int = DEDUP_SIZE):
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._size = size
+        self._lock = threading.Lock()
+
+    def first_time(self, update_id: Optional[int]) -> bool:
+        if update_id is None:
+            return True
+        with self._lock:
+            if update_id in self._seen:
+                return False
+            self._seen[update_id] = None
+            if len(self._seen) > self._size:
+                self._seen.popitem(last=False)
+            return True
+
+    def forget(self, update_id: Optional[int]) -> None:
+        """Libera un id que no se pudo encolar: el reintento de Telegram tiene que entrar."""
+        if update_id is None:
+            return
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Backlog de listen(): el default (5) resetea conexiones cuando Telegram
+    # abre varias a la vez (max_connections de setWebhook, 40 por defecto)
+    request_queue_size = 128
+    daemon_threads = True
+
+class WebhookServer:
+    """Endpoint HTTP embebido: valida, deduplica, encola y responde 200 sin esperar al handler."""
+
+    def __init__(self, pool, secret: str, path: str = WEBHOOK_PATH,
+                 host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT):
+        if not secret:
+            raise ValueError("El webhook necesita un secreto (ver resolve_secret).")
+        self.pool = pool
+        self.secret = secret
+        self.path = path
+        self._dedup = _Dedup()
+        self.httpd = _HTTPServer((host, port), self._make_handler())
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def accept(self, headers, body: bytes) -> int:
+        """Devuelve el status HTTP para un POST (separado del handler para poder probarlo)."""
+        if not hmac.compare_digest((headers.get(SECRET_HEADER) or "").encode(), self.secret.encode()):
+            metrics.incr("webhook_updates", result="forbidden")
+            return 403
+        try:
+            update = json.loads(body)
+            if not isinstance(update, dict):
+                raise ValueError("update no es un objeto")
+        except ValueError:
+            metrics.incr("webhook_updates", result="bad_request")
+            return 400
+        update_id = update.get("update_id")
+        if not self._dedup.first_time(update_id):
+            metrics.incr("webhook_updates", result="duplicate")
+            return 200
+        if not self.pool.submit(chat_key(update), update):
+            self._dedup.forget(update_id)  # No quedó encolado: el reintento no es un duplicado
+            metrics.incr("webhook_updates", result="busy")
+            return 503  # Telegram reintenta más tarde
+        metrics.incr("webhook_updates", result="accepted")
+        return 200
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?")[0] != server.path:
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY:
+                    self.send_error(413 if length > MAX_BODY else 400)
+                    return
+                status = server.accept(self.headers, self.rfile.read(length))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                # Health check para el balanceador / Railway
+                body = b"ok"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return _Handler
+
+    def serve_forever(self) -> None:
+        logger.info(f"🌐 Webhook escuchando en :{self.port}{self.path}")
+        self.httpd.serve_forever()
+
+    def start(self) -> threading.Thread:
+        th = threading.Thread(target=self.httpd.serve_forever, name="webhook-http", daemon=True)
+        th.start()
+        return th
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
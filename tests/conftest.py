@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los tests importan `core` y `bench` desde la raíz del repo (sin paquete instalable)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
+
+import bot
+
+class _MemStorage:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, ns, key, default=None):
+        return self.data.get(ns, {}).get(str(key), default)
+
+    def items(self, ns):
+        return dict(self.data.get(ns, {}))
+
+    def put(self, ns, key, value):
+        self.data.setdefault(ns, {})[str(key)] = value
+
+    def delete(self, ns, key):
+        return self.data.get(ns, {}).pop(str(key), None) is not None
+
+class _Outbox:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, chat_id, text, reply_to=None, parse_mode="Markdown", **kw):
+        self.sent.append((chat_id, text))
+
+class _Chat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+class _Message:
+    def __init__(self, chat_id, text):
+        self.chat = _Chat(chat_id)
+        self.text = text
+        self.message_id = 1
+
+@pytest.fixture
+def env(monkeypatch):
+    store, out = _MemStorage(), _Outbox()
+    monkeypatch.setattr(bot, "get_storage", lambda: store)
+    monkeypatch.setattr(bot, "outbox", out)
+    monkeypatch.setattr(bot, "load_full_state", lambda chat_id=None: {})
+    monkeypatch.setattr(bot.bot, "send_chat_action", lambda *a, **k: None)
+    monkeypatch.setattr(bot, "build_engine_analysis",
+                        lambda text, chat_id, state: f"📊 BTC para {chat_id} en AR$ MEP, evitando DOGE")
+    return store, out
+
+def test_durante_el_arranque_cada_chat_ve_solo_su_reporte(env, monkeypatch):
+    store, out = env
+    monkeypatch.setattr(bot.STARTUP, "wait_ready", lambda timeout=None: True)
+    bot.cmd_market_report(_Message(111, "/analizar"))
+
+    monkeypatch.setattr(bot.STARTUP, "wait_ready", lambda timeout=None: False)
+    assert bot.reply_while_warming(222)
+    assert bot.reply_while_warming(111)
+    texts = dict(out.sent)
+    assert "111" not in texts[222] and "Estoy arrancando" in texts[222]
+    assert "para 111" in out.sent[-1][1]
+
+def test_cambios_descartan_solo_reportes_afectados(env):
+    store, _ = env
+    store.put("reports", 1, {"text": "📊 BTC sube", "ts": 0})
+    store.put("reports", 2, {"text": "📊 ETH baja", "ts": 0})
+    bot.on_market_changes([{"type": "new_entry", "symbol": "BTC"}])
+    assert set(store.items("reports")) == {"2"}
@@ -0,0 +1,43 @@
+import pytest
+
+from core import multisource
+from core.multisource import _kraken_base
+
+@pytest.mark.parametrize("pair, base", [
+    ("XXBTZUSD", "BTC"),
+    ("XETHZUSD", "ETH"),
+    ("XXRPZUSD", "XRP"),
+    ("XDGUSD", "DOGE"),
+    ("XTZUSD", "XTZ"),
+    ("BLZUSD", "BLZ"),
+    ("XCNUSD", "XCN"),
+    ("ZRXUSD", "ZRX"),
+    ("SOLUSD", "SOL"),
+    ("USDTZUSD", "USDT"),
+    ("XXBTZEUR", None),
+])
+def test_kraken_base(pair, base):
+    assert _kraken_base(pair) == base
+
+@pytest.fixture
+def exchanges(monkeypatch):
+    def install(**sources):
+        monkeypatch.setattr(multisource, "EXCHANGE_FETCHERS", {n: (lambda p=p: p) for n, p in sources.items()})
+        monkeypatch.setattr(multisource, "_data_age", lambda name: 1.0)
+    return install
+
+def test_quorum_con_mediana(exchanges):
+    exchanges(binance={"BTC": 100.0, "ETH": 10.0}, coinbase={"BTC": 101.0}, kraken={"BTC": 150.0, "ETH": 10.1})
+    out = multisource.aggregate_prices(force=True)
+    assert out["BTC"]["median"] == 101.0
+    assert out["BTC"]["quorum"] == 2
+    assert out["BTC"]["outliers"] == ["kraken"]
+    assert out["ETH"]["quorum"] == 2
+
+def test_fuente_vieja_no_cuenta(exchanges, monkeypatch):
+    exchanges(binance={"BTC": 100.0}, kraken={"BTC": 100.0})
+    monkeypatch.setattr(multisource, "_data_age",
+                        lambda name: multisource.MAX_STALENESS + 1 if name == "kraken" else 1.0)
+    out = multisource.aggregate_prices(force=True)
+    assert out["BTC"]["sources"] == {"binance": 100.0}
+    assert out["BTC"]["quorum"] == 1
@@ -0,0 +1,30 @@
+from core.news_index import NewsIndex
+
+UNIVERSE = [
+    {"symbol": "btc", "name": "Bitcoin"},
+    {"symbol": "sol", "name": "Solana"},
+    {"symbol": "link", "name": "Chainlink"},
+    {"symbol": "one", "name": "Harmony"},
+    {"symbol": "1inch", "name": "1inch"},
+]
+
+def _index():
+    idx = NewsIndex()
+    idx.set_universe(UNIVERSE)
+    return idx
+
+def test_palabras_comunes_en_minuscula_no_son_tickers():
+    assert _index().symbols_in_text("tomar sol y mandarte el link de one piece") == []
+
+def test_tickers_en_mayuscula_o_con_pesos():
+    assert _index().symbols_in_text("qué onda SOL, $link y 1INCH?") == ["SOL", "LINK", "1INCH"]
+
+def test_nombres_sin_importar_mayusculas():
+    assert _index().symbols_in_text("me interesa bitcoin y solana") == ["BTC", "SOL"]
+
+def test_indexado_y_consulta():
+    idx = _index()
+    idx.add_articles([{"title": "Solana ETF filed", "link": "a", "ts": 1},
+                      {"title": "BTC hits record", "link": "b", "ts": 2}])
+    assert [a["link"] for a in idx.query(["SOL"])] == ["a"]
+    assert idx.add_articles([{"title": "BTC hits record", "link": "b", "ts": 2}]) == 0
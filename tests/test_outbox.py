@@ -0,0 +1,61 @@
+import time
+
+from core import outbox
+from core.outbox import SendQueue, _Job, split_message
+
+class _ApiError(Exception):
+    def __init__(self, code, description, retry_after=None):
+        super().__init__(description)
+        self.error_code = code
+        self.result_json = {"parameters": {"retry_after": retry_after}} if retry_after else {}
+
+class _FakeBot:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = []
+        self.delivered = []
+
+    def send_message(self, chat_id, text, parse_mode=None, reply_to_message_id=None):
+        self.calls.append(parse_mode)
+        if self.failures:
+            raise self.failures.pop(0)
+        self.delivered.append(text)
+
+def test_markdown_roto_se_reenvia_como_texto_plano():
+    bot = _FakeBot([_ApiError(400, "Bad Request: can't parse entities")])
+    q = SendQueue(bot)
+    job = _Job(1, "precio_*roto", None, "Markdown")
+    assert q._deliver(job) == 0.0
+    # "" (no None): None haría que telebot use el Markdown por defecto del bot
+    assert job.parse_mode == ""
+    assert q._deliver(job) is None
+    assert bot.calls == ["Markdown", ""]
+    assert q.sent == 1
+
+def test_texto_plano_no_reintenta_por_parseo():
+    bot = _FakeBot([_ApiError(400, "Bad Request: can't parse entities")])
+    q = SendQueue(bot)
+    assert q._deliver(_Job(1, "x", None, "")) is None
+    assert q.failed == 1
+
+def test_split_message_respeta_limite():
+    parts = split_message("linea\n" * 2000, limit=100)
+    assert all(len(p) <= 100 for p in parts)
+
+def test_split_message_corta_duro_sin_separador_en_la_segunda_mitad():
+    parts = split_message("ab cd" + "x" * 200, limit=100)
+    assert [len(p) for p in parts] == [100, 100, 5]
+
+def test_429_mantiene_el_orden_de_las_partes(monkeypatch):
+    monkeypatch.setattr(outbox, "PRIVATE_INTERVAL", 0.01)
+    monkeypatch.setattr(outbox, "split_message", lambda text: text.split("|"))
+    bot = _FakeBot([_ApiError(429, "Too Many Requests", retry_after=0.3)])
+    q = SendQueue(bot, workers=4, global_rate=1000).start()
+    try:
+        q.send(7, "part0|part1|part2")
+        deadline = time.monotonic() + 5
+        while q.sent < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        q.stop()
+    assert bot.delivered == ["part0", "part1", "part2"]
@@ -0,0 +1,58 @@
+import pytest
+
+from core import portfolio
+from core.portfolio import PortfolioBook, parse_amount
+
+class _MemStorage:
+    def __init__(self):
+        self.data = {}
+
+    def items(self, ns):
+        return dict(self.data.get(ns, {}))
+
+    def put(self, ns, key, value):
+        self.data.setdefault(ns, {})[str(key)] = value
+
+    def delete(self, ns, key):
+        return self.data.get(ns, {}).pop(str(key), None) is not None
+
+@pytest.fixture
+def book(monkeypatch):
+    store = _MemStorage()
+    monkeypatch.setattr(portfolio, "get_storage", lambda: store)
+    return PortfolioBook()
+
+@pytest.mark.parametrize("raw, value", [("0.5", 0.5), ("0,5", 0.5), ("60000", 60000.0), ("1e3", 1000.0)])
+def test_parse_amount(raw, value):
+    assert parse_amount(raw) == value
+
+@pytest.mark.parametrize("raw", ["nan", "NaN", "inf", "-inf", "-1", "0", "abc", ""])
+def test_parse_amount_rechaza(raw):
+    with pytest.raises(ValueError):
+        parse_amount(raw)
+
+def test_add_rechaza_no_finitos(book):
+    with pytest.raises(ValueError):
+        book.add(1, "BTC", float("nan"), 100.0)
+    with pytest.raises(ValueError):
+        book.add(1, "BTC", 1.0, float("inf"))
+
+def test_revalue_y_summary(book):
+    book.add(1, "BTC", 0.5, 100.0)
+    book.add(1, "ETH", 2.0, 10.0)
+    book.add(2, "ETH", 1.0, 20.0)
+    rows = [{"symbol": "BTC", "current_price": 200.0, "market_cap_rank": 1},
+            {"symbol": "ETH", "current_price": 15.0, "market_cap_rank": 2}]
+    assert book.revalue(rows) is True
+    assert book.revalue(rows) is False  # Mismos precios: no recalcula
+    s = book.summary(1)
+    assert s["value"] == pytest.approx(0.5 * 200 + 2 * 15)
+    assert s["pnl"] == pytest.approx(s["value"] - (50 + 20))
+    assert book.summary(2)["value"] == pytest.approx(15.0)
+
+def test_revalue_simbolo_repetido_gana_el_primero(book):
+    book.add(1, "ETH", 1.0, 10.0)
+    rows = [{"symbol": "ETH", "current_price": 3000.0, "market_cap_rank": 2},
+            {"symbol": "eth", "current_price": 0.01, "market_cap_rank": 900}]
+    book.revalue(rows)
+    assert book.summary(1)["value"] == pytest.approx(3000.0)
@@ -0,0 +1,74 @@
+import pytest
+
+from core.news_index import NEWS_INDEX
+from core.prefs import apply_patch, is_settings_only, parse_preferences
+
+@pytest.fixture(autouse=True)
+def universe():
+    NEWS_INDEX.set_universe([{"symbol": s, "name": n} for s, n in
+                             [("BTC", "Bitcoin"), ("ETH", "Ethereum"), ("SOL", "Solana"), ("DOGE", "Dogecoin")]])
+
+@pytest.mark.parametrize("text, patch", [
+    ("riesgo bajo", {"risk_pref": "Bajo"}),
+    ("soy agresivo, top 10", {"risk_pref": "Alto", "top_n": 10}),
+    ("mediano plazo", {"mode": "SEMANAL"}),
+    ("top 500", {"top_n": 50}),
+    ("evitá DOGE", {"avoid": ["DOGE"]}),
+    ("enfocate en SOL y ethereum", {"focus": ["SOL", "ETH"]}),
+    ("evitá memecoins", {"avoid_memecoins": True}),
+    ("borrá mis preferencias", {"reset": True}),
+    ("evitá XYZ y DOGE", {"avoid": ["DOGE"], "unknown": ["XYZ"]}),
+    ("evitá memecoins que no me gustan", {"avoid_memecoins": True}),
+    ("enfocate en SOL que es la que más me gusta", {"focus": ["SOL"]}),
+    ("precios en pesos", {"currency": "ARS"}),
+    ("pasame todo a dólar mep", {"currency": "MEP"}),
+    ("moneda: euros", {"currency": "EUR"}),
+])
+def test_parse_preferences(text, patch):
+    assert parse_preferences(text) == patch
+
+@pytest.mark.parametrize("text", [
+    "no quiero perder plata, qué me conviene?",
+    "me interesa SOL, cómo viene?",
+    "me interesa saber qué pasa con BTC",
+    "hola, cómo andás",
+    "¿qué conviene a largo plazo?",
+    "¿qué recomendás para riesgo bajo?",
+    "cuáles son las top 5 de hoy?",
+    "que conviene, riesgo alto o medio",
+])
+def test_preguntas_no_cambian_foco_ni_evitar(text):
+    assert parse_preferences(text) == {}
+
+@pytest.mark.parametrize("text", [
+    "cuánto cotiza en dólares el BTC?",
+    "el BTC cotiza en dólares",
+    "¿me mostrás los precios en pesos?",
+])
+def test_preguntas_no_cambian_la_moneda(text):
+    assert "currency" not in parse_preferences(text)
+
+@pytest.mark.parametrize("text", ["evitá memecoins que no me gustan", "enfocate en SOL que es la que más me gusta"])
+def test_que_conjuncion_no_es_pregunta(text):
+    assert is_settings_only(text, parse_preferences(text))
+
+def test_configuracion_y_pregunta_en_oraciones_distintas():
+    text = "evitá DOGE. ¿qué conviene hoy?"
+    patch = parse_preferences(text)
+    assert patch == {"avoid": ["DOGE"]}
+    assert not is_settings_only(text, patch)
+
+def test_horizonte_solo_si_es_explicito():
+    sess = {"facts": {}, "last_mode": "SEMANAL"}
+    apply_patch(sess, parse_preferences("riesgo alto"))
+    assert "horizon" not in sess["facts"]
+    apply_patch(sess, parse_preferences("largo plazo"))
+    assert sess["facts"]["horizon"] == sess["last_mode"] == "MENSUAL"
+    apply_patch(sess, {"reset": True})
+    assert "horizon" not in sess["facts"]
+
+def test_foco_y_evitar_se_excluyen():
+    sess = {"facts": {}}
+    apply_patch(sess, {"focus": ["SOL"]})
+    facts = apply_patch(sess, {"avoid": ["SOL"]})
+    assert facts["avoid"] == ["SOL"] and facts["focus"] == []
@@ -0,0 +1,134 @@
+import time
+
+from core import multisource
+from core.pricebook import PriceBook, _resync_from_rest
+
+def test_resync_usa_la_edad_del_cache(monkeypatch):
+    monkeypatch.setattr(multisource, "binance_prices_usdt", lambda: {"BTCUSDT": 100.0, "ETHUSDT": 10.0})
+    monkeypatch.setattr(multisource, "_data_age", lambda name: 150.0)
+    book = PriceBook()
+    book.update("ETH", 11.0, time.time())  # Tick del stream más nuevo que el REST
+    _resync_from_rest(book)
+    assert book.get("BTC") is None           # 150s > MAX_AGE: no pasa por fresco
+    assert book.get("BTC", max_age=200) == 100.0
+    assert book.get("ETH") == 11.0
+
+def test_resync_sin_datos_no_toca_el_libro(monkeypatch):
+    monkeypatch.setattr(multisource, "binance_prices_usdt", lambda: {})
+    monkeypatch.setattr(multisource, "_data_age", lambda name: None)
+    book = PriceBook()
+    _resync_from_rest(book)
+    assert len(book) == 0
+
+# --- Stream contra un servidor WebSocket local ---
+
+import json
+import base64
+import socket
+import hashlib
+import threading
+
+import pytest
+
+from core import pricebook
+from core.pricebook import PriceStream, _apply_frame
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class _WsStub:
+    """Servidor WebSocket mínimo (RFC 6455, solo texto servidor -> cliente). Cada conexión
+    recibe la siguiente tanda de frames y se corta, como un stream que se cae."""
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.connections = 0
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(4)
+        self.url = f"ws://127.0.0.1:{self._sock.getsockname()[1]}/ws"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                request = b""
+                while b"\r\n\r\n" not in request:
+                    request += conn.recv(4096)
+                key = next(l.split(b":", 1)[1].strip() for l in request.split(b"\r\n")
+                           if l.lower().startswith(b"sec-websocket-key"))
+                accept = base64.b64encode(hashlib.sha1(key + _WS_GUID).digest())
+                conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+                self.connections += 1
+                frames = self.sessions.pop(0) if self.sessions else []
+                for frame in frames:
+                    conn.sendall(self._frame(json.dumps(frame).encode()))
+                if not self.sessions:
+                    threading.Event().wait(2)  # Última tanda: la conexión queda abierta
+
+    @staticmethod
+    def _frame(payload):
+        n = len(payload)
+        head = bytes([0x81, n]) if n < 126 else bytes([0x81, 126]) + n.to_bytes(2, "big")
+        return head + payload
+
+    def close(self):
+        self._sock.close()
+
+def _tick(sym, price, ts):
+    return {"e": "24hrMiniTicker", "E": int(ts * 1000), "s": sym, "c": str(price)}
+
+def _wait(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+@pytest.fixture
+def resyncs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pricebook, "_resync_from_rest", lambda book: calls.append(time.time()))
+    monkeypatch.setattr(pricebook, "BACKOFF_MIN", 0.05)
+    return calls
+
+def test_apply_frame_lista_y_evento_suelto():
+    book = PriceBook()
+    now = time.time()
+    ts = _apply_frame(book, json.dumps([_tick("BTCUSDT", 100, now - 1), _tick("ETHBTC", 0.05, now),
+                                        _tick("ETHUSDT", 10, now)]))
+    assert ts == pytest.approx(now, abs=1e-3)
+    assert book.get("BTC") == 100.0 and book.get("ETH") == 10.0 and len(book) == 2
+    assert _apply_frame(book, json.dumps(_tick("SOLUSDT", 5, now))) == pytest.approx(now, abs=1e-3)
+    assert _apply_frame(book, json.dumps({"result": None})) is None
+
+def test_stream_reconecta_y_resincroniza_una_vez(resyncs):
+    now = time.time()
+    stub = _WsStub([[ [_tick("BTCUSDT", 100, now - 30)] ],   # Se corta después de un tick viejo
+                    [ [_tick("BTCUSDT", 101, now)], [_tick("ETHUSDT", 10, now + 0.5)] ]])
+    book = PriceBook()
+    stream = PriceStream(book, stub.url).start()
+    try:
+        assert _wait(lambda: book.get("ETH") == 10.0)
+        assert stub.connections == 2
+        assert book.get("BTC") == 101.0
+        # Un solo resync (al reconectar): el primer frame de la conexión nueva no es otro hueco
+        assert len(resyncs) == 1 and book.gaps == 1
+    finally:
+        stream._stop.set()
+        stub.close()
+
+def test_hueco_dentro_de_la_conexion_resincroniza(resyncs):
+    now = time.time()
+    stub = _WsStub([[ [_tick("BTCUSDT", 100, now - 20)], [_tick("BTCUSDT", 101, now)] ]])
+    book = PriceBook()
+    stream = PriceStream(book, stub.url).start()
+    try:
+        assert _wait(lambda: book.get("BTC") == 101.0)
+        assert len(resyncs) == 1 and book.gaps == 1
+    finally:
+        stream._stop.set()
+        stub.close()
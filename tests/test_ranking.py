@@ -0,0 +1,41 @@
+import pytest
+
+from core import ranking
+from core.ranking import get_factor_snapshot
+
+@pytest.fixture
+def interest(monkeypatch):
+    counts = {}
+    monkeypatch.setattr(ranking, "load_learning", lambda: counts)
+    monkeypatch.setattr(ranking, "get_learning_boost", lambda sym: float(counts.get(sym.upper(), 0)))
+    return counts
+
+def _rows():
+    return [
+        {"id": f"c{i}", "symbol": f"C{i}", "market_cap_rank": i + 1, "current_price": 10.0 + i,
+         "market_cap": 1e9 / (i + 1), "total_volume": 1e7, "price_change_percentage_24h": float(i % 5)}
+        for i in range(30)
+    ]
+
+def test_snapshot_se_reutiliza_si_nada_cambia(interest):
+    rows = _rows()
+    assert get_factor_snapshot(rows) is get_factor_snapshot([dict(r) for r in rows])
+
+@pytest.mark.parametrize("field, value", [("total_volume", 5e9), ("market_cap_rank", 99), ("market_cap", 1.0),
+                                          ("price_change_percentage_7d_in_currency", 40.0)])
+def test_snapshot_se_invalida_con_cualquier_factor(interest, field, value):
+    rows = _rows()
+    snap = get_factor_snapshot(rows)
+    rows[3][field] = value
+    assert get_factor_snapshot(rows) is not snap
+
+def test_snapshot_se_invalida_con_la_popularidad(interest):
+    rows = _rows()
+    snap = get_factor_snapshot(rows)
+    interest["C7"] = 50
+    assert get_factor_snapshot(rows) is not snap
+
+def test_top_k_respeta_evitar_y_foco(interest):
+    snap = get_factor_snapshot(_rows())
+    top = [r["symbol"] for r in snap.ranked_rows({"risk_pref": "Medio", "avoid": ["C0"], "focus": ["C29"]}, 5)]
+    assert "C0" not in top and top[0] == "C29"
@@ -0,0 +1,94 @@
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from core import ranking
+from core.fx import rescale_rows
+from core.shared_snapshot import SharedSnapshot
+
+def _rows(n=20):
+    return [{"id": f"c{i}", "symbol": f"C{i}", "market_cap_rank": i + 1, "current_price": 10.0 + i,
+             "market_cap": 1e9 / (i + 1), "total_volume": None if i == 3 else 1e7 + i,
+             "price_change_percentage_24h": float(i % 5) - 2} for i in range(n)]
+
+@pytest.fixture
+def segment():
+    writer = SharedSnapshot(label="test").create(f"test_snap_{os.getpid()}", size_mb=1)
+    reader = SharedSnapshot(label="test").attach(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+def test_publica_y_lee_sin_redecodificar(segment):
+    writer, reader = segment
+    rows = _rows()
+    assert writer.publish({"market": rows, "fx": {"ARS": 1090.0}})
+    market = reader.read("market")
+    assert market == rows
+    assert reader.read("market") is market  # Misma versión: no se vuelve a decodificar
+    assert reader.read("fx") == {"ARS": 1090.0}
+    assert not writer.publish({"market": rows, "fx": {"ARS": 1090.0}})  # Sin cambios no escribe
+
+def test_el_lector_no_puede_escribir(segment):
+    writer, reader = segment
+    writer.publish({"market": _rows()})
+    _, cols = reader.columns("market")
+    assert not cols["current_price"].flags.writeable
+    with pytest.raises(TypeError):
+        reader._buf[0:1] = b"x"
+
+def test_columnas_solo_para_filas_del_segmento(segment):
+    writer, reader = segment
+    writer.publish({"market": _rows()})
+    market = reader.read("market")
+    version, cols = reader.columns("market", market[:5])
+    assert version == reader.seen_version
+    assert cols["market_cap"].tolist() == [r["market_cap"] for r in market[:5]]
+    assert np.isnan(cols["total_volume"][3])
+    assert reader.columns("market", [dict(r) for r in market[:5]]) == (0, {})
+
+def test_vistas_validas_hasta_dos_publicaciones(segment):
+    writer, reader = segment
+    writer.publish({"market": _rows()})
+    version, cols = reader.columns("market")
+    before = cols["current_price"].copy()
+    writer.publish({"market": _rows(10)})  # Escribe el otro slot
+    assert reader.intact(version)
+    assert cols["current_price"].tolist() == before.tolist()
+    writer.publish({"market": _rows(5)})   # Reescribe el slot de las vistas
+    assert not reader.intact(version)
+
+def test_factores_desde_columnas_iguales_a_filas(segment, monkeypatch):
+    monkeypatch.setattr(ranking, "get_learning_boost", lambda sym: 0.0)
+    writer, reader = segment
+    writer.publish({"market": _rows()})
+    market = reader.read("market")
+    _, cols = reader.columns("market", market)
+    assert np.allclose(ranking.FactorSnapshot(market, cols).X, ranking.FactorSnapshot(market).X)
+
+def test_fx_desde_columnas_igual_a_filas(segment):
+    writer, reader = segment
+    writer.publish({"market": _rows()})
+    market = reader.read("market")
+    _, cols = reader.columns("market", market)
+    assert rescale_rows(market, 1000.0, cols) == rescale_rows(market, 1000.0)
+
+def _child_write(snap, conn):
+    try:
+        snap._buf[0:1] = b"x"
+        conn.send("escribió")
+    except TypeError:
+        conn.send((snap.role, snap.read("fx")))
+
+def test_el_hijo_del_fork_queda_lector_de_solo_lectura(segment):
+    writer, _ = segment
+    writer.publish({"fx": {"EUR": 0.92}})
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe()
+    p = ctx.Process(target=_child_write, args=(writer, child))
+    p.start()
+    p.join(10)
+    assert parent.recv() == ("reader", {"EUR": 0.92})
+    assert writer.role == "writer"
@@ -0,0 +1,22 @@
+import pytest
+
+from core.signals import KEYWORD_RE, score_article
+
+@pytest.mark.parametrize("text", ["upgrade", "upgraded", "upgrades", "upgrading", "hacked", "delisted", "bankruptcy", "SECs",
+                                  "scammed", "scammers", "scamming", "inflationary", "bullishness", "hackers",
+                                  "airdropped", "bankruptcies", "listings"])
+def test_keywords_flexionadas(text):
+    assert KEYWORD_RE.search(text)
+
+@pytest.mark.parametrize("text", ["second", "fedora", "hackathon", "upgradeed", "fedcy", "feder", "scamed", "secer"])
+def test_sin_falsos_positivos(text):
+    assert not KEYWORD_RE.search(text)
+
+def test_cada_keyword_suma_una_vez():
+    score, tags, _ = score_article({"title": "Network upgraded after upgrade vote", "summary": "hack and hacked"})
+    assert score == 1 + 4
+    assert tags == ["tech", "riesgo"]
+
+def test_riesgo_flexionado_puntua():
+    score, tags, _ = score_article({"title": "Investors scammed as scammers drain pool", "summary": ""})
+    assert score == 4 and tags == ["riesgo"]
@@ -0,0 +1,75 @@
+import pytest
+
+from core import snapshot_diff
+from core.snapshot_diff import (EVENT_DEPEG, EVENT_DROPPED, EVENT_NEW, EVENT_PRICE, EVENT_RANK,
+                                EVENT_REPEG, SnapshotDiff, render_events)
+
+def _row(sym, rank, price, **extra):
+    return {"id": sym.lower(), "symbol": sym, "market_cap_rank": rank, "current_price": price, **extra}
+
+@pytest.fixture(autouse=True)
+def stables(monkeypatch):
+    monkeypatch.setattr(snapshot_diff, "is_stable", lambda r: r["symbol"] in {"USDT", "USDC"})
+
+def _types(events):
+    return [(e["type"], e["symbol"]) for e in events]
+
+BASE = [_row("BTC", 1, 100.0), _row("ETH", 2, 10.0), _row("USDT", 3, 1.0), _row("SOL", 4, 5.0)]
+
+def test_primer_snapshot_no_emite_eventos():
+    assert SnapshotDiff().observe(BASE, version=1) == []
+
+def test_misma_version_no_hace_nada():
+    diff = SnapshotDiff()
+    diff.observe(BASE, version=1)
+    assert diff.observe([_row("BTC", 1, 500.0)], version=1) == []
+
+def test_eventos_de_cambio():
+    diff = SnapshotDiff()
+    diff.observe(BASE + [_row("DOGE", 20, 0.1)], version=1)
+    events = diff.observe([
+        _row("BTC", 1, 106.0),         # +6%: price_move
+        _row("ETH", 2, 10.1),          # +1%: nada
+        _row("USDT", 3, 0.97),         # depeg
+        _row("SOL", 12, 5.0),          # rank_move
+        _row("PEPE", 30, 0.01),        # new
+    ], version=2)                      # DOGE: dropped
+    assert sorted(_types(events)) == sorted([(EVENT_PRICE, "BTC"), (EVENT_DEPEG, "USDT"), (EVENT_RANK, "SOL"),
+                                             (EVENT_NEW, "PEPE"), (EVENT_DROPPED, "DOGE")])
+    assert diff.rows_unchanged == 0
+    again = diff.observe([_row("USDT", 3, 0.999)] + [_row(s, r, p) for s, r, p in
+                                                    (("BTC", 1, 106.0), ("ETH", 2, 10.1), ("SOL", 12, 5.0), ("PEPE", 30, 0.01))],
+                         version=3)
+    assert _types(again) == [(EVENT_REPEG, "USDT")]
+    assert "DEPEG USDT" in render_events(events)
+
+def test_movimiento_acumulado_desde_el_ultimo_informado():
+    diff = SnapshotDiff()
+    diff.observe([_row("BTC", 1, 100.0)], version=1)
+    assert diff.observe([_row("BTC", 1, 103.0)], version=2) == []
+    assert _types(diff.observe([_row("BTC", 1, 105.5)], version=3)) == [(EVENT_PRICE, "BTC")]
+
+def test_snapshot_vacio_se_ignora():
+    diff = SnapshotDiff()
+    diff.observe(BASE, version=1)
+    assert diff.observe([], version=2) == []
+    assert diff.get_stats()["tracked"] == len(BASE)
+    # La recuperación no re-emite altas ni bajas
+    assert diff.observe(BASE, version=3) == []
+
+def test_vacio_antes_del_primero_no_cuenta_como_base():
+    diff = SnapshotDiff()
+    diff.observe([], version=1)
+    assert diff.observe(BASE, version=2) == []
+    assert _types(diff.observe(BASE + [_row("PEPE", 30, 0.01)], version=3)) == [(EVENT_NEW, "PEPE")]
+
+def test_stream_y_suscriptores():
+    diff = SnapshotDiff()
+    got = []
+    diff.subscribe(got.extend)
+    diff.observe(BASE, version=1)
+    seq = diff.seq
+    diff.observe(BASE[:-1], version=2)
+    assert _types(got) == [(EVENT_DROPPED, "SOL")]
+    assert diff.events_since(seq) == got
+    assert diff.events_since(diff.seq) == []
@@ -0,0 +1,54 @@
+import pytest
+
+from core import sources
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def observe(self, rows, version=None):
+        self.calls.append(list(rows))
+        return []
+
+@pytest.fixture
+def diff(monkeypatch):
+    rec = _Recorder()
+    monkeypatch.setattr(sources, "SNAPSHOT_DIFF", rec)
+    monkeypatch.setattr(sources, "UNIVERSE_SIZE", 500)
+    return rec
+
+def _page(page):
+    return [{"id": f"c{page}-{i}", "symbol": f"C{page}X{i}", "market_cap_rank": (page - 1) * 250 + i + 1,
+             "current_price": 1.0} for i in range(250)]
+
+def test_universo_completo_alimenta_el_diff(diff, monkeypatch):
+    monkeypatch.setattr(sources, "fetch_coingecko_page", lambda page, vs="usd": _page(page))
+    rows = sources.fetch_market_universe()
+    assert len(rows) == 500
+    assert len(diff.calls) == 1
+
+@pytest.mark.parametrize("failed_pages", [{2}, {1, 2}])
+def test_pagina_caida_no_alimenta_el_diff(diff, monkeypatch, failed_pages):
+    monkeypatch.setattr(sources, "fetch_coingecko_page",
+                        lambda page, vs="usd": [] if page in failed_pages else _page(page))
+    sources.fetch_market_universe()
+    assert diff.calls == []
+
+def test_universo_parcial_no_alimenta_el_diff(diff, monkeypatch):
+    monkeypatch.setattr(sources, "fetch_coingecko_page", lambda page, vs="usd": _page(page))
+    assert len(sources.fetch_market_universe(100)) == 100
+    assert diff.calls == []
+
+def test_sin_tipo_de_cambio_no_devuelve_usd_como_otra_moneda(diff, monkeypatch):
+    from core.fx import FX
+    monkeypatch.setattr(sources, "fetch_coingecko_page", lambda page, vs="usd": _page(page))
+    monkeypatch.setattr(FX, "rate", lambda currency, rows=None: None)
+    assert sources.fetch_market_universe(vs="ars") == []
+    assert sources.fetch_coingecko_top100("ars") == []
+
+def test_otra_moneda_reescala_el_universo(diff, monkeypatch):
+    from core.fx import FX
+    monkeypatch.setattr(sources, "fetch_coingecko_page", lambda page, vs="usd": _page(page))
+    monkeypatch.setattr(FX, "rate", lambda currency, rows=None: 1000.0)
+    rows = sources.fetch_market_universe(vs="ars")
+    assert len(rows) == 500 and rows[0]["current_price"] == 1000.0
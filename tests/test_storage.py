@@ -0,0 +1,37 @@
+import json
+
+from core import storage
+from core.storage import Storage, migrate_legacy
+
+def _legacy_files(tmp_path, monkeypatch):
+    learning = tmp_path / "learning_state.json"
+    learning.write_text(json.dumps({"BTC": 3, "ETH": 1}))
+    monkeypatch.setattr(storage, "LEGACY_BRAIN_FILE", str(tmp_path / "brain_state.json"))
+    monkeypatch.setattr(storage, "LEGACY_MEMORY_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(storage, "LEGACY_LEARNING_FILE", str(learning))
+
+def test_migracion_una_sola_vez(tmp_path, monkeypatch):
+    _legacy_files(tmp_path, monkeypatch)
+    store = Storage(str(tmp_path / "bot.db"))
+    assert migrate_legacy(store) is True
+    assert migrate_legacy(store) is False
+    assert store.counters("interest") == {"BTC": 3, "ETH": 1}
+
+def test_migracion_concurrente_no_duplica_contadores(tmp_path, monkeypatch):
+    _legacy_files(tmp_path, monkeypatch)
+    db = str(tmp_path / "bot.db")
+    a, b = Storage(db), Storage(db)
+
+    # Otro proceso (b) migra justo después del chequeo rápido de `a`
+    read_json = storage._read_json
+    raced = []
+    def racing_read(path):
+        data = read_json(path)
+        if not raced:
+            raced.append(True)
+            assert migrate_legacy(b) is True
+        return data
+    monkeypatch.setattr(storage, "_read_json", racing_read)
+
+    assert migrate_legacy(a) is False
+    assert a.counters("interest") == {"BTC": 3, "ETH": 1}
@@ -0,0 +1,111 @@
+import json
+import threading
+
+import pytest
+
+from core import webhook
+from core.webhook import SECRET_HEADER, ShardedExecutor, WebhookServer, chat_key, resolve_secret
+
+class _Pool:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.submitted = []
+
+    def submit(self, key, update):
+        if not self.accept:
+            return False
+        self.submitted.append((key, update))
+        return True
+
+@pytest.fixture
+def server():
+    servers = []
+    def make(pool, secret="s3cret"):
+        srv = WebhookServer(pool, secret, host="127.0.0.1", port=0)
+        servers.append(srv)
+        return srv
+    yield make
+    for srv in servers:
+        srv.httpd.server_close()
+
+def _update(uid, chat=10):
+    return json.dumps({"update_id": uid, "message": {"chat": {"id": chat}, "text": "hola"}}).encode()
+
+OK = {SECRET_HEADER: "s3cret"}
+
+def test_secreto_invalido_403(server):
+    pool = _Pool()
+    srv = server(pool)
+    assert srv.accept({}, _update(1)) == 403
+    assert srv.accept({SECRET_HEADER: "otro"}, _update(1)) == 403
+    assert pool.submitted == []
+
+@pytest.mark.parametrize("body", [b"no es json", b"[1, 2]", b"\xff"])
+def test_cuerpo_invalido_400(server, body):
+    assert server(_Pool()).accept(OK, body) == 400
+
+def test_duplicado_se_ignora(server):
+    pool = _Pool()
+    srv = server(pool)
+    assert srv.accept(OK, _update(1)) == 200
+    assert srv.accept(OK, _update(1)) == 200
+    assert len(pool.submitted) == 1
+    assert pool.submitted[0][0] == 10  # Afinidad por chat
+
+def test_saturado_503_y_el_reintento_entra(server):
+    pool = _Pool(accept=False)
+    srv = server(pool)
+    assert srv.accept(OK, _update(7)) == 503
+    pool.accept = True
+    assert srv.accept(OK, _update(7)) == 200
+    assert [u["update_id"] for _, u in pool.submitted] == [7]
+
+def test_servidor_sin_secreto_no_arranca():
+    with pytest.raises(ValueError):
+        WebhookServer(_Pool(), "", host="127.0.0.1", port=0)
+
+def test_resolve_secret():
+    assert resolve_secret("dev", register=False) == "dev"
+    generated = resolve_secret("", register=True)
+    assert len(generated) >= 32 and generated != resolve_secret("", register=True)
+    with pytest.raises(RuntimeError):
+        resolve_secret("", register=False)
+
+def test_chat_key():
+    assert chat_key({"update_id": 5, "callback_query": {"from": {"id": 42}}}) == 42
+    assert chat_key({"update_id": 5, "edited_message": {"chat": {"id": -100}}}) == -100
+    assert chat_key({"update_id": 5}) == 5
+
+def test_executor_respeta_orden_por_chat():
+    seen = []
+    lock = threading.Lock()
+    def handler(u):
+        with lock:
+            seen.append((u["chat"], u["n"]))
+    ex = ShardedExecutor(4, handler)
+    for n in range(50):
+        for chat in range(5):
+            ex.submit(chat, {"chat": chat, "n": n})
+    ex.stop()
+    for chat in range(5):
+        assert [n for c, n in seen if c == chat] == list(range(50))
+
+def test_executor_bloqueante_espera_lugar(monkeypatch):
+    monkeypatch.setattr(webhook, "QUEUE_MAX", 1)
+    release = threading.Event()
+    done = []
+    ex = ShardedExecutor(1, lambda u: (release.wait(5), done.append(u["n"])))
+    assert ex.submit(0, {"n": 0})
+    # El hilo toma el 0 y queda bloqueado; el 1 ocupa la cola; el 2 no entra sin esperar
+    for _ in range(100):
+        if ex.pending() == 0:
+            break
+        threading.Event().wait(0.01)
+    assert ex.submit(0, {"n": 1})
+    assert not ex.submit(0, {"n": 2})
+    t = threading.Thread(target=ex.submit, args=(0, {"n": 2}), kwargs={"block": True})
+    t.start()
+    release.set()
+    t.join(5)
+    ex.stop()
+    assert done == [0, 1, 2]